@@ -19,12 +19,50 @@ class Settings(BaseSettings):
     # Google Sheets / Service Account
     GOOGLE_SERVICE_ACCOUNT_JSON: Optional[str] = None
     GOOGLE_SPREADSHEET_ID: Optional[str] = None
+    # More spreadsheets to spread channels across (JSON list of IDs); shard 0 is
+    # GOOGLE_SPREADSHEET_ID. Shard i uses service account i (modulo their number)
+    # of GOOGLE_SERVICE_ACCOUNT_JSON followed by GOOGLE_EXTRA_SERVICE_ACCOUNTS
+    GOOGLE_EXTRA_SPREADSHEET_IDS: list[str] = []
+    GOOGLE_EXTRA_SERVICE_ACCOUNTS: list[str] = []
+    # Google Cloud project of each service account (JSON list, same order:
+    # GOOGLE_SERVICE_ACCOUNT_JSON first). Accounts of one project share its
+    # per-project quota buckets; accounts without an entry use the first one's
+    GOOGLE_SERVICE_ACCOUNT_PROJECTS: list[str] = []
+    # How a new channel picks its shard: "hash" (by channel id) or "load" (fewest channels)
+    GSHEETS_SHARD_ASSIGNMENT: str = "hash"
+
+    # Update ingestion: "polling" (default) or "webhook"
+    BOT_MODE: str = "polling"
+    # Webhook mode: public base URL Telegram posts to, local listen address and secret token
+    WEBHOOK_BASE_URL: Optional[str] = None
+    WEBHOOK_PATH: str = "/telegram/webhook"
+    WEBHOOK_HOST: str = "0.0.0.0"
+    WEBHOOK_PORT: int = 8080
+    WEBHOOK_SECRET: Optional[str] = None
+    # Call setWebhook on startup (disable for local testing with recorded updates)
+    WEBHOOK_SET_ON_STARTUP: bool = True
+
+    # Dispatch layer in front of the handlers: updates of one channel start in
+    # arrival order, at most DISPATCH_CHANNEL_CONCURRENCY per channel and
+    # DISPATCH_MAX_CONCURRENCY overall are handled at once
+    DISPATCH_MAX_CONCURRENCY: int = 64
+    DISPATCH_CHANNEL_CONCURRENCY: int = 1
+    # Waiting updates allowed per channel and in total; past that DISPATCH_OVERFLOW
+    # applies: "spill" (park them in SQLite and replay later) or "shed" (drop them)
+    DISPATCH_CHANNEL_QUEUE: int = 1000
+    DISPATCH_MAX_QUEUE: int = 10000
+    DISPATCH_OVERFLOW: str = "spill"
+    DISPATCH_REPLAY_INTERVAL: float = 1.0
 
     # Local DB
     DB_PATH: str = "./data/app.db"
 
     # Logging / Observability
     LOG_LEVEL: str = "INFO"
+    # "text" or "json" (one object per line with channel_id/user_id/operation)
+    LOG_FORMAT: str = "text"
+    # Max "Skipping chat_member" records per operation per minute (0 = unlimited)
+    LOG_SKIP_RATE_PER_MINUTE: int = 60
     SENTRY_DSN: Optional[str] = None
 
     # Timezone for timestamps (IANA name)
@@ -33,9 +71,69 @@ class Settings(BaseSettings):
     # Optional: log joins even without invite link
     LOG_JOINS_WITHOUT_INVITE: bool = False
 
+    # Join requests from the same user to the same channel within this window are logged once
+    JOIN_REQUEST_DEDUP_SECONDS: int = 12 * 60 * 60
+    # How often pending dedup marks are flushed and old join_request_log rows pruned
+    JOIN_REQUEST_DEDUP_FLUSH_INTERVAL: float = 1.0
+    JOIN_REQUEST_LOG_PRUNE_INTERVAL: float = 3600.0
+    # Hold a join request's Sheets row back this many seconds: an approval within
+    # the window is merged into it (Approved At, Outcome) instead of being a
+    # separate event; otherwise the row is written with Outcome "pending" (0 = off)
+    JOIN_REQUEST_COALESCE_SECONDS: int = 0
+
     # Optional: run a Google Sheets self-check on startup
     GSHEETS_SELF_CHECK: bool = True
 
+    # Sheets client: "gspread" (gspread_asyncio, thread pool) or "rest"
+    # (native aiohttp calls to the v4 REST API over pooled keep-alive connections)
+    GSHEETS_BACKEND: str = "gspread"
+
+    # Seconds to trust the cached worksheet listing before re-reading metadata
+    GSHEETS_METADATA_TTL: float = 300.0
+
+    # Worksheet rollover per channel: start a new sheet after this many rows (0 = never)
+    # and/or every period: "month", "quarter" or "year" (empty = never), e.g. "Title 2025-Q3"
+    GSHEETS_ROLLOVER_ROWS: int = 0
+    GSHEETS_ROLLOVER_PERIOD: str = ""
+
+    # Refresh the Google access token in the background this many seconds
+    # before it expires (0 = refresh on demand inside a Sheets call)
+    GSHEETS_TOKEN_REFRESH_LEAD: float = 600.0
+
+    # Client-side Sheets quota metering (Google defaults: 300/min per project, 60/min per user)
+    GSHEETS_QUOTA_ENABLED: bool = True
+    GSHEETS_READS_PER_MINUTE_PROJECT: int = 300
+    GSHEETS_WRITES_PER_MINUTE_PROJECT: int = 300
+    GSHEETS_READS_PER_MINUTE_USER: int = 60
+    GSHEETS_WRITES_PER_MINUTE_USER: int = 60
+    GSHEETS_QUOTA_BURST: int = 5
+
+    # Circuit breaker: after this many consecutive failed Sheets calls (network
+    # errors, 5xx, 429) fail fast for GSHEETS_BREAKER_RESET_TIMEOUT seconds, then
+    # let one probe call through (0 = disabled)
+    GSHEETS_BREAKER_FAILURES: int = 5
+    GSHEETS_BREAKER_RESET_TIMEOUT: float = 30.0
+
+    # Batched Sheets writes: flush a worksheet buffer at this many rows
+    # or after this many seconds, whichever comes first
+    GSHEETS_BATCH_MAX_ROWS: int = 100
+    GSHEETS_BATCH_MAX_LATENCY: float = 1.0
+
+    # Local outbox drained to Google Sheets in the background
+    OUTBOX_BATCH_SIZE: int = 200
+    OUTBOX_POLL_INTERVAL: float = 0.5
+    OUTBOX_RETRY_MAX_DELAY: float = 300.0
+    # How long delivered event keys are remembered to suppress duplicate rows
+    OUTBOX_DELIVERED_RETENTION_DAYS: int = 30
+    # How long per-bucket user sets behind join_stats.distinct_users are kept
+    # (only late events need them; range reports count users from the ledger)
+    JOIN_STATS_USERS_RETENTION_DAYS: float = 7.0
+
+    # Prometheus-style /metrics endpoint (keep it on a private interface)
+    METRICS_ENABLED: bool = False
+    METRICS_HOST: str = "127.0.0.1"
+    METRICS_PORT: int = 9100
+
 
 @lru_cache(maxsize=1)
 def get_settings() -> Settings:
@@ -0,0 +1,283 @@
+"""Ordered, bounded dispatch of updates to the handlers.
+
+``ChannelExecutorMiddleware`` sits in front of the routers as an outer
+``update`` middleware. Updates of one channel start in arrival order (FIFO
+semaphore per channel, at most ``channel_concurrency`` in flight, 1 keeps
+them strictly sequential) and at most ``max_concurrency`` updates are handled
+at once overall. Updates without a chat pass through under the global limit
+only.
+
+Waiting updates are bounded: at most ``channel_queue`` per channel and
+``max_queue`` in total. Past that the ``overflow`` policy applies:
+
+``shed``: the update is dropped, logged and counted.
+``spill``: the update is serialized into SQLite (``spilled_updates``) and a
+background task feeds it back to the Dispatcher once the queues drained.
+While a channel has spilled updates its new ones are spilled too, so the
+channel's order survives the detour.
+
+Queue depth, in-flight count and shed/spilled totals are exported as metrics.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Set
+
+from aiogram import BaseMiddleware, Bot, Dispatcher
+from aiogram.types import Update
+
+from .config import Settings
+from .metrics import UPDATE_QUEUE_WAIT_SECONDS, UPDATES_IN_FLIGHT, UPDATES_SHED, UPDATES_SPILLED
+from .services.db import Database, SpilledUpdate
+
+
+OVERFLOW_SHED = "shed"
+OVERFLOW_SPILL = "spill"
+
+# Handler data key marking an update fed back from the spill table
+REPLAY_KEY = "spill_replay"
+
+
+def update_channel_id(update: Any) -> Optional[int]:
+    """Chat id the update belongs to (None for updates without a chat)."""
+    event = getattr(update, "event", None)
+    return getattr(getattr(event, "chat", None), "id", None)
+
+
+@dataclass
+class _ChannelSlot:
+    semaphore: asyncio.Semaphore
+    waiting: int = 0
+    active: int = 0
+
+
+class ChannelExecutorMiddleware(BaseMiddleware):
+    def __init__(
+        self,
+        db: Optional[Database] = None,
+        max_concurrency: int = 64,
+        channel_concurrency: int = 1,
+        channel_queue: int = 1000,
+        max_queue: int = 10000,
+        overflow: str = OVERFLOW_SPILL,
+        replay_interval: float = 1.0,
+        replay_batch: int = 100,
+    ):
+        overflow = overflow.lower()
+        if overflow not in (OVERFLOW_SHED, OVERFLOW_SPILL):
+            raise RuntimeError(f"Unknown dispatch overflow policy '{overflow}', expected 'shed' or 'spill'")
+        if overflow == OVERFLOW_SPILL and db is None:
+            raise RuntimeError("Dispatch overflow policy 'spill' needs a database")
+        self.db = db
+        self.max_concurrency = max(1, max_concurrency)
+        self.channel_concurrency = max(1, channel_concurrency)
+        self.channel_queue = max(1, channel_queue)
+        self.max_queue = max(1, max_queue)
+        self.overflow = overflow
+        self.replay_interval = replay_interval
+        self.replay_batch = max(1, replay_batch)
+        self._global = asyncio.Semaphore(self.max_concurrency)
+        self._channels: Dict[int, _ChannelSlot] = {}
+        # channel_id -> updates of it still in spilled_updates
+        self._spilled: Dict[int, int] = {}
+        self._replaying: Set[int] = set()
+        self._replay_tasks: Set[asyncio.Task] = set()
+        self.waiting = 0
+        self.in_flight = 0
+        self._bot: Optional[Bot] = None
+        self._dispatcher: Optional[Dispatcher] = None
+        self._stopping = False
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def spilled(self) -> int:
+        """Updates parked on disk and not yet replayed."""
+        return sum(self._spilled.values())
+
+    def max_channel_depth(self) -> int:
+        return max((slot.waiting for slot in self._channels.values()), default=0)
+
+    async def __call__(self, handler, event, data):  # type: ignore[override]
+        channel_id = update_channel_id(event)
+        if channel_id is None:
+            async with self._global:
+                return await handler(event, data)
+        replay = bool(data.get(REPLAY_KEY))
+        if not replay:
+            if self._spilled.get(channel_id):
+                # Keep the channel's order: queue behind what is already on disk
+                return await self._overflow(channel_id, event, "channel_spilled")
+            slot = self._channels.get(channel_id)
+            if slot is not None and slot.waiting >= self.channel_queue:
+                return await self._overflow(channel_id, event, "channel_queue_full")
+            if self.waiting >= self.max_queue:
+                return await self._overflow(channel_id, event, "queue_full")
+
+        slot = self._channels.get(channel_id)
+        if slot is None:
+            slot = self._channels[channel_id] = _ChannelSlot(asyncio.Semaphore(self.channel_concurrency))
+        slot.waiting += 1
+        self.waiting += 1
+        started = time.perf_counter()
+        try:
+            await slot.semaphore.acquire()
+            try:
+                await self._global.acquire()
+            except BaseException:
+                slot.semaphore.release()
+                raise
+        except BaseException:
+            self._forget_if_idle(channel_id, slot)
+            raise
+        finally:
+            slot.waiting -= 1
+            self.waiting -= 1
+        UPDATE_QUEUE_WAIT_SECONDS.observe(time.perf_counter() - started)
+
+        slot.active += 1
+        self.in_flight += 1
+        UPDATES_IN_FLIGHT.set(self.in_flight)
+        try:
+            return await handler(event, data)
+        finally:
+            slot.active -= 1
+            self.in_flight -= 1
+            UPDATES_IN_FLIGHT.set(self.in_flight)
+            self._global.release()
+            slot.semaphore.release()
+            self._forget_if_idle(channel_id, slot)
+            if self._spilled and self.waiting < self.max_queue // 2:
+                self._wakeup.set()
+
+    def _forget_if_idle(self, channel_id: int, slot: _ChannelSlot) -> None:
+        if slot.waiting == 0 and slot.active == 0 and self._channels.get(channel_id) is slot:
+            del self._channels[channel_id]
+
+    async def _overflow(self, channel_id: int, update: Update, reason: str) -> None:
+        log = logging.getLogger(__name__)
+        extra = {"channel_id": channel_id, "operation": "dispatch_overflow"}
+        if self.overflow == OVERFLOW_SPILL and self.db is not None:
+            # Counted before the insert so a replay racing with it cannot underflow
+            self._spilled[channel_id] = self._spilled.get(channel_id, 0) + 1
+            try:
+                await self.db.spill_update(
+                    channel_id,
+                    update.model_dump_json(by_alias=True, exclude_none=True),
+                    int(time.time()),
+                )
+            except Exception as e:
+                self._discount_spilled(channel_id)
+                log.exception("Could not spill update %s, dropping it: %s", update.update_id, e, extra=extra)
+            else:
+                UPDATES_SPILLED.inc(reason=reason)
+                return None
+        log.warning("Dispatch queue full (%s), dropping update %s", reason, update.update_id, extra=extra)
+        UPDATES_SHED.inc(reason=reason)
+        return None
+
+    def _discount_spilled(self, channel_id: int) -> None:
+        remaining = self._spilled.get(channel_id, 0) - 1
+        if remaining > 0:
+            self._spilled[channel_id] = remaining
+        else:
+            self._spilled.pop(channel_id, None)
+
+    async def replay_once(self) -> int:
+        """Feed a batch of spilled updates back to the Dispatcher; return how many."""
+        if not self._spilled or self.db is None or self._dispatcher is None or self._bot is None:
+            return 0
+        if self.waiting >= self.max_queue // 2:
+            return 0
+        started = 0
+        for item in await self.db.fetch_spilled_updates(self.replay_batch):
+            if item.id in self._replaying:
+                continue
+            self._replaying.add(item.id)
+            # Tasks start in id order, so each channel's updates queue in order
+            task = asyncio.get_running_loop().create_task(self._replay(item))
+            self._replay_tasks.add(task)
+            task.add_done_callback(self._replay_tasks.discard)
+            started += 1
+        return started
+
+    async def _replay(self, item: SpilledUpdate) -> None:
+        assert self._dispatcher is not None and self._bot is not None
+        try:
+            try:
+                update = Update.model_validate_json(item.payload, context={"bot": self._bot})
+                await self._dispatcher.feed_update(self._bot, update, **{REPLAY_KEY: True})
+            except asyncio.CancelledError:
+                # Left in spilled_updates for the next start
+                raise
+            except Exception as e:
+                logging.getLogger(__name__).exception(
+                    "Replaying spilled update %s failed: %s", item.id, e,
+                    extra={"channel_id": item.channel_id, "operation": "dispatch_replay"},
+                )
+            await self.db.delete_spilled_update(item.id)  # type: ignore[union-attr]
+            self._discount_spilled(item.channel_id)
+        finally:
+            self._replaying.discard(item.id)
+            if self._spilled:
+                self._wakeup.set()
+
+    async def run(self) -> None:
+        """Replay spilled updates until stopped."""
+        while not self._stopping:
+            try:
+                await self.replay_once()
+            except Exception as e:
+                logging.getLogger(__name__).exception(
+                    "Spilled update replay failed: %s", e, extra={"operation": "dispatch_replay"}
+                )
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.replay_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def start(self, bot: Bot, dispatcher: Dispatcher) -> None:
+        """Pick up updates spilled by a previous run and start the replay task."""
+        self._bot = bot
+        self._dispatcher = dispatcher
+        if self.db is None:
+            return
+        self._spilled = await self.db.count_spilled_updates_by_channel()
+        if self._spilled:
+            logging.getLogger(__name__).info(
+                "%d spilled updates to replay", self.spilled, extra={"operation": "dispatch_replay"}
+            )
+        self._stopping = False
+        self._task = asyncio.get_running_loop().create_task(self.run())
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        """Stop replaying; updates not handled yet stay in SQLite."""
+        self._stopping = True
+        self._wakeup.set()
+        if self._task is not None:
+            try:
+                await asyncio.wait_for(self._task, timeout=timeout)
+            except asyncio.TimeoutError:
+                self._task.cancel()
+            finally:
+                self._task = None
+        for task in list(self._replay_tasks):
+            task.cancel()
+        if self._replay_tasks:
+            await asyncio.gather(*self._replay_tasks, return_exceptions=True)
+
+
+def create_channel_executor_from_settings(db: Database, settings: Settings) -> ChannelExecutorMiddleware:
+    return ChannelExecutorMiddleware(
+        db,
+        max_concurrency=settings.DISPATCH_MAX_CONCURRENCY,
+        channel_concurrency=settings.DISPATCH_CHANNEL_CONCURRENCY,
+        channel_queue=settings.DISPATCH_CHANNEL_QUEUE,
+        max_queue=settings.DISPATCH_MAX_QUEUE,
+        overflow=settings.DISPATCH_OVERFLOW,
+        replay_interval=settings.DISPATCH_REPLAY_INTERVAL,
+    )
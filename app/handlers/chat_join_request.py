@@ -1,12 +1,15 @@
 import logging
 from datetime import datetime, timezone
+from typing import Optional
 from zoneinfo import ZoneInfo
 
 from aiogram import Router
-from aiogram.types import ChatJoinRequest
+from aiogram.types import ChatJoinRequest, Update
 
 from ..services.container import get_container
-from ..services.google_sheets import sanitize_sheet_title
+from ..services.channels import resolve_sheet_name
+from ..services.db import EVENT_JOIN_REQUEST, JoinEvent
+from ..services.google_sheets import OUTCOME_PENDING
 from ..config import get_settings
 from ..utils import join_cache
 
@@ -15,8 +18,8 @@ router = Router(name=__name__)
 
 
 @router.chat_join_request()
-async def on_chat_join_request(update: ChatJoinRequest):
-    """Handle join requests (channels with approval). Write a row to Google Sheets."""
+async def on_chat_join_request(update: ChatJoinRequest, event_update: Optional[Update] = None):
+    """Handle join requests (channels with approval). Record the event and queue its Sheets row."""
     chat = update.chat
     if chat is None or chat.type not in ("channel", "supergroup"):
         return
@@ -37,15 +40,19 @@ async def on_chat_join_request(update: ChatJoinRequest):
         invite_name = "(request link)"
 
     container = get_container()
-    sheet_name = await container.db.get_sheet_name(channel_id)
-    if not sheet_name:
-        sheet_title = sanitize_sheet_title(channel_title)
-        sheet_name = await container.gsheets.ensure_sheet(sheet_title)
-        await container.db.upsert_channel(channel_id, sheet_name)
+    sheet_name = await resolve_sheet_name(container, channel_id, channel_title)
 
-    # Deduplicate: skip if the same (channel_id, user_id) was logged within the last 12 hours
+    settings = get_settings()
+    tz = ZoneInfo(settings.TIMEZONE)
+    now_local = datetime.now(tz)
+    ts = now_local.strftime("%Y-%m-%d %H:%M:%S")
+    now_epoch = int(datetime.now(timezone.utc).timestamp())
+
+    # Deduplicate: skip if the same (channel_id, user_id) was logged within the dedup window
+    # (JOIN_REQUEST_DEDUP_SECONDS, 12h by default); answered from memory in steady state
+    dedup = container.dedup
     try:
-        last_logged = await container.db.get_last_join_request_logged_at(channel_id, user.id)
+        last_logged = await dedup.recently_logged(channel_id, user.id, now_epoch)
     except Exception as e:
         last_logged = None
         logging.getLogger(__name__).warning(
@@ -54,15 +61,10 @@ async def on_chat_join_request(update: ChatJoinRequest):
             extra={"channel_id": channel_id, "user_id": user.id, "operation": "chat_join_request_dedup"},
         )
 
-    tz = ZoneInfo(get_settings().TIMEZONE)
-    now_local = datetime.now(tz)
-    ts = now_local.strftime("%Y-%m-%d %H:%M:%S")
-    now_epoch = int(datetime.now(timezone.utc).timestamp())
-
-    # If last_logged exists and is within 12 hours (43200 seconds), skip writing
-    if last_logged is not None and (now_epoch - int(last_logged)) < 12 * 60 * 60:
+    if last_logged is not None:
         logging.getLogger(__name__).info(
-            "Skipping join request (dedup 12h): already logged at %s",
+            "Skipping join request (dedup %ss): already logged at %s",
+            dedup.window_seconds,
             last_logged,
             extra={"channel_id": channel_id, "user_id": user.id, "operation": "chat_join_request_skip_dedup"},
         )
@@ -72,6 +74,17 @@ async def on_chat_join_request(update: ChatJoinRequest):
         except Exception:
             pass
         return
+    event = JoinEvent(
+        channel_id=channel_id,
+        user_id=user.id,
+        event_type=EVENT_JOIN_REQUEST,
+        occurred_at=now_epoch,
+        invite_link=invite_url,
+        link_name=invite_name,
+        full_name=full_name,
+        username=username,
+        update_id=getattr(event_update, "update_id", None),
+    )
     row = [
         ts,
         str(user.id),
@@ -79,10 +92,17 @@ async def on_chat_join_request(update: ChatJoinRequest):
         username,
         invite_url,
         invite_name or "(request)",
+        event.event_key,
     ]
+    deliver_after = 0
+    if settings.JOIN_REQUEST_COALESCE_SECONDS > 0:
+        # Held back so an approval within the window completes this row
+        # (Approved At, Outcome) instead of costing its own write
+        row += ["", OUTCOME_PENDING]
+        deliver_after = now_epoch + settings.JOIN_REQUEST_COALESCE_SECONDS
 
     logging.getLogger(__name__).info(
-        "Appending join request to sheet='%s'...",
+        "Queueing join request for sheet='%s'...",
         sheet_name,
         extra={"channel_id": channel_id, "user_id": user.id, "operation": "chat_join_request"},
     )
@@ -94,18 +114,15 @@ async def on_chat_join_request(update: ChatJoinRequest):
             "Failed to cache join request metadata",
             extra={"channel_id": channel_id, "user_id": user.id, "operation": "chat_join_request"},
         )
-    await container.gsheets.append_row(sheet_name, row)
-    # Update dedup log timestamp
-    try:
-        await container.db.upsert_join_request_logged_at(channel_id, user.id, now_epoch)
-    except Exception as e:
-        logging.getLogger(__name__).warning(
-            "Failed to update dedup state: %s",
-            e,
-            extra={"channel_id": channel_id, "user_id": user.id, "operation": "chat_join_request_dedup"},
-        )
+    # Append to the event ledger and the outbox in one transaction; the
+    # background drainer delivers the row to Sheets
+    await container.db.record_join_event(event, sheet_name, row, deliver_after=deliver_after)
+    if not deliver_after:
+        container.notify_outbox()
+    # Update dedup state (flushed to join_request_log in batches)
+    dedup.mark(channel_id, user.id, now_epoch)
     logging.getLogger(__name__).info(
-        "Appended join request: sheet='%s'",
+        "Queued join request: sheet='%s'",
         sheet_name,
         extra={"channel_id": channel_id, "user_id": user.id, "operation": "chat_join_request"},
     )
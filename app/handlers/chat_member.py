@@ -1,19 +1,103 @@
 import logging
-from datetime import datetime
+from datetime import datetime, timezone
+from typing import Optional, Tuple
 from zoneinfo import ZoneInfo
 from aiogram import Router
-from aiogram.types import ChatMemberUpdated
+from aiogram.types import ChatMemberUpdated, Update
 
 from ..services.container import get_container
-from ..services.google_sheets import sanitize_sheet_title
+from ..services.channels import resolve_sheet_name
+from ..services.db import EVENT_JOIN, EVENT_JOIN_REQUEST, JoinEvent
+from ..services.google_sheets import (
+    APPROVED_AT_INDEX,
+    LEFT_AT_INDEX,
+    OUTCOME_APPROVED,
+    OUTCOME_INDEX,
+    STATUS_INDEX,
+)
 from ..utils import join_cache
 
 router = Router(name=__name__)
 
 
+async def _record_approval(
+    update: ChatMemberUpdated,
+    user,
+    cached_request: Optional[Tuple[str, str]],
+    event_update: Optional[Update],
+) -> None:
+    """Record an approved join request as a ledger-only join (no Sheets row)."""
+    # Prefer the request's own link so per-link funnels line up
+    invite_url, invite_name = cached_request or ("", "")
+    invite_url = invite_url or getattr(update.invite_link, "invite_link", "") or ""
+    invite_name = invite_name or getattr(update.invite_link, "name", "") or ""
+    await get_container().db.record_join_event(JoinEvent(
+        channel_id=update.chat.id,
+        user_id=user.id,
+        event_type=EVENT_JOIN,
+        occurred_at=int(datetime.now(timezone.utc).timestamp()),
+        invite_link=invite_url,
+        link_name=invite_name,
+        full_name=getattr(user, "full_name", None) or "",
+        username=f"@{user.username}" if getattr(user, "username", None) else "",
+        update_id=getattr(event_update, "update_id", None),
+    ))
+
+
+def _local_now() -> str:
+    from ..config import get_settings
+    return datetime.now(ZoneInfo(get_settings().TIMEZONE)).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _approval_cells() -> dict:
+    return {APPROVED_AT_INDEX: _local_now(), OUTCOME_INDEX: OUTCOME_APPROVED}
+
+
+async def _coalesce_approval(channel_id: int, user_id: int) -> bool:
+    """Merge the approval into the user's join request row if it is still held back."""
+    from ..config import get_settings
+    if get_settings().JOIN_REQUEST_COALESCE_SECONDS <= 0:
+        return False
+    container = get_container()
+    coalesced = await container.db.coalesce_outbox_row(
+        channel_id,
+        user_id,
+        EVENT_JOIN_REQUEST,
+        _approval_cells(),
+        int(datetime.now(timezone.utc).timestamp()),
+    )
+    if coalesced:
+        # The completed row is due now rather than at the end of the window
+        container.notify_outbox()
+    return coalesced
+
+
+async def _record_leave(update: ChatMemberUpdated, status: str) -> None:
+    """Mark the member's latest row as left/kicked, edited in place in the sheet."""
+    member = update.new_chat_member or update.old_chat_member
+    user = getattr(member, "user", None)
+    if user is None:
+        return
+    container = get_container()
+    event_key = await container.db.queue_row_update(
+        update.chat.id, user.id, {LEFT_AT_INDEX: _local_now(), STATUS_INDEX: status}
+    )
+    if event_key is None:
+        logging.getLogger(__name__).info(
+            "Skipping chat_member: %s without a logged row", status,
+            extra={"channel_id": update.chat.id, "user_id": user.id, "operation": "chat_member_skip"},
+        )
+        return
+    container.notify_outbox()
+    logging.getLogger(__name__).info(
+        "Queued %s status for row %s", status, event_key,
+        extra={"channel_id": update.chat.id, "user_id": user.id, "operation": "chat_member_leave"},
+    )
+
+
 @router.chat_member()
-async def on_chat_member(update: ChatMemberUpdated):
-    """Handle new member joins via invite link and write a row to Google Sheets."""
+async def on_chat_member(update: ChatMemberUpdated, event_update: Optional[Update] = None):
+    """Handle new member joins via invite link; record the event and queue its Sheets row."""
     chat = update.chat
     if chat is None or chat.type not in ("channel", "supergroup"):
         logging.getLogger(__name__).info(
@@ -25,6 +109,9 @@ async def on_chat_member(update: ChatMemberUpdated):
 
     # Only when a user became "member" and joined via invite link
     new_status = update.new_chat_member.status if update.new_chat_member else None
+    if new_status in ("left", "kicked"):
+        await _record_leave(update, new_status)
+        return
     if new_status != "member":
         logging.getLogger(__name__).info(
             "Skipping chat_member: new_status=%s",
@@ -37,20 +124,37 @@ async def on_chat_member(update: ChatMemberUpdated):
     if user is None:
         return
     # If this membership event is an approval of a previously submitted join request,
-    # we do NOT log it to avoid duplicate rows (join request was already recorded).
-    if getattr(update, "via_join_request", False):
-        logging.getLogger(__name__).info(
-            "Skipping chat_member: approval of join request (already logged at request time)",
-            extra={"channel_id": chat.id, "user_id": getattr(user, "id", None), "operation": "chat_member_skip_join_request"},
-        )
-        return
+    # we do NOT log it to Sheets to avoid duplicate rows (join request was already recorded).
     # Additionally, if we have a recent cached join request for this user in this chat,
-    # treat this as the approval path and skip logging to avoid duplicates even if the flag is absent.
-    if join_cache.pop(chat.id, user.id):
-        logging.getLogger(__name__).info(
-            "Skipping chat_member: matched cached join request (avoiding duplicate)",
-            extra={"channel_id": chat.id, "user_id": user.id, "operation": "chat_member_skip_cached_request"},
-        )
+    # treat this as the approval path even if the flag is absent.
+    # With JOIN_REQUEST_COALESCE_SECONDS the request's row may still be held back:
+    # the approval is merged into it, which also recognizes approvals whose flag
+    # is missing and whose cache entry has expired.
+    cached_request = join_cache.pop(chat.id, user.id)
+    coalesced = await _coalesce_approval(chat.id, user.id)
+    if getattr(update, "via_join_request", False) or cached_request or coalesced:
+        if getattr(update, "via_join_request", False):
+            logging.getLogger(__name__).info(
+                "Skipping chat_member: approval of join request (already logged at request time)",
+                extra={"channel_id": chat.id, "user_id": getattr(user, "id", None), "operation": "chat_member_skip_join_request"},
+            )
+        elif cached_request:
+            logging.getLogger(__name__).info(
+                "Skipping chat_member: matched cached join request (avoiding duplicate)",
+                extra={"channel_id": chat.id, "user_id": user.id, "operation": "chat_member_skip_cached_request"},
+            )
+        else:
+            logging.getLogger(__name__).info(
+                "Skipping chat_member: matched held-back join request row",
+                extra={"channel_id": chat.id, "user_id": user.id, "operation": "chat_member_skip_coalesced_request"},
+            )
+        # The approval still completes the request -> join funnel in the ledger
+        await _record_approval(update, user, cached_request, event_update)
+        from ..config import get_settings
+        if not coalesced and get_settings().JOIN_REQUEST_COALESCE_SECONDS > 0:
+            # The request row was already written as pending: edit it in place
+            if await get_container().db.queue_row_update(chat.id, user.id, _approval_cells()) is not None:
+                get_container().notify_outbox()
         return
     # Determine whether this is an invite-based join.
     # Bot API: invite_link present when user joins via link; via_join_request indicates approved request without link in this update;
@@ -81,19 +185,16 @@ async def on_chat_member(update: ChatMemberUpdated):
     if not invite_url and not invite_name:
         invite_name = "(no invite)"
 
-    # Resolve sheet name from DB or create fallback
+    # Resolve the channel's worksheet locally (a new one is created by the
+    # writer with its first row)
     container = get_container()
-    sheet_name = await container.db.get_sheet_name(channel_id)
-    if not sheet_name:
-        # Fallback: ensure sheet by channel title and persist mapping
-        sheet_title = sanitize_sheet_title(channel_title)
-        sheet_name = await container.gsheets.ensure_sheet(sheet_title)
-        await container.db.upsert_channel(channel_id, sheet_name)
+    sheet_name = await resolve_sheet_name(container, channel_id, channel_title)
 
     # Prepare row, timestamp in configured timezone (default Europe/Moscow)
     from ..config import get_settings
     tz = ZoneInfo(get_settings().TIMEZONE)
     ts = datetime.now(tz).strftime("%Y-%m-%d %H:%M:%S")
+    now_epoch = int(datetime.now(timezone.utc).timestamp())
     # Diagnostics for invite-related flags
     logging.getLogger(__name__).info(
         "Join flags: has_invite_link=%s, via_join_request=%s, via_chat_folder_invite_link=%s",
@@ -102,6 +203,17 @@ async def on_chat_member(update: ChatMemberUpdated):
         getattr(update, "via_chat_folder_invite_link", False),
         extra={"channel_id": channel_id, "user_id": user.id, "operation": "chat_member_flags"},
     )
+    event = JoinEvent(
+        channel_id=channel_id,
+        user_id=user.id,
+        event_type=EVENT_JOIN,
+        occurred_at=now_epoch,
+        invite_link=invite_url,
+        link_name=invite_name,
+        full_name=full_name,
+        username=username,
+        update_id=getattr(event_update, "update_id", None),
+    )
     row = [
         ts,
         str(user.id),
@@ -109,18 +221,22 @@ async def on_chat_member(update: ChatMemberUpdated):
         username,
         invite_url,
         invite_name,
+        event.event_key,
     ]
 
     logging.getLogger(__name__).info(
-        "Appending join event to sheet='%s'...",
+        "Queueing join event for sheet='%s'...",
         sheet_name,
         extra={"channel_id": channel_id, "user_id": user.id, "operation": "chat_member_prepare"},
     )
 
-    await container.gsheets.append_row(sheet_name, row)
+    # Append to the event ledger and the outbox in one transaction; the
+    # background drainer delivers the row to Sheets
+    await container.db.record_join_event(event, sheet_name, row)
+    container.notify_outbox()
 
     logging.getLogger(__name__).info(
-        "Appended join event: sheet='%s'",
+        "Queued join event: sheet='%s'",
         sheet_name,
         extra={"channel_id": channel_id, "user_id": user.id, "operation": "chat_member_join"},
     )
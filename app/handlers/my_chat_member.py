@@ -3,7 +3,7 @@ from aiogram import Router
 from aiogram.types import ChatMemberUpdated
 
 from ..services.container import get_container
-from ..services.google_sheets import sanitize_sheet_title
+from ..services.channels import resolve_sheet_name
 
 router = Router(name=__name__)
 
@@ -36,12 +36,9 @@ async def on_my_chat_member(update: ChatMemberUpdated):
         )
         return
 
-    # Ensure a sheet exists for this channel; use channel title (sanitized)
-    sheet_title = sanitize_sheet_title(channel_title)
-    final_title = await container.gsheets.ensure_sheet(sheet_title)
-
-    # Save mapping in the local DB
-    await container.db.upsert_channel(channel_id=channel_id, sheet_name=final_title)
+    # Save the mapping (sanitized, unique title); the worksheet is created with
+    # the first row. Coalesced with any join handler resolving it concurrently
+    final_title = await resolve_sheet_name(container, channel_id, channel_title)
 
     logging.getLogger(__name__).info(
         "Initialized channel mapping: sheet='%s'",
@@ -1,5 +1,21 @@
+import atexit
+import copy
+import json
 import logging
+import logging.handlers
+import queue
 import sys
+import time
+from typing import Dict, Optional, Tuple
+
+
+# Operations whose records are rate limited by default: "Skipping chat_member"
+# lines are emitted for most updates of a busy channel
+RATE_LIMITED_OPERATIONS = ("chat_member_skip",)
+
+CONTEXT_FIELDS = ("channel_id", "user_id", "operation")
+
+_listener: Optional[logging.handlers.QueueListener] = None
 
 
 class ContextDefaultsFilter(logging.Filter):
@@ -16,17 +32,115 @@ class ContextDefaultsFilter(logging.Filter):
         return True
 
 
-def setup_logging(level: str = "INFO") -> None:
-    """Configure root logger for the application with contextual fields."""
-    handler = logging.StreamHandler(stream=sys.stdout)
-    handler.addFilter(ContextDefaultsFilter())
-    formatter = logging.Formatter(
-        fmt="%(asctime)s | %(levelname)s | %(name)s | op=%(operation)s | ch=%(channel_id)s | user=%(user_id)s | %(message)s",
-        datefmt="%Y-%m-%d %H:%M:%S",
-    )
-    handler.setFormatter(formatter)
+class OperationRateLimitFilter(logging.Filter):
+    """Let through at most `per_minute` records per operation matching `prefixes`.
+
+    Budgets are tracked per exact ``operation`` value. Dropped records are
+    counted and reported on the next record let through for that operation.
+    Records at WARNING and above are never dropped.
+    """
+
+    def __init__(self, per_minute: int, prefixes: Tuple[str, ...] = RATE_LIMITED_OPERATIONS):
+        super().__init__()
+        self.per_minute = per_minute
+        self.prefixes = prefixes
+        # operation -> (window start, records passed in window, records suppressed)
+        self._windows: Dict[str, list] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:  # type: ignore[override]
+        operation = getattr(record, "operation", None)
+        if (
+            self.per_minute <= 0
+            or record.levelno >= logging.WARNING
+            or not isinstance(operation, str)
+            or not operation.startswith(self.prefixes)
+        ):
+            return True
+        now = time.monotonic()
+        window = self._windows.get(operation)
+        if window is None or now - window[0] >= 60.0:
+            suppressed = window[2] if window else 0
+            window = self._windows[operation] = [now, 0, 0]
+            if suppressed:
+                record.msg = f"{record.msg} (suppressed {suppressed} similar in the last minute)"
+        if window[1] >= self.per_minute:
+            window[2] += 1
+            return False
+        window[1] += 1
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line with the contextual fields as top-level keys."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "ts": self.formatTime(record, "%Y-%m-%dT%H:%M:%S") + f".{int(record.msecs):03d}",
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for field in CONTEXT_FIELDS:
+            value = getattr(record, field, None)
+            if value not in (None, "-"):
+                payload[field] = value
+        if record.exc_info:
+            payload["exc_info"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            payload["exc_info"] = record.exc_text
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Merge args now (they may be mutated after the call) but leave
+        # formatting, including tracebacks, to the listener thread
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+def _stop_listener() -> None:
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def setup_logging(level: str = "INFO", fmt: str = "text", skip_rate_per_minute: int = 0) -> None:
+    """Configure root logger for the application with contextual fields.
+
+    Records are put on an in-memory queue by the calling thread (the event
+    loop) and formatted and written to stdout by a background listener
+    thread, so slow terminals or pipes never block update handling. The
+    listener is flushed at interpreter exit.
+    """
+    global _listener
+    _stop_listener()
+
+    output = logging.StreamHandler(stream=sys.stdout)
+    output.addFilter(ContextDefaultsFilter())
+    if fmt.lower() == "json":
+        output.setFormatter(JsonFormatter())
+    else:
+        output.setFormatter(logging.Formatter(
+            fmt="%(asctime)s | %(levelname)s | %(name)s | op=%(operation)s | ch=%(channel_id)s | user=%(user_id)s | %(message)s",
+            datefmt="%Y-%m-%d %H:%M:%S",
+        ))
+
+    handler = _QueueHandler(queue.SimpleQueue())
+    if skip_rate_per_minute > 0:
+        # Drop excess records before they are queued
+        handler.addFilter(OperationRateLimitFilter(skip_rate_per_minute))
+
+    _listener = logging.handlers.QueueListener(handler.queue, output, respect_handler_level=True)
+    _listener.start()
 
     root = logging.getLogger()
     root.handlers.clear()
     root.addHandler(handler)
     root.setLevel(getattr(logging, level.upper(), logging.INFO))
+
+
+atexit.register(_stop_listener)
@@ -4,19 +4,58 @@ import logging
 from aiogram import Bot, Dispatcher
 from aiogram.enums import ParseMode
 
-from .config import get_settings
+from .config import Settings, get_settings
+from .dispatch import create_channel_executor_from_settings
 from .logging_config import setup_logging
+from .metrics import HandlerMetricsMiddleware, register_service_metrics, start_metrics_server
 from .handlers.my_chat_member import router as my_chat_member_router
 from .handlers.chat_member import router as chat_member_router
 from .handlers.chat_join_request import router as chat_join_request_router
 from .services.container import ServiceContainer, set_container
 from .services.db import Database
-from .services.google_sheets import create_google_sheets_service_from_settings
+from .services.dedup import create_join_request_dedup_from_settings
+from .services.outbox import create_outbox_drainer_from_settings
+from .services.partitions import create_rollover_policy_from_settings
+from .services.google_auth import TokenRefresher
+from .services.google_sheets import create_batch_writer_from_settings, create_token_refresher_from_settings
+from .services.shards import SheetsShards, create_sheets_shards_from_settings
+from .webhook import run_webhook
+
+
+async def warm_up_sheets(shards: SheetsShards, settings: Settings, token_refreshers: list[TokenRefresher]) -> None:
+    """Load the Sheets client and credentials, start token refreshers and run the self-check.
+
+    Runs next to DB init and keeps going after polling has started; until it
+    is done the first Sheets call simply authenticates inline.
+    """
+    log = logging.getLogger(__name__)
+    started = asyncio.get_running_loop().time()
+    try:
+        await shards.warm_up()
+    except Exception as e:
+        log.exception("Google Sheets warm-up failed: %s", e, extra={"operation": "startup"})
+        return
+    # Keep access tokens fresh so no write waits on an OAuth round trip
+    for service in shards:
+        refresher = create_token_refresher_from_settings(service, settings)
+        if refresher is not None:
+            refresher.start()
+            token_refreshers.append(refresher)
+    if settings.GSHEETS_SELF_CHECK:
+        try:
+            await shards.health_check()
+        except Exception as e:
+            log.exception("Google Sheets self-check failed: %s", e)
+            # proceed to run to allow transient errors to resolve via backoff
+    log.info(
+        "Google Sheets ready in %.3fs", asyncio.get_running_loop().time() - started,
+        extra={"operation": "startup"},
+    )
 
 
 async def main() -> None:
     settings = get_settings()
-    setup_logging(settings.LOG_LEVEL)
+    setup_logging(settings.LOG_LEVEL, settings.LOG_FORMAT, settings.LOG_SKIP_RATE_PER_MINUTE)
 
     # Optional: Sentry init
     if settings.SENTRY_DSN:
@@ -69,25 +108,83 @@ async def main() -> None:
         )
         return True
 
+    db = Database(
+        settings.DB_PATH,
+        stats_timezone=settings.TIMEZONE,
+        stats_users_retention_days=settings.JOIN_STATS_USERS_RETENTION_DAYS,
+    )
+    # Per-channel ordering and bounded queues; registered first so the
+    # handler histogram below measures handling, not queueing
+    executor = create_channel_executor_from_settings(db, settings)
+    dp.update.outer_middleware(executor)
+    # Per-update-type latency histogram
+    dp.update.outer_middleware(HandlerMetricsMiddleware())
+
     # Register routers
     dp.include_router(my_chat_member_router)
     dp.include_router(chat_member_router)
     dp.include_router(chat_join_request_router)
 
+    # One service per spreadsheet shard; shard 0 is GOOGLE_SPREADSHEET_ID.
+    # Construction is cheap: client libraries and credentials load in warm-up.
+    shards = create_sheets_shards_from_settings(settings)
+    gsheets = shards[0]
+    # Sheets warm-up runs concurrently with DB init and carries on in the
+    # background: updates are accepted as soon as the local DB is ready
+    token_refreshers: list[TokenRefresher] = []
+    sheets_warm_up = asyncio.create_task(warm_up_sheets(shards, settings, token_refreshers))
+
     # Initialize services and set container
-    db = Database(settings.DB_PATH)
     await db.init_db()
-    gsheets = create_google_sheets_service_from_settings(settings)
-    if settings.GSHEETS_SELF_CHECK:
-        try:
-            await gsheets.health_check()
-        except Exception as e:
-            logging.getLogger(__name__).exception("Google Sheets self-check failed: %s", e)
-            # proceed to run to allow transient errors to resolve via backoff
-    set_container(ServiceContainer(db=db, gsheets=gsheets))
+    writer = create_batch_writer_from_settings(shards, settings)
+    dedup = create_join_request_dedup_from_settings(db, settings)
+    await dedup.warm_up()
+    dedup.start(
+        flush_interval=settings.JOIN_REQUEST_DEDUP_FLUSH_INTERVAL,
+        prune_interval=settings.JOIN_REQUEST_LOG_PRUNE_INTERVAL,
+    )
+    # Handlers only enqueue rows; this task delivers them to Google Sheets
+    drainer = create_outbox_drainer_from_settings(db, writer, settings)
+    set_container(ServiceContainer(
+        db=db,
+        gsheets=gsheets,
+        writer=writer,
+        dedup=dedup,
+        rollover=create_rollover_policy_from_settings(settings),
+        shards=shards,
+        drainer=drainer,
+    ))
+    drainer.start()
+    # Replays updates spilled under overload (including by a previous run)
+    await executor.start(bot, dp)
 
-    logging.getLogger(__name__).info("Starting bot polling...")
-    await dp.start_polling(bot)
+    metrics_runner = None
+    if settings.METRICS_ENABLED:
+        register_service_metrics(db, writer=writer, dedup=dedup, quota=shards, executor=executor)
+        metrics_runner = await start_metrics_server(settings.METRICS_HOST, settings.METRICS_PORT)
+
+    try:
+        if settings.BOT_MODE.lower() == "webhook":
+            logging.getLogger(__name__).info("Starting bot in webhook mode...")
+            await run_webhook(dp, bot, settings)
+        else:
+            logging.getLogger(__name__).info("Starting bot polling...")
+            await dp.start_polling(bot)
+    finally:
+        if not sheets_warm_up.done():
+            sheets_warm_up.cancel()
+        await asyncio.gather(sheets_warm_up, return_exceptions=True)
+        await executor.stop()
+        await drainer.stop()
+        for refresher in token_refreshers:
+            await refresher.stop()
+        # Do not lose rows still sitting in batch buffers
+        await writer.close()
+        await shards.close()
+        await dedup.stop()
+        await db.close()
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,370 @@
+"""Minimal Prometheus-style metrics (text exposition format 0.0.4).
+
+Counters, gauges and histograms live in a process-wide ``REGISTRY``. Values
+that are cheap to read on demand (cache and queue sizes) are exported through
+callback gauges or async collectors evaluated at scrape time, so the hot path
+pays nothing for them. ``start_metrics_server`` serves ``/metrics`` over a
+small aiohttp app when ``METRICS_ENABLED`` is set.
+"""
+from __future__ import annotations
+
+import bisect
+import functools
+import logging
+import math
+import time
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+from aiogram import BaseMiddleware
+from aiohttp import web
+
+from .utils import join_cache
+
+
+LabelValues = Tuple[str, ...]
+GaugeCallback = Callable[[], Union[float, Dict[LabelValues, float]]]
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if value == int(value):
+        return str(int(value))
+    return repr(value)
+
+
+class _Metric:
+    type_name = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def _key(self, labels: Dict[str, Any]) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name}: expected labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def _labels(self, key: LabelValues, extra: Optional[Tuple[str, str]] = None) -> str:
+        pairs = list(zip(self.labelnames, key))
+        if extra:
+            pairs.append(extra)
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in pairs) + "}"
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type_name}",
+            *self.samples(),
+        ]
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: Any) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> List[str]:
+        return [f"{self.name}{self._labels(k)} {_format_value(v)}" for k, v in sorted(self._values.items())]
+
+
+class Gauge(_Metric):
+    type_name = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        callback: Optional[GaugeCallback] = None,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+        self.callback = callback
+
+    def set(self, value: float, **labels: Any) -> None:
+        self._values[self._key(labels)] = float(value)
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: Any) -> None:
+        self.inc(-amount, **labels)
+
+    def value(self, **labels: Any) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> List[str]:
+        if self.callback is not None:
+            try:
+                result = self.callback()
+            except Exception:
+                logging.getLogger(__name__).exception("Gauge callback failed: %s", self.name)
+                return []
+            values = result if isinstance(result, dict) else {(): float(result)}
+        else:
+            values = self._values
+        return [f"{self.name}{self._labels(k)} {_format_value(v)}" for k, v in sorted(values.items())]
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [per-bucket counts..., +Inf count], sum
+        self._counts: Dict[LabelValues, List[int]] = {}
+        self._sums: Dict[LabelValues, float] = {}
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        counts = self._counts.get(key)
+        if counts is None:
+            counts = self._counts[key] = [0] * (len(self.buckets) + 1)
+            self._sums[key] = 0.0
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        self._sums[key] += value
+
+    @contextmanager
+    def time(self, **labels: Any) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def count(self, **labels: Any) -> int:
+        return sum(self._counts.get(self._key(labels), ()))
+
+    def samples(self) -> List[str]:
+        lines: List[str] = []
+        for key in sorted(self._counts):
+            cumulative = 0
+            for bound, n in zip(self.buckets + (math.inf,), self._counts[key]):
+                cumulative += n
+                lines.append(f"{self.name}_bucket{self._labels(key, ('le', _format_value(bound)))} {cumulative}")
+            lines.append(f"{self.name}_sum{self._labels(key)} {_format_value(self._sums[key])}")
+            lines.append(f"{self.name}_count{self._labels(key)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], Awaitable[None]]] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def add_collector(self, collector: Callable[[], Awaitable[None]]) -> None:
+        """Async hook run before each scrape (e.g. to set gauges from a DB count)."""
+        self._collectors.append(collector)
+
+    async def collect(self) -> None:
+        for collector in self._collectors:
+            try:
+                await collector()
+            except Exception:
+                logging.getLogger(__name__).exception("Metrics collector failed")
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def counter(name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+    return REGISTRY.register(Counter(name, documentation, labelnames))  # type: ignore[return-value]
+
+
+def gauge(name: str, documentation: str, labelnames: Sequence[str] = (), callback: Optional[GaugeCallback] = None) -> Gauge:
+    return REGISTRY.register(Gauge(name, documentation, labelnames, callback))  # type: ignore[return-value]
+
+
+def histogram(name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+    return REGISTRY.register(Histogram(name, documentation, labelnames, buckets))  # type: ignore[return-value]
+
+
+# --- Application metrics -------------------------------------------------------
+
+HANDLER_SECONDS = histogram(
+    "bot_handler_duration_seconds", "Update handling time per update type", ("handler", "status")
+)
+DB_QUERY_SECONDS = histogram(
+    "bot_db_query_duration_seconds", "Database method execution time", ("method",)
+)
+SHEETS_CALL_SECONDS = histogram(
+    "bot_sheets_call_duration_seconds", "Google Sheets API call latency", ("call", "status")
+)
+SHEETS_RETRIES = counter(
+    "bot_sheets_retries_total", "Google Sheets operations retried by backoff", ("operation",)
+)
+SHEETS_GIVEUPS = counter(
+    "bot_sheets_giveups_total", "Google Sheets operations that exhausted backoff retries", ("operation",)
+)
+SHEETS_BATCH_ROWS = histogram(
+    "bot_sheets_batch_rows", "Rows per batched append", (), buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500)
+)
+SHEETS_BATCH_SECONDS = histogram(
+    "bot_sheets_batch_flush_duration_seconds", "Batched append latency", ("status",)
+)
+SHEETS_TOKEN_REFRESH_SECONDS = histogram(
+    "bot_sheets_token_refresh_duration_seconds", "Google access token refresh latency", ("status",)
+)
+SHEETS_TOKEN_REFRESH_FAILURES = counter(
+    "bot_sheets_token_refresh_failures_total", "Background Google access token refreshes that failed"
+)
+SHEETS_TOKEN_EXPIRY = gauge(
+    "bot_sheets_token_expiry_timestamp_seconds", "Expiry of the current Google access token (unix time)"
+)
+CIRCUIT_STATE = gauge("bot_circuit_state", "Circuit breaker state: 0 closed, 1 half-open, 2 open", ("circuit",))
+CIRCUIT_TRANSITIONS = counter(
+    "bot_circuit_transitions_total", "Circuit breaker state changes by new state", ("circuit", "state")
+)
+CIRCUIT_REJECTED = counter(
+    "bot_circuit_rejected_total", "Calls failed fast while a circuit was open", ("circuit",)
+)
+UPDATE_QUEUE_WAIT_SECONDS = histogram(
+    "bot_update_queue_wait_seconds", "Time an update waited for its channel and global slots", ()
+)
+UPDATES_IN_FLIGHT = gauge("bot_updates_in_flight", "Updates being handled right now")
+UPDATE_CHANNEL_QUEUE_MAX = gauge(
+    "bot_update_channel_queue_max", "Updates waiting in the deepest per-channel queue"
+)
+UPDATES_SHED = counter("bot_updates_shed_total", "Updates dropped because a dispatch queue was full", ("reason",))
+UPDATES_SPILLED = counter(
+    "bot_updates_spilled_total", "Updates parked on disk because a dispatch queue was full", ("reason",)
+)
+QUEUE_SIZE = gauge("bot_queue_size", "Items waiting in internal queues", ("queue",))
+CACHE_SIZE = gauge("bot_cache_size", "Entries held in in-process caches", ("cache",))
+CACHE_EVICTIONS = counter("bot_cache_evictions_total", "Cache entries dropped", ("cache", "reason"))
+
+
+def on_backoff(details: Dict[str, Any]) -> None:
+    """`backoff` on_backoff handler counting retries per decorated function."""
+    SHEETS_RETRIES.inc(operation=getattr(details.get("target"), "__name__", "unknown"))
+
+
+def on_giveup(details: Dict[str, Any]) -> None:
+    SHEETS_GIVEUPS.inc(operation=getattr(details.get("target"), "__name__", "unknown"))
+
+
+def timed_query(method: Callable) -> Callable:
+    """Decorator recording a Database coroutine's duration under its name."""
+    name = method.__name__
+
+    @functools.wraps(method)
+    async def wrapper(*args: Any, **kwargs: Any) -> Any:
+        with DB_QUERY_SECONDS.time(method=name):
+            return await method(*args, **kwargs)
+
+    return wrapper
+
+
+def register_service_metrics(db: Any, writer: Any = None, dedup: Any = None, quota: Any = None,
+                             executor: Any = None, registry: Registry = REGISTRY) -> None:
+    """Export queue and cache sizes of the running services, read at scrape time."""
+    # join_cache keeps running totals; the counter advances by what is new since the last scrape
+    exported = {"expired": 0, "evicted": 0}
+
+    async def collect() -> None:
+        QUEUE_SIZE.set(await db.count_outbox(), queue="outbox")
+        if writer is not None:
+            QUEUE_SIZE.set(writer.pending, queue="sheets_batch")
+        if dedup is not None:
+            QUEUE_SIZE.set(dedup.pending, queue="dedup_flush")
+            CACHE_SIZE.set(dedup.size, cache="join_request_dedup")
+        if quota is not None:
+            QUEUE_SIZE.set(quota.queued(), queue="sheets_quota")
+        if executor is not None:
+            QUEUE_SIZE.set(executor.waiting, queue="updates")
+            QUEUE_SIZE.set(executor.spilled, queue="updates_spilled")
+            UPDATE_CHANNEL_QUEUE_MAX.set(executor.max_channel_depth())
+        CACHE_SIZE.set(db.channel_cache_size, cache="channels")
+        stats = join_cache.stats()
+        CACHE_SIZE.set(stats["size"], cache="join_cache")
+        for stat, reason in (("expired", "expired"), ("evicted", "capacity")):
+            # A total below the last one means the cache was cleared and counts again from 0
+            delta = stats[stat] - exported[stat] if stats[stat] >= exported[stat] else stats[stat]
+            exported[stat] = stats[stat]
+            if delta:
+                CACHE_EVICTIONS.inc(delta, cache="join_cache", reason=reason)
+
+    registry.add_collector(collect)
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """Outer update middleware timing every update by its type."""
+
+    async def __call__(self, handler, event, data):  # type: ignore[override]
+        started = time.perf_counter()
+        status = "ok"
+        try:
+            return await handler(event, data)
+        except Exception:
+            status = "error"
+            raise
+        finally:
+            HANDLER_SECONDS.observe(
+                time.perf_counter() - started,
+                handler=getattr(event, "event_type", None) or "unknown",
+                status=status,
+            )
+
+
+async def start_metrics_server(host: str, port: int, registry: Registry = REGISTRY) -> web.AppRunner:
+    """Serve `registry` on http://host:port/metrics; return the runner to clean up."""
+    runner = web.AppRunner(build_metrics_app(registry))
+    await runner.setup()
+    await web.TCPSite(runner, host=host, port=port).start()
+    logging.getLogger(__name__).info("Metrics endpoint listening on %s:%s/metrics", host, port)
+    return runner
+
+
+def build_metrics_app(registry: Registry = REGISTRY) -> web.Application:
+    async def handle(_request: web.Request) -> web.Response:
+        await registry.collect()
+        return web.Response(
+            text=registry.render(),
+            content_type="text/plain",
+            headers={"X-Content-Type-Options": "nosniff"},
+        )
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle)
+    return app
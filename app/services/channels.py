@@ -0,0 +1,92 @@
+"""Channel -> worksheet resolution shared by the update handlers.
+
+Resolution only touches SQLite: the worksheet of a new channel or partition
+is created by the Sheets writer right before the first append to it
+(``GoogleSheetsService._worksheet_for_append``), so handlers never wait on
+Sheets quota, backoff or an open circuit.
+"""
+from __future__ import annotations
+
+import asyncio
+import time
+from typing import Dict, Optional, Tuple
+
+from .container import ServiceContainer
+from .google_sheets import sanitize_sheet_title
+
+
+# channel_id -> future of the sheet name being opened for it
+_inflight: Dict[int, asyncio.Future] = {}
+# (shard, base title) -> channel picking it but not yet stored in ``channels``
+_claimed: Dict[Tuple[int, str], int] = {}
+
+
+def _unique_base_title(title: str, taken: set[str]) -> str:
+    """`title`, or "title 2", "title 3", ... if another channel already uses it."""
+    base, suffix = title, 1
+    while base in taken:
+        suffix += 1
+        base = f"{title} {suffix}"[:100]
+    return base
+
+
+async def resolve_sheet_name(
+    container: ServiceContainer,
+    channel_id: int,
+    channel_title: str,
+    now_epoch: Optional[int] = None,
+) -> str:
+    """Return the channel's active worksheet, opening a partition on first use or rollover.
+
+    Concurrent callers for the same channel are coalesced: only the first one
+    stores the new partition, the rest await its result. A new channel gets a
+    base title no other channel of its shard uses ("Title", "Title 2", ...),
+    so two channels never share a worksheet.
+    """
+    now_epoch = int(time.time()) if now_epoch is None else now_epoch
+    policy = container.rollover
+    partition = await container.db.get_channel_partition(channel_id)
+    if partition is not None and not policy.needs_rollover(partition, now_epoch):
+        return partition.sheet_name
+
+    pending = _inflight.get(channel_id)
+    if pending is not None:
+        # shield: a cancelled waiter must not cancel the shared resolution
+        return await asyncio.shield(pending)
+
+    fut: asyncio.Future = asyncio.get_running_loop().create_future()
+    _inflight[channel_id] = fut
+    claim: Optional[Tuple[int, str]] = None
+    try:
+        # The partition may have been stored while we awaited the first lookup
+        partition = await container.db.get_channel_partition(channel_id)
+        if partition is None:
+            # A new channel picks its spreadsheet shard once; rollover keeps it
+            shard = await container.assign_shard(channel_id)
+            taken = await container.db.channel_base_titles(shard)
+            taken.update(base for (s, base), owner in _claimed.items() if s == shard and owner != channel_id)
+            base_title = _unique_base_title(sanitize_sheet_title(channel_title), taken)
+            # No await between picking the title and claiming it
+            claim = (shard, base_title)
+            _claimed[claim] = channel_id
+            new_partition = policy.next_partition(base_title, None, now_epoch)
+            new_partition.shard = shard
+            await container.db.set_channel_partition(channel_id, new_partition)
+        elif policy.needs_rollover(partition, now_epoch):
+            new_partition = policy.next_partition(partition.base_title, partition, now_epoch)
+            await container.db.set_channel_partition(channel_id, new_partition)
+        else:
+            new_partition = partition
+        sheet_name = new_partition.sheet_name
+    except BaseException as e:
+        fut.set_exception(e)
+        # Mark retrieved so a failure without waiters is not reported twice
+        fut.exception()
+        raise
+    else:
+        fut.set_result(sheet_name)
+        return sheet_name
+    finally:
+        _inflight.pop(channel_id, None)
+        if claim is not None:
+            _claimed.pop(claim, None)
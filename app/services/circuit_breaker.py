@@ -0,0 +1,127 @@
+"""Circuit breaker for the Google Sheets dependency.
+
+``closed``: calls pass; consecutive outage failures are counted and
+``failure_threshold`` of them open the circuit.
+``open``: calls fail immediately with ``CircuitOpenError`` (which backoff does
+not retry), so a Google outage costs a handler or a batch nothing but the
+exception. After ``reset_timeout`` seconds the next call is let through as
+the probe.
+``half_open``: exactly one probe call is in flight, everything else still
+fails fast; its success closes the circuit, its failure opens it again.
+"""
+from __future__ import annotations
+
+import logging
+import time
+from typing import Callable, Optional
+
+from ..metrics import CIRCUIT_REJECTED, CIRCUIT_STATE, CIRCUIT_TRANSITIONS
+
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# Values of the bot_circuit_state gauge
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling the dependency while the circuit is open."""
+
+    def __init__(self, name: str, retry_in: float):
+        super().__init__(f"Circuit '{name}' is open, next probe in {retry_in:.0f}s")
+        self.name = name
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+        is_failure: Callable[[BaseException], bool] = lambda e: isinstance(e, Exception),
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.is_failure = is_failure
+        self._clock = clock
+        self.state = CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        CIRCUIT_STATE.set(STATE_VALUES[CLOSED], circuit=name)
+
+    def retry_in(self) -> float:
+        """Seconds until an open circuit admits its probe (0 when not open)."""
+        if self.state != OPEN:
+            return 0.0
+        return max(0.0, self._opened_at + self.reset_timeout - self._clock())
+
+    def allows_request(self) -> bool:
+        """Whether a call made now would be let through (does not change state)."""
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN:
+            return self.retry_in() <= 0
+        return not self._probing
+
+    def acquire(self) -> bool:
+        """Admit a call or raise ``CircuitOpenError``; return True for the probe.
+
+        Pass the returned flag to ``release`` once the call finished.
+        """
+        if self.state == CLOSED:
+            return False
+        if self.state == OPEN and self.retry_in() <= 0:
+            self._transition(HALF_OPEN)
+        if self.state == HALF_OPEN and not self._probing:
+            self._probing = True
+            return True
+        CIRCUIT_REJECTED.inc(circuit=self.name)
+        raise CircuitOpenError(self.name, self.retry_in())
+
+    def release(self, probe: bool, error: Optional[BaseException] = None) -> None:
+        """Record the outcome of a call admitted by ``acquire``."""
+        if probe:
+            self._probing = False
+        if error is not None and not isinstance(error, Exception):
+            # Cancelled: no verdict; a cancelled probe frees the slot for the next call
+            return
+        if error is None or not self.is_failure(error):
+            self.failures = 0
+            if probe and self.state == HALF_OPEN:
+                self._transition(CLOSED)
+            return
+        self.failures += 1
+        if probe and self.state == HALF_OPEN:
+            self._open(error)
+        elif self.state == CLOSED and self.failures >= self.failure_threshold:
+            self._open(error)
+
+    def _open(self, error: BaseException) -> None:
+        self._opened_at = self._clock()
+        self._transition(OPEN, error)
+
+    def _transition(self, state: str, error: Optional[BaseException] = None) -> None:
+        if state == self.state and state != OPEN:
+            return
+        self.state = state
+        if state == CLOSED:
+            self.failures = 0
+        CIRCUIT_STATE.set(STATE_VALUES[state], circuit=self.name)
+        CIRCUIT_TRANSITIONS.inc(circuit=self.name, state=state)
+        log = logging.getLogger(__name__)
+        extra = {"operation": "circuit_breaker"}
+        if state == OPEN:
+            log.warning(
+                "Circuit '%s' opened after %d failures, failing fast for %.0fs: %s",
+                self.name, self.failures, self.reset_timeout, error, extra=extra,
+            )
+        elif state == HALF_OPEN:
+            log.info("Circuit '%s' half-open, probing", self.name, extra=extra)
+        else:
+            log.info("Circuit '%s' closed, dependency recovered", self.name, extra=extra)
@@ -1,16 +1,44 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from typing import Optional
 
 from .db import Database
-from .google_sheets import GoogleSheetsService
+from .dedup import JoinRequestDedup
+from .google_sheets import GoogleSheetsService, SheetsBatchWriter
+from .outbox import OutboxDrainer
+from .partitions import RolloverPolicy
+from .shards import SheetsShards
 
 
 @dataclass
 class ServiceContainer:
     db: Database
     gsheets: GoogleSheetsService
+    writer: Optional[SheetsBatchWriter] = None
+    dedup: Optional[JoinRequestDedup] = None
+    rollover: RolloverPolicy = field(default_factory=RolloverPolicy)
+    # Spreadsheet shards; None means `gsheets` is the only spreadsheet
+    shards: Optional[SheetsShards] = None
+    # Background outbox delivery; woken when a handler makes a row due
+    drainer: Optional[OutboxDrainer] = None
+
+    def __post_init__(self) -> None:
+        if self.dedup is None:
+            self.dedup = JoinRequestDedup(self.db)
+
+    def notify_outbox(self) -> None:
+        """Start delivering newly due rows now instead of at the next poll."""
+        if self.drainer is not None:
+            self.drainer.notify()
+
+    def sheets_for(self, shard: int) -> GoogleSheetsService:
+        return self.shards[shard] if self.shards is not None else self.gsheets
+
+    async def assign_shard(self, channel_id: int) -> int:
+        if self.shards is None:
+            return 0
+        return await self.shards.assign(self.db, channel_id)
 
 
 _container: Optional[ServiceContainer] = None
@@ -1,30 +1,223 @@
 """SQLite access layer (Stage 3)."""
 from __future__ import annotations
 
+import asyncio
+import json
 import os
-from typing import Optional
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, AsyncIterator, Iterable, Optional
+from zoneinfo import ZoneInfo
 
 import aiosqlite
 
+from ..metrics import timed_query
+from .partitions import ChannelPartition
+
+
+# Size of sqlite3's per-connection prepared statement cache. All queries below
+# use constant SQL text, so they are compiled once and reused afterwards.
+STATEMENT_CACHE_SIZE = 256
+
+
+# Event types stored in the join_events ledger
+EVENT_JOIN_REQUEST = "join_request"
+EVENT_JOIN = "join"
+
+
+@dataclass
+class JoinEvent:
+    """One row of the append-only join event ledger."""
+
+    channel_id: int
+    user_id: int
+    event_type: str
+    occurred_at: int
+    invite_link: str = ""
+    link_name: str = ""
+    full_name: str = ""
+    username: str = ""
+    update_id: Optional[int] = None
+    id: Optional[int] = None
+
+    @property
+    def event_key(self) -> str:
+        """Stable identity of the event: the Telegram update id when known."""
+        if self.update_id is not None:
+            return str(self.update_id)
+        return f"{self.channel_id}:{self.user_id}:{self.event_type}:{self.occurred_at}"
+
+
+# Aggregate granularities and the pseudo-link holding per-channel totals
+GRANULARITY_HOUR = "hour"
+GRANULARITY_DAY = "day"
+ALL_LINKS = "*"
+
+
+@dataclass
+class JoinStats:
+    """Counters of one aggregate bucket (``invite_link == ALL_LINKS`` for channel totals)."""
+
+    channel_id: int
+    invite_link: str
+    granularity: str
+    bucket_start: int
+    requests: int
+    joins: int
+    distinct_users: int
+
+
+@dataclass
+class OutboxItem:
+    """A pending Google Sheets row stored in the local outbox."""
+
+    id: int
+    sheet_name: str
+    row: list[Any]
+    attempts: int
+    event_key: str = ""
+    shard: int = 0
+    event_id: Optional[int] = None
+    # Epoch seconds the row was queued
+    created_at: int = 0
+
+
+@dataclass
+class RowUpdate:
+    """Queued in-place edit of cells of an already appended Sheets row.
+
+    `row_number` is None while the target row has not been written (or
+    located) yet; `queued` tells whether it is still in the outbox.
+    """
+
+    id: int
+    event_key: str
+    cells: dict[int, Any]
+    attempts: int
+    shard: int = 0
+    sheet_name: str = ""
+    row_number: Optional[int] = None
+    queued: bool = False
+
+
+@dataclass
+class SpilledUpdate:
+    """A Telegram update parked on disk by the dispatch layer under overload."""
+
+    id: int
+    channel_id: int
+    payload: str
+
 
 class Database:
-    def __init__(self, db_path: str):
+    """Async SQLite DAO backed by one long-lived WAL-mode connection.
+
+    The connection is opened by ``init_db`` (or lazily on first use) and must be
+    released with ``close()``. aiosqlite runs every statement on the connection's
+    worker thread. Writes go through ``_transaction()``, which serializes them
+    and commits once per unit of work; reads go through ``_read()``, which waits
+    for an open transaction to end so it never sees uncommitted rows.
+
+    The ``channels`` table is mirrored in memory: ``init_db`` preloads it and
+    ``upsert_channel`` writes through, so ``get_sheet_name`` never hits SQLite.
+
+    Delivery is idempotent per event key: ``sheets_delivered`` remembers the
+    keys already written to Sheets, and a replayed Telegram update is not
+    recorded twice.
+
+    ``join_events`` is the append-only record of every logged join request and
+    join; Google Sheets rows are a projection of it, queued in ``sheets_outbox``
+    in the same transaction by ``record_join_event``, which also bumps the
+    hourly/daily aggregates in ``join_stats`` (day buckets follow `stats_timezone`).
+    The per-bucket user sets behind ``distinct_users`` are only kept for recent
+    buckets (``prune_join_stats_users``); distinct users over a range are
+    counted from the ledger.
+    """
+
+    def __init__(self, db_path: str, stats_timezone: str = "UTC", stats_users_retention_days: float = 7.0):
         self.db_path = db_path
+        self.stats_tz = ZoneInfo(stats_timezone)
+        # How long join_stats_users remembers who was counted in a bucket
+        self.stats_users_retention = stats_users_retention_days * 24 * 3600
+        self._conn: Optional[aiosqlite.Connection] = None
+        self._open_lock = asyncio.Lock()
+        # Held by every transaction and read on the shared connection, so reads
+        # never see another coroutine's uncommitted (possibly rolled back) rows
+        self._lock = asyncio.Lock()
+        # channel_id -> active partition; None until warmed up from the channels table
+        self._channels: Optional[dict[int, ChannelPartition]] = None
+
+    async def _connection(self) -> aiosqlite.Connection:
+        if self._conn is not None:
+            return self._conn
+        async with self._open_lock:
+            if self._conn is None:
+                # Ensure directory exists
+                os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+                conn = await aiosqlite.connect(self.db_path, cached_statements=STATEMENT_CACHE_SIZE)
+                conn.row_factory = aiosqlite.Row
+                # WAL lets readers proceed during writes; NORMAL skips the fsync per commit
+                # (still durable across process crashes, only an OS crash can lose the last commits)
+                await conn.execute("PRAGMA journal_mode=WAL")
+                await conn.execute("PRAGMA synchronous=NORMAL")
+                await conn.execute("PRAGMA busy_timeout=5000")
+                await conn.execute("PRAGMA temp_store=MEMORY")
+                self._conn = conn
+        return self._conn
 
+    @asynccontextmanager
+    async def _transaction(self) -> AsyncIterator[aiosqlite.Connection]:
+        """Run a unit of writes atomically on the shared connection."""
+        conn = await self._connection()
+        async with self._lock:
+            try:
+                yield conn
+            except BaseException:
+                await conn.rollback()
+                raise
+            else:
+                await conn.commit()
+
+    @asynccontextmanager
+    async def _read(self) -> AsyncIterator[aiosqlite.Connection]:
+        """Read from the shared connection between transactions."""
+        conn = await self._connection()
+        async with self._lock:
+            yield conn
+
+    async def close(self) -> None:
+        """Close the shared connection (idempotent)."""
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            await conn.close()
+
+    @timed_query
     async def init_db(self) -> None:
-        """Create database schema if not exists."""
-        # Ensure directory exists
-        os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
-        async with aiosqlite.connect(self.db_path) as db:
+        """Open the connection and create database schema if not exists."""
+        async with self._transaction() as db:
             await db.execute(
                 """
                 CREATE TABLE IF NOT EXISTS channels (
                     channel_id INTEGER PRIMARY KEY,
                     sheet_name TEXT NOT NULL,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    base_title TEXT,
+                    period_key TEXT NOT NULL DEFAULT '',
+                    partition_index INTEGER NOT NULL DEFAULT 1,
+                    partition_rows INTEGER NOT NULL DEFAULT 0,
+                    shard INTEGER NOT NULL DEFAULT 0
                 )
                 """
             )
+            # Active worksheet partition (see services/partitions.py)
+            await self._add_missing_column(db, "channels", "base_title", "TEXT")
+            await self._add_missing_column(db, "channels", "period_key", "TEXT NOT NULL DEFAULT ''")
+            await self._add_missing_column(db, "channels", "partition_index", "INTEGER NOT NULL DEFAULT 1")
+            await self._add_missing_column(db, "channels", "partition_rows", "INTEGER NOT NULL DEFAULT 0")
+            # Spreadsheet shard the channel writes to (see services/shards.py)
+            await self._add_missing_column(db, "channels", "shard", "INTEGER NOT NULL DEFAULT 0")
             # Deduplication log for join requests: store last logged timestamp (epoch seconds)
             await db.execute(
                 """
@@ -36,32 +229,245 @@ class Database:
                 )
                 """
             )
-            await db.commit()
+            # Keeps the retention DELETE on old dedup rows an index range scan
+            await db.execute(
+                "CREATE INDEX IF NOT EXISTS idx_join_request_log_last_logged_at ON join_request_log (last_logged_at)"
+            )
+            # Durable outbox of rows awaiting delivery to Google Sheets
+            await db.execute(
+                """
+                CREATE TABLE IF NOT EXISTS sheets_outbox (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    sheet_name TEXT NOT NULL,
+                    row_json TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    next_attempt_at INTEGER NOT NULL DEFAULT 0,
+                    last_error TEXT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    event_id INTEGER,
+                    event_key TEXT,
+                    shard INTEGER NOT NULL DEFAULT 0
+                )
+                """
+            )
+            await self._add_missing_column(db, "sheets_outbox", "event_id", "INTEGER")
+            await self._add_missing_column(db, "sheets_outbox", "event_key", "TEXT")
+            await self._add_missing_column(db, "sheets_outbox", "shard", "INTEGER NOT NULL DEFAULT 0")
+            # Event keys already written to Sheets (outbox replays skip them)
+            await db.execute(
+                """
+                CREATE TABLE IF NOT EXISTS sheets_delivered (
+                    event_key TEXT PRIMARY KEY,
+                    delivered_at INTEGER NOT NULL
+                ) WITHOUT ROWID
+                """
+            )
+            await db.execute(
+                "CREATE INDEX IF NOT EXISTS idx_sheets_delivered_at ON sheets_delivered (delivered_at)"
+            )
+            await db.execute(
+                "CREATE INDEX IF NOT EXISTS idx_sheets_outbox_due ON sheets_outbox (next_attempt_at, id)"
+            )
+            # Finds the held-back row of a join request when its approval arrives
+            await db.execute("CREATE INDEX IF NOT EXISTS idx_sheets_outbox_event ON sheets_outbox (event_id)")
+            await db.execute("CREATE INDEX IF NOT EXISTS idx_sheets_outbox_event_key ON sheets_outbox (event_key)")
+            # Where each delivered row landed: worksheet and 1-based row number
+            await db.execute(
+                """
+                CREATE TABLE IF NOT EXISTS sheet_rows (
+                    event_key TEXT PRIMARY KEY,
+                    channel_id INTEGER NOT NULL,
+                    user_id INTEGER NOT NULL,
+                    shard INTEGER NOT NULL DEFAULT 0,
+                    sheet_name TEXT NOT NULL,
+                    row_number INTEGER NOT NULL,
+                    written_at INTEGER
+                )
+                """
+            )
+            await self._add_missing_column(db, "sheet_rows", "written_at", "INTEGER")
+            await db.execute("CREATE INDEX IF NOT EXISTS idx_sheet_rows_member ON sheet_rows (channel_id, user_id)")
+            await db.execute(
+                "CREATE INDEX IF NOT EXISTS idx_sheet_rows_sheet ON sheet_rows (shard, sheet_name, written_at)"
+            )
+            await db.execute("CREATE INDEX IF NOT EXISTS idx_sheet_rows_written_at ON sheet_rows (written_at)")
+            # In-place edits of written rows, applied with one values.batchUpdate per shard
+            await db.execute(
+                """
+                CREATE TABLE IF NOT EXISTS sheets_row_updates (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    event_key TEXT NOT NULL,
+                    cells_json TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    next_attempt_at INTEGER NOT NULL DEFAULT 0,
+                    last_error TEXT
+                )
+                """
+            )
+            await db.execute(
+                "CREATE INDEX IF NOT EXISTS idx_sheets_row_updates_due ON sheets_row_updates (next_attempt_at, id)"
+            )
+            # Updates the dispatch layer could not queue in memory (see app/dispatch.py)
+            await db.execute(
+                """
+                CREATE TABLE IF NOT EXISTS spilled_updates (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    channel_id INTEGER NOT NULL,
+                    payload TEXT NOT NULL,
+                    spilled_at INTEGER NOT NULL
+                )
+                """
+            )
+            # Append-only ledger of join events (source of truth for the Sheets rows)
+            await db.execute(
+                """
+                CREATE TABLE IF NOT EXISTS join_events (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    channel_id INTEGER NOT NULL,
+                    user_id INTEGER NOT NULL,
+                    event_type TEXT NOT NULL,
+                    occurred_at INTEGER NOT NULL,
+                    invite_link TEXT NOT NULL DEFAULT '',
+                    link_name TEXT NOT NULL DEFAULT '',
+                    full_name TEXT NOT NULL DEFAULT '',
+                    username TEXT NOT NULL DEFAULT '',
+                    update_id INTEGER
+                )
+                """
+            )
+            # One index per lookup dimension, each ordered by time for range scans
+            for name, columns in (
+                ("idx_join_events_channel_time", "channel_id, occurred_at"),
+                ("idx_join_events_user_time", "user_id, occurred_at"),
+                ("idx_join_events_link_time", "invite_link, occurred_at"),
+                ("idx_join_events_time", "occurred_at"),
+                ("idx_join_events_update", "update_id"),
+            ):
+                await db.execute(f"CREATE INDEX IF NOT EXISTS {name} ON join_events ({columns})")
+            # Incrementally maintained counters per channel/link/bucket; link '*' = channel total
+            await db.execute(
+                """
+                CREATE TABLE IF NOT EXISTS join_stats (
+                    channel_id INTEGER NOT NULL,
+                    invite_link TEXT NOT NULL,
+                    granularity TEXT NOT NULL,
+                    bucket_start INTEGER NOT NULL,
+                    requests INTEGER NOT NULL DEFAULT 0,
+                    joins INTEGER NOT NULL DEFAULT 0,
+                    distinct_users INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (channel_id, invite_link, granularity, bucket_start)
+                ) WITHOUT ROWID
+                """
+            )
+            # Users already counted in a bucket (drives distinct_users)
+            await db.execute(
+                """
+                CREATE TABLE IF NOT EXISTS join_stats_users (
+                    channel_id INTEGER NOT NULL,
+                    invite_link TEXT NOT NULL,
+                    granularity TEXT NOT NULL,
+                    bucket_start INTEGER NOT NULL,
+                    user_id INTEGER NOT NULL,
+                    PRIMARY KEY (channel_id, invite_link, granularity, bucket_start, user_id)
+                ) WITHOUT ROWID
+                """
+            )
+            await db.execute(
+                "CREATE INDEX IF NOT EXISTS idx_join_stats_users_bucket ON join_stats_users (bucket_start)"
+            )
+        await self.load_channels()
 
-    async def get_sheet_name(self, channel_id: int) -> Optional[str]:
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
+    @staticmethod
+    async def _add_missing_column(db: aiosqlite.Connection, table: str, column: str, decl: str) -> None:
+        """Add `column` to a table created by an older schema version."""
+        async with db.execute(f"PRAGMA table_info({table})") as cursor:
+            columns = {r["name"] for r in await cursor.fetchall()}
+        if column not in columns:
+            await db.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+
+    @timed_query
+    async def load_channels(self) -> int:
+        """(Re)load the channel -> sheet mapping cache; return number of channels."""
+        async with self._read() as db:
             async with db.execute(
-                "SELECT sheet_name FROM channels WHERE channel_id = ?", (channel_id,)
+                "SELECT channel_id, sheet_name, base_title, period_key, partition_index, partition_rows, shard FROM channels"
             ) as cursor:
-                row = await cursor.fetchone()
-                return row["sheet_name"] if row else None
+                rows = await cursor.fetchall()
+            self._channels = {
+                int(r["channel_id"]): ChannelPartition(
+                    sheet_name=r["sheet_name"],
+                    # Mappings from before partitioning use the sheet itself as the base
+                    base_title=r["base_title"] or r["sheet_name"],
+                    period_key=r["period_key"],
+                    index=int(r["partition_index"]),
+                    rows=int(r["partition_rows"]),
+                    shard=int(r["shard"]),
+                )
+                for r in rows
+            }
+            return len(self._channels)
+
+    @property
+    def channel_cache_size(self) -> int:
+        return len(self._channels or {})
+
+    async def get_sheet_name(self, channel_id: int) -> Optional[str]:
+        partition = await self.get_channel_partition(channel_id)
+        return partition.sheet_name if partition else None
+
+    async def get_channel_partition(self, channel_id: int) -> Optional[ChannelPartition]:
+        if self._channels is None:
+            await self.load_channels()
+        return self._channels.get(channel_id)  # type: ignore[union-attr]
+
+    async def channel_base_titles(self, shard: int) -> set[str]:
+        """Base worksheet titles of the channels assigned to `shard`."""
+        if self._channels is None:
+            await self.load_channels()
+        return {p.base_title for p in self._channels.values() if p.shard == shard}  # type: ignore[union-attr]
+
+    async def count_channels_by_shard(self) -> dict[int, int]:
+        """Number of channels assigned to each shard."""
+        if self._channels is None:
+            await self.load_channels()
+        counts: dict[int, int] = {}
+        for partition in self._channels.values():  # type: ignore[union-attr]
+            counts[partition.shard] = counts.get(partition.shard, 0) + 1
+        return counts
 
     async def upsert_channel(self, channel_id: int, sheet_name: str) -> None:
-        async with aiosqlite.connect(self.db_path) as db:
+        await self.set_channel_partition(channel_id, ChannelPartition(sheet_name=sheet_name, base_title=sheet_name))
+
+    @timed_query
+    async def set_channel_partition(self, channel_id: int, partition: ChannelPartition) -> None:
+        """Make `partition` the channel's active worksheet (its row count starts at zero)."""
+        async with self._transaction() as db:
             await db.execute(
                 """
-                INSERT INTO channels (channel_id, sheet_name)
-                VALUES (?, ?)
-                ON CONFLICT(channel_id) DO UPDATE SET sheet_name = excluded.sheet_name
+                INSERT INTO channels (
+                    channel_id, sheet_name, base_title, period_key, partition_index, partition_rows, shard
+                ) VALUES (?, ?, ?, ?, ?, 0, ?)
+                ON CONFLICT(channel_id) DO UPDATE SET
+                    sheet_name = excluded.sheet_name,
+                    base_title = excluded.base_title,
+                    period_key = excluded.period_key,
+                    partition_index = excluded.partition_index,
+                    partition_rows = 0,
+                    shard = excluded.shard
                 """,
-                (channel_id, sheet_name),
+                (
+                    channel_id, partition.sheet_name, partition.base_title, partition.period_key,
+                    partition.index, partition.shard,
+                ),
             )
-            await db.commit()
+        # Write-through only after the commit succeeded
+        if self._channels is not None:
+            partition.rows = 0
+            self._channels[channel_id] = partition
 
+    @timed_query
     async def get_last_join_request_logged_at(self, channel_id: int, user_id: int) -> Optional[int]:
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
+        async with self._read() as db:
             async with db.execute(
                 "SELECT last_logged_at FROM join_request_log WHERE channel_id = ? AND user_id = ?",
                 (channel_id, user_id),
@@ -69,8 +475,9 @@ class Database:
                 row = await cursor.fetchone()
                 return int(row["last_logged_at"]) if row else None
 
+    @timed_query
     async def upsert_join_request_logged_at(self, channel_id: int, user_id: int, ts_epoch: int) -> None:
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self._transaction() as db:
             await db.execute(
                 """
                 INSERT INTO join_request_log (channel_id, user_id, last_logged_at)
@@ -79,5 +486,718 @@ class Database:
                 """,
                 (channel_id, user_id, ts_epoch),
             )
-            await db.commit()
 
+    @timed_query
+    async def upsert_join_requests_logged_at(self, entries: Iterable[tuple[int, int, int]]) -> None:
+        """Batched form of `upsert_join_request_logged_at`: (channel_id, user_id, ts_epoch) rows."""
+        params = list(entries)
+        if not params:
+            return
+        async with self._transaction() as db:
+            await db.executemany(
+                """
+                INSERT INTO join_request_log (channel_id, user_id, last_logged_at)
+                VALUES (?, ?, ?)
+                ON CONFLICT(channel_id, user_id) DO UPDATE SET last_logged_at = excluded.last_logged_at
+                """,
+                params,
+            )
+
+    @timed_query
+    async def load_join_requests_since(self, since_epoch: int) -> list[tuple[int, int, int]]:
+        """Return (channel_id, user_id, last_logged_at) logged at or after `since_epoch`, oldest first."""
+        async with self._read() as db:
+            async with db.execute(
+                """
+                SELECT channel_id, user_id, last_logged_at FROM join_request_log
+                WHERE last_logged_at >= ?
+                ORDER BY last_logged_at
+                """,
+                (since_epoch,),
+            ) as cursor:
+                rows = await cursor.fetchall()
+            return [(int(r[0]), int(r[1]), int(r[2])) for r in rows]
+
+    @timed_query
+    async def prune_join_request_log(self, older_than_epoch: int) -> int:
+        """Delete dedup rows last logged before `older_than_epoch`; return count."""
+        async with self._transaction() as db:
+            cursor = await db.execute(
+                "DELETE FROM join_request_log WHERE last_logged_at < ?", (older_than_epoch,)
+            )
+            return cursor.rowcount
+
+    @timed_query
+    async def enqueue_outbox(
+        self, sheet_name: str, row: list[Any], event_key: Optional[str] = None, shard: int = 0
+    ) -> int:
+        """Persist a row for background delivery; return its outbox id."""
+        async with self._transaction() as db:
+            cursor = await db.execute(
+                "INSERT INTO sheets_outbox (sheet_name, row_json, event_key, shard) VALUES (?, ?, ?, ?)",
+                (sheet_name, json.dumps(row, ensure_ascii=False), event_key, shard),
+            )
+            return int(cursor.lastrowid)
+
+    @timed_query
+    async def fetch_due_outbox(self, now_epoch: int, limit: int = 100) -> list[OutboxItem]:
+        """Return up to `limit` rows whose next attempt is due, oldest first."""
+        async with self._read() as db:
+            async with db.execute(
+                """
+                SELECT id, sheet_name, row_json, attempts, event_key, shard, event_id,
+                       CAST(strftime('%s', created_at) AS INTEGER) AS created_epoch
+                FROM sheets_outbox
+                WHERE next_attempt_at <= ?
+                ORDER BY id
+                LIMIT ?
+                """,
+                (now_epoch, limit),
+            ) as cursor:
+                rows = await cursor.fetchall()
+            return [
+                OutboxItem(
+                    id=int(r["id"]),
+                    sheet_name=r["sheet_name"],
+                    row=json.loads(r["row_json"]),
+                    attempts=int(r["attempts"]),
+                    event_key=r["event_key"] or "",
+                    shard=int(r["shard"]),
+                    event_id=r["event_id"],
+                    created_at=int(r["created_epoch"] or 0),
+                )
+                for r in rows
+            ]
+
+    @timed_query
+    async def delete_outbox(self, ids: Iterable[int]) -> None:
+        """Remove delivered rows from the outbox."""
+        params = [(i,) for i in ids]
+        if not params:
+            return
+        async with self._transaction() as db:
+            await db.executemany("DELETE FROM sheets_outbox WHERE id = ?", params)
+
+    @timed_query
+    async def complete_outbox(
+        self, items: Iterable[OutboxItem], delivered_at: int, row_numbers: Optional[dict[int, int]] = None
+    ) -> None:
+        """Remove delivered rows and remember their event keys, atomically.
+
+        `row_numbers` (outbox id -> sheet row number) feeds the ``sheet_rows``
+        index for rows that belong to a ledger event. Call it after the append
+        returned: ``written_at`` must not precede the write.
+        """
+        items = list(items)
+        if not items:
+            return
+        row_numbers = row_numbers or {}
+        async with self._transaction() as db:
+            await db.executemany("DELETE FROM sheets_outbox WHERE id = ?", [(i.id,) for i in items])
+            await db.executemany(
+                "INSERT OR IGNORE INTO sheets_delivered (event_key, delivered_at) VALUES (?, ?)",
+                [(i.event_key, delivered_at) for i in items if i.event_key],
+            )
+            await db.executemany(
+                """
+                INSERT OR REPLACE INTO sheet_rows
+                    (event_key, channel_id, user_id, shard, sheet_name, row_number, written_at)
+                SELECT ?, channel_id, user_id, ?, ?, ?, ? FROM join_events WHERE id = ?
+                """,
+                [
+                    (i.event_key, i.shard, i.sheet_name, row_numbers[i.id], delivered_at, i.event_id)
+                    for i in items
+                    if i.event_key and i.event_id is not None and i.id in row_numbers
+                ],
+            )
+
+    @timed_query
+    async def get_sheet_row(self, event_key: str) -> Optional[tuple[int, str, int]]:
+        """(shard, worksheet, row number) of a delivered row, if indexed."""
+        async with self._read() as db:
+            async with db.execute(
+                "SELECT shard, sheet_name, row_number FROM sheet_rows WHERE event_key = ?", (event_key,)
+            ) as cursor:
+                row = await cursor.fetchone()
+            return (int(row[0]), row[1], int(row[2])) if row else None
+
+    @timed_query
+    async def sheet_rows_before(self, shard: int, sheet_name: str, before_epoch: int) -> int:
+        """Last indexed row of a worksheet recorded before `before_epoch` (0 if none).
+
+        A row queued at `before_epoch` or later was appended after it, so an
+        idempotency check of that row only needs the sheet below this number.
+        """
+        async with self._read() as db:
+            async with db.execute(
+                """
+                SELECT MAX(row_number) FROM sheet_rows
+                WHERE shard = ? AND sheet_name = ? AND written_at < ?
+                """,
+                (shard, sheet_name, before_epoch),
+            ) as cursor:
+                row = await cursor.fetchone()
+            return int(row[0] or 0)
+
+    @timed_query
+    async def queue_row_update(self, channel_id: int, user_id: int, cells: dict[int, Any]) -> Optional[str]:
+        """Queue an edit of `cells` (column index -> value) in the user's latest row.
+
+        The target is the user's newest row still in the outbox, else the newest
+        indexed one. Returns its event key, or None if the user has no row.
+        """
+        async with self._transaction() as db:
+            async with db.execute(
+                """
+                SELECT o.event_key FROM sheets_outbox o JOIN join_events e ON e.id = o.event_id
+                WHERE e.channel_id = ? AND e.user_id = ? AND o.event_key IS NOT NULL
+                ORDER BY o.id DESC LIMIT 1
+                """,
+                (channel_id, user_id),
+            ) as cursor:
+                found = await cursor.fetchone()
+            if found is None:
+                async with db.execute(
+                    "SELECT event_key FROM sheet_rows WHERE channel_id = ? AND user_id = ? ORDER BY rowid DESC LIMIT 1",
+                    (channel_id, user_id),
+                ) as cursor:
+                    found = await cursor.fetchone()
+            if found is None:
+                return None
+            await db.execute(
+                "INSERT INTO sheets_row_updates (event_key, cells_json) VALUES (?, ?)",
+                (found[0], json.dumps({str(k): v for k, v in cells.items()}, ensure_ascii=False)),
+            )
+            return found[0]
+
+    @timed_query
+    async def fetch_due_row_updates(self, now_epoch: int, limit: int = 100) -> list[RowUpdate]:
+        """Return up to `limit` due row edits, oldest first, with their target location."""
+        async with self._read() as db:
+            async with db.execute(
+                """
+                SELECT u.id, u.event_key, u.cells_json, u.attempts, r.shard, r.sheet_name, r.row_number,
+                       EXISTS (SELECT 1 FROM sheets_outbox o WHERE o.event_key = u.event_key) AS queued
+                FROM sheets_row_updates u LEFT JOIN sheet_rows r ON r.event_key = u.event_key
+                WHERE u.next_attempt_at <= ?
+                ORDER BY u.id
+                LIMIT ?
+                """,
+                (now_epoch, limit),
+            ) as cursor:
+                rows = await cursor.fetchall()
+            return [
+                RowUpdate(
+                    id=int(r["id"]),
+                    event_key=r["event_key"],
+                    cells={int(k): v for k, v in json.loads(r["cells_json"]).items()},
+                    attempts=int(r["attempts"]),
+                    shard=int(r["shard"] or 0),
+                    sheet_name=r["sheet_name"] or "",
+                    row_number=r["row_number"],
+                    queued=bool(r["queued"]),
+                )
+                for r in rows
+            ]
+
+    @timed_query
+    async def delete_row_updates(self, ids: Iterable[int]) -> None:
+        params = [(i,) for i in ids]
+        if not params:
+            return
+        async with self._transaction() as db:
+            await db.executemany("DELETE FROM sheets_row_updates WHERE id = ?", params)
+
+    @timed_query
+    async def reschedule_row_updates(self, ids: Iterable[int], next_attempt_at: int, error: Optional[str] = None) -> None:
+        """Postpone row edits; with `error` the attempt is counted as failed."""
+        params = [(int(error is not None), next_attempt_at, (error or "")[:500] or None, i) for i in ids]
+        if not params:
+            return
+        async with self._transaction() as db:
+            await db.executemany(
+                """
+                UPDATE sheets_row_updates
+                SET attempts = attempts + ?, next_attempt_at = ?, last_error = COALESCE(?, last_error)
+                WHERE id = ?
+                """,
+                params,
+            )
+
+    @timed_query
+    async def delivered_keys(self, keys: Iterable[str]) -> set[str]:
+        """Subset of `keys` already written to Sheets."""
+        keys = [k for k in keys if k]
+        if not keys:
+            return set()
+        async with self._read() as db:
+            # One JSON parameter keeps the statement text constant (and cached)
+            async with db.execute(
+                "SELECT event_key FROM sheets_delivered WHERE event_key IN (SELECT value FROM json_each(?))",
+                (json.dumps(keys),),
+            ) as cursor:
+                return {r[0] for r in await cursor.fetchall()}
+
+    @timed_query
+    async def prune_delivered(self, older_than_epoch: int) -> int:
+        """Forget delivery records and row locations older than `older_than_epoch`; return count.
+
+        Rows indexed before ``sheet_rows.written_at`` existed go with their
+        delivery record.
+        """
+        async with self._transaction() as db:
+            cursor = await db.execute(
+                """
+                DELETE FROM sheet_rows
+                WHERE written_at < ?
+                   OR (written_at IS NULL AND NOT EXISTS (
+                        SELECT 1 FROM sheets_delivered d
+                        WHERE d.event_key = sheet_rows.event_key AND d.delivered_at >= ?
+                   ))
+                """,
+                (older_than_epoch, older_than_epoch),
+            )
+            deleted = cursor.rowcount
+            cursor = await db.execute("DELETE FROM sheets_delivered WHERE delivered_at < ?", (older_than_epoch,))
+            return deleted + cursor.rowcount
+
+    @timed_query
+    async def move_sheet_rows(self, rows: dict[str, Optional[int]]) -> None:
+        """Store new row numbers of indexed rows (event key -> row); None forgets the row."""
+        if not rows:
+            return
+        async with self._transaction() as db:
+            await db.executemany(
+                "UPDATE sheet_rows SET row_number = ? WHERE event_key = ?",
+                [(row, key) for key, row in rows.items() if row is not None],
+            )
+            await db.executemany(
+                "DELETE FROM sheet_rows WHERE event_key = ?", [(key,) for key, row in rows.items() if row is None]
+            )
+
+    @timed_query
+    async def reschedule_outbox(self, ids: Iterable[int], next_attempt_at: int, error: str) -> None:
+        """Record a failed delivery attempt and postpone the rows."""
+        params = [(next_attempt_at, error[:500], i) for i in ids]
+        if not params:
+            return
+        async with self._transaction() as db:
+            await db.executemany(
+                """
+                UPDATE sheets_outbox
+                SET attempts = attempts + 1, next_attempt_at = ?, last_error = ?
+                WHERE id = ?
+                """,
+                params,
+            )
+
+    @timed_query
+    async def defer_outbox(self, ids: Iterable[int], next_attempt_at: int) -> None:
+        """Postpone rows without counting a delivery attempt (e.g. their shard is down)."""
+        params = [(next_attempt_at, i) for i in ids]
+        if not params:
+            return
+        async with self._transaction() as db:
+            await db.executemany("UPDATE sheets_outbox SET next_attempt_at = ? WHERE id = ?", params)
+
+    @timed_query
+    async def count_outbox(self) -> int:
+        async with self._read() as db:
+            async with db.execute("SELECT COUNT(*) FROM sheets_outbox") as cursor:
+                row = await cursor.fetchone()
+                return int(row[0]) if row else 0
+
+    @timed_query
+    async def spill_update(self, channel_id: int, payload: str, spilled_at: int) -> int:
+        """Park a serialized update for later replay; return its id."""
+        async with self._transaction() as db:
+            cursor = await db.execute(
+                "INSERT INTO spilled_updates (channel_id, payload, spilled_at) VALUES (?, ?, ?)",
+                (channel_id, payload, spilled_at),
+            )
+            return int(cursor.lastrowid)
+
+    @timed_query
+    async def fetch_spilled_updates(self, limit: int = 100) -> list[SpilledUpdate]:
+        """Return up to `limit` parked updates, oldest first."""
+        async with self._read() as db:
+            async with db.execute(
+                "SELECT id, channel_id, payload FROM spilled_updates ORDER BY id LIMIT ?", (limit,)
+            ) as cursor:
+                rows = await cursor.fetchall()
+            return [SpilledUpdate(id=int(r["id"]), channel_id=int(r["channel_id"]), payload=r["payload"]) for r in rows]
+
+    @timed_query
+    async def delete_spilled_update(self, spilled_id: int) -> None:
+        async with self._transaction() as db:
+            await db.execute("DELETE FROM spilled_updates WHERE id = ?", (spilled_id,))
+
+    @timed_query
+    async def count_spilled_updates_by_channel(self) -> dict[int, int]:
+        async with self._read() as db:
+            async with db.execute("SELECT channel_id, COUNT(*) FROM spilled_updates GROUP BY channel_id") as cursor:
+                return {int(r[0]): int(r[1]) for r in await cursor.fetchall()}
+
+    @timed_query
+    async def record_join_event(
+        self,
+        event: JoinEvent,
+        sheet_name: Optional[str] = None,
+        row: Optional[list[Any]] = None,
+        deliver_after: int = 0,
+    ) -> int:
+        """Append `event` to the ledger and, if given, queue its Sheets row atomically.
+
+        Returns the ledger id (also stored on ``event.id``). An event whose
+        Telegram update is already in the ledger (a redelivered or replayed
+        update) is not recorded again; the existing id is returned.
+        The row is not delivered before the `deliver_after` epoch (see
+        ``coalesce_outbox_row``).
+        """
+        async with self._transaction() as db:
+            if event.update_id is not None:
+                async with db.execute(
+                    "SELECT id FROM join_events WHERE update_id = ? AND event_type = ?",
+                    (event.update_id, event.event_type),
+                ) as cursor:
+                    existing = await cursor.fetchone()
+                if existing is not None:
+                    event.id = int(existing[0])
+                    return event.id
+            cursor = await db.execute(
+                """
+                INSERT INTO join_events (
+                    channel_id, user_id, event_type, occurred_at,
+                    invite_link, link_name, full_name, username, update_id
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (
+                    event.channel_id, event.user_id, event.event_type, event.occurred_at,
+                    event.invite_link, event.link_name, event.full_name, event.username, event.update_id,
+                ),
+            )
+            event_id = int(cursor.lastrowid)
+            counted = 0
+            if sheet_name is not None and row is not None:
+                # The row goes to the spreadsheet shard of its channel
+                await db.execute(
+                    """
+                    INSERT INTO sheets_outbox (sheet_name, row_json, event_id, event_key, next_attempt_at, shard)
+                    VALUES (?, ?, ?, ?, ?, COALESCE((SELECT shard FROM channels WHERE channel_id = ?), 0))
+                    """,
+                    (
+                        sheet_name, json.dumps(row, ensure_ascii=False), event_id, event.event_key,
+                        deliver_after, event.channel_id,
+                    ),
+                )
+                # Fill level of the channel's active partition drives row-count rollover
+                cursor = await db.execute(
+                    "UPDATE channels SET partition_rows = partition_rows + 1 WHERE channel_id = ? AND sheet_name = ?",
+                    (event.channel_id, sheet_name),
+                )
+                counted = cursor.rowcount
+            await self._bump_join_stats(db, event)
+        event.id = event_id
+        if counted and self._channels is not None:
+            partition = self._channels.get(event.channel_id)
+            if partition is not None and partition.sheet_name == sheet_name:
+                partition.rows += 1
+        return event_id
+
+    @timed_query
+    async def coalesce_outbox_row(
+        self, channel_id: int, user_id: int, event_type: str, cells: dict[int, Any], now_epoch: int
+    ) -> bool:
+        """Fill `cells` (column index -> value) into the held-back row of the user's
+        latest `event_type` event and make it due now.
+
+        Returns False if there is no such row or it is already due (being or
+        already delivered), in which case nothing is changed. Called for every
+        member join, so the common no-match case is a read without a write
+        transaction.
+        """
+        query = """
+            SELECT id, row_json FROM sheets_outbox
+            WHERE event_id = (
+                SELECT id FROM join_events
+                WHERE channel_id = ? AND user_id = ? AND event_type = ?
+                ORDER BY id DESC LIMIT 1
+            )
+            AND next_attempt_at > ? AND attempts = 0
+        """
+        params = (channel_id, user_id, event_type, now_epoch)
+        async with self._read() as db:
+            async with db.execute(query, params) as cursor:
+                if await cursor.fetchone() is None:
+                    return False
+        async with self._transaction() as db:
+            # Re-read under the write transaction: the row may have become due meanwhile
+            async with db.execute(query, params) as cursor:
+                found = await cursor.fetchone()
+            if found is None:
+                return False
+            row = json.loads(found["row_json"])
+            row.extend([""] * (max(cells) + 1 - len(row)))
+            for index, value in cells.items():
+                row[index] = value
+            await db.execute(
+                "UPDATE sheets_outbox SET row_json = ?, next_attempt_at = 0 WHERE id = ?",
+                (json.dumps(row, ensure_ascii=False), int(found["id"])),
+            )
+            return True
+
+    def _bucket_boundary(self, ts_epoch: int, granularity: str) -> int:
+        """Start of the first `granularity` bucket starting at or after `ts_epoch`."""
+        index = 0 if granularity == GRANULARITY_HOUR else 1
+        start = self._stats_buckets(ts_epoch)[index][1]
+        if start == ts_epoch:
+            return start
+        # Past the shortest and short of twice the longest hour/day (DST included)
+        return self._stats_buckets(start + (3600 if index == 0 else 36 * 3600))[index][1]
+
+    def _stats_buckets(self, ts_epoch: int) -> tuple[tuple[str, int], tuple[str, int]]:
+        local = datetime.fromtimestamp(ts_epoch, self.stats_tz)
+        hour_start = int(local.replace(minute=0, second=0, microsecond=0).timestamp())
+        day_start = int(local.replace(hour=0, minute=0, second=0, microsecond=0).timestamp())
+        return (GRANULARITY_HOUR, hour_start), (GRANULARITY_DAY, day_start)
+
+    async def _bump_join_stats(self, db: aiosqlite.Connection, event: JoinEvent) -> None:
+        """Add one event to its hour/day buckets, per link and channel-wide.
+
+        A late event in a bucket whose user set was already pruned may count
+        its user in ``distinct_users`` a second time.
+        """
+        requests = 1 if event.event_type == EVENT_JOIN_REQUEST else 0
+        joins = 1 if event.event_type == EVENT_JOIN else 0
+        for granularity, bucket_start in self._stats_buckets(event.occurred_at):
+            for link in (event.invite_link, ALL_LINKS):
+                key = (event.channel_id, link, granularity, bucket_start)
+                cursor = await db.execute(
+                    """
+                    INSERT OR IGNORE INTO join_stats_users
+                        (channel_id, invite_link, granularity, bucket_start, user_id)
+                    VALUES (?, ?, ?, ?, ?)
+                    """,
+                    (*key, event.user_id),
+                )
+                await db.execute(
+                    """
+                    INSERT INTO join_stats
+                        (channel_id, invite_link, granularity, bucket_start, requests, joins, distinct_users)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(channel_id, invite_link, granularity, bucket_start) DO UPDATE SET
+                        requests = requests + excluded.requests,
+                        joins = joins + excluded.joins,
+                        distinct_users = distinct_users + excluded.distinct_users
+                    """,
+                    (*key, requests, joins, cursor.rowcount),
+                )
+
+    @staticmethod
+    def _join_event_filter(
+        channel_id: Optional[int],
+        user_id: Optional[int],
+        invite_link: Optional[str],
+        event_type: Optional[str],
+        since: Optional[int],
+        until: Optional[int],
+    ) -> tuple[str, list[Any]]:
+        clauses: list[str] = []
+        params: list[Any] = []
+        for clause, value in (
+            ("channel_id = ?", channel_id),
+            ("user_id = ?", user_id),
+            ("invite_link = ?", invite_link),
+            ("event_type = ?", event_type),
+            ("occurred_at >= ?", since),
+            ("occurred_at < ?", until),
+        ):
+            if value is not None:
+                clauses.append(clause)
+                params.append(value)
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    @timed_query
+    async def query_join_events(
+        self,
+        channel_id: Optional[int] = None,
+        user_id: Optional[int] = None,
+        invite_link: Optional[str] = None,
+        event_type: Optional[str] = None,
+        since: Optional[int] = None,
+        until: Optional[int] = None,
+        limit: int = 1000,
+    ) -> list[JoinEvent]:
+        """Ledger events matching all given filters, oldest first; `until` is exclusive."""
+        where, params = self._join_event_filter(channel_id, user_id, invite_link, event_type, since, until)
+        async with self._read() as db:
+            async with db.execute(
+                f"""
+                SELECT id, channel_id, user_id, event_type, occurred_at,
+                       invite_link, link_name, full_name, username, update_id
+                FROM join_events{where}
+                ORDER BY occurred_at, id
+                LIMIT ?
+                """,
+                (*params, limit),
+            ) as cursor:
+                rows = await cursor.fetchall()
+            return [
+                JoinEvent(
+                    id=int(r["id"]),
+                    channel_id=int(r["channel_id"]),
+                    user_id=int(r["user_id"]),
+                    event_type=r["event_type"],
+                    occurred_at=int(r["occurred_at"]),
+                    invite_link=r["invite_link"],
+                    link_name=r["link_name"],
+                    full_name=r["full_name"],
+                    username=r["username"],
+                    update_id=None if r["update_id"] is None else int(r["update_id"]),
+                )
+                for r in rows
+            ]
+
+    @timed_query
+    async def count_join_events(
+        self,
+        channel_id: Optional[int] = None,
+        user_id: Optional[int] = None,
+        invite_link: Optional[str] = None,
+        event_type: Optional[str] = None,
+        since: Optional[int] = None,
+        until: Optional[int] = None,
+    ) -> int:
+        where, params = self._join_event_filter(channel_id, user_id, invite_link, event_type, since, until)
+        async with self._read() as db:
+            async with db.execute(f"SELECT COUNT(*) FROM join_events{where}", params) as cursor:
+                row = await cursor.fetchone()
+                return int(row[0]) if row else 0
+
+    @timed_query
+    async def get_join_stats(
+        self,
+        channel_id: int,
+        invite_link: str = ALL_LINKS,
+        granularity: str = GRANULARITY_DAY,
+        since: Optional[int] = None,
+        until: Optional[int] = None,
+    ) -> list[JoinStats]:
+        """Buckets of one channel (or one of its links) starting in [since, until), oldest first."""
+        async with self._read() as db:
+            async with db.execute(
+                """
+                SELECT bucket_start, requests, joins, distinct_users FROM join_stats
+                WHERE channel_id = ? AND invite_link = ? AND granularity = ?
+                  AND bucket_start >= ? AND bucket_start < ?
+                ORDER BY bucket_start
+                """,
+                (channel_id, invite_link, granularity, since or 0, until if until is not None else 2**62),
+            ) as cursor:
+                rows = await cursor.fetchall()
+            return [
+                JoinStats(
+                    channel_id=channel_id,
+                    invite_link=invite_link,
+                    granularity=granularity,
+                    bucket_start=int(r["bucket_start"]),
+                    requests=int(r["requests"]),
+                    joins=int(r["joins"]),
+                    distinct_users=int(r["distinct_users"]),
+                )
+                for r in rows
+            ]
+
+    @timed_query
+    async def get_link_stats(
+        self,
+        channel_id: int,
+        since: Optional[int] = None,
+        until: Optional[int] = None,
+        granularity: str = GRANULARITY_DAY,
+    ) -> list[JoinStats]:
+        """Per-link totals over whole buckets in [since, until), busiest links first.
+
+        The channel total (``ALL_LINKS``) comes first. Each result covers the
+        range (``bucket_start`` is its first bucket); ``distinct_users`` counts
+        every user once across the range, from the ledger events of those buckets.
+        """
+        since = since or 0
+        until = until if until is not None else 2**62
+        # Time span of the buckets in range, for the ledger's distinct users
+        first = self._bucket_boundary(since, granularity)
+        end = self._bucket_boundary(until, granularity) if until < 2**62 else until
+        async with self._read() as db:
+            async with db.execute(
+                """
+                SELECT invite_link, COUNT(DISTINCT user_id) AS users FROM join_events
+                WHERE channel_id = ? AND occurred_at >= ? AND occurred_at < ?
+                GROUP BY invite_link
+                UNION ALL
+                SELECT ?, COUNT(DISTINCT user_id) FROM join_events
+                WHERE channel_id = ? AND occurred_at >= ? AND occurred_at < ?
+                """,
+                (channel_id, first, end, ALL_LINKS, channel_id, first, end),
+            ) as cursor:
+                users = {r["invite_link"]: int(r["users"]) for r in await cursor.fetchall()}
+            async with db.execute(
+                """
+                SELECT invite_link, MIN(bucket_start) AS first_bucket,
+                       SUM(requests) AS requests, SUM(joins) AS joins
+                FROM join_stats
+                WHERE channel_id = ? AND granularity = ?
+                  AND bucket_start >= ? AND bucket_start < ?
+                GROUP BY invite_link
+                ORDER BY (invite_link = ?) DESC, SUM(requests) + SUM(joins) DESC, invite_link
+                """,
+                (channel_id, granularity, since, until, ALL_LINKS),
+            ) as cursor:
+                rows = await cursor.fetchall()
+            return [
+                JoinStats(
+                    channel_id=channel_id,
+                    invite_link=r["invite_link"],
+                    granularity=granularity,
+                    bucket_start=int(r["first_bucket"]),
+                    requests=int(r["requests"]),
+                    joins=int(r["joins"]),
+                    distinct_users=users.get(r["invite_link"], 0),
+                )
+                for r in rows
+            ]
+
+    async def rebuild_join_stats(self) -> int:
+        """Recompute all aggregates from the ledger (e.g. after an upgrade); return events replayed."""
+        events = 0
+        async with self._transaction() as db:
+            await db.execute("DELETE FROM join_stats")
+            await db.execute("DELETE FROM join_stats_users")
+            async with db.execute(
+                "SELECT channel_id, user_id, event_type, occurred_at, invite_link FROM join_events ORDER BY id"
+            ) as cursor:
+                async for r in cursor:
+                    await self._bump_join_stats(db, JoinEvent(
+                        channel_id=int(r["channel_id"]),
+                        user_id=int(r["user_id"]),
+                        event_type=r["event_type"],
+                        occurred_at=int(r["occurred_at"]),
+                        invite_link=r["invite_link"],
+                    ))
+                    events += 1
+            # Counted above; older user sets are not kept
+            await db.execute(
+                "DELETE FROM join_stats_users WHERE bucket_start < ?",
+                (int(time.time() - self.stats_users_retention),),
+            )
+        return events
+
+    @timed_query
+    async def prune_join_stats_users(self, now_epoch: Optional[int] = None) -> int:
+        """Drop user sets of buckets past the retention window; return rows deleted."""
+        now_epoch = int(time.time()) if now_epoch is None else now_epoch
+        async with self._transaction() as db:
+            cursor = await db.execute(
+                "DELETE FROM join_stats_users WHERE bucket_start < ?",
+                (int(now_epoch - self.stats_users_retention),),
+            )
+            return cursor.rowcount
@@ -0,0 +1,151 @@
+"""Two-tier deduplication of join requests.
+
+The in-memory tier keeps (channel_id, user_id) -> last_logged_at for the
+dedup window and answers checks without SQLite. After ``warm_up`` has loaded
+the window from ``join_request_log`` the memory tier is authoritative; before
+that a miss falls back to a table read. New marks are written behind: they
+are coalesced and flushed in one ``executemany`` upsert per interval. A
+retention pass drops entries older than the window from both tiers.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from ..config import Settings
+from .db import Database
+
+
+DEFAULT_WINDOW_SECONDS = 12 * 60 * 60
+
+Key = Tuple[int, int]
+
+
+class JoinRequestDedup:
+    def __init__(self, db: Database, window_seconds: int = DEFAULT_WINDOW_SECONDS):
+        self.db = db
+        self.window_seconds = window_seconds
+        # Ordered by last_logged_at (marks are appended at the back)
+        self._recent: "OrderedDict[Key, int]" = OrderedDict()
+        # Marks not yet flushed to join_request_log
+        self._pending: Dict[Key, int] = {}
+        self._complete = False
+        self._stopping = False
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def size(self) -> int:
+        return len(self._recent)
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    async def warm_up(self, now_epoch: Optional[int] = None) -> int:
+        """Load the current window from SQLite; afterwards misses skip the table."""
+        now_epoch = int(time.time()) if now_epoch is None else now_epoch
+        rows = await self.db.load_join_requests_since(now_epoch - self.window_seconds)
+        for channel_id, user_id, ts in rows:
+            self._remember((channel_id, user_id), ts)
+        self._complete = True
+        return len(rows)
+
+    def _remember(self, key: Key, ts: int) -> None:
+        self._recent.pop(key, None)
+        self._recent[key] = ts
+
+    async def last_logged_at(self, channel_id: int, user_id: int) -> Optional[int]:
+        key = (channel_id, user_id)
+        ts = self._recent.get(key)
+        if ts is not None or self._complete:
+            return ts
+        ts = await self.db.get_last_join_request_logged_at(channel_id, user_id)
+        if ts is not None:
+            self._remember(key, ts)
+        return ts
+
+    async def recently_logged(self, channel_id: int, user_id: int, now_epoch: int) -> Optional[int]:
+        """Return the last log time if it falls inside the dedup window, else None."""
+        last = await self.last_logged_at(channel_id, user_id)
+        if last is not None and now_epoch - last < self.window_seconds:
+            return last
+        return None
+
+    def mark(self, channel_id: int, user_id: int, ts_epoch: int) -> None:
+        """Record a logged request; persisted by the next ``flush``."""
+        key = (channel_id, user_id)
+        self._remember(key, ts_epoch)
+        self._pending[key] = ts_epoch
+
+    async def flush(self) -> int:
+        """Write coalesced marks in one transaction; return number of rows written."""
+        if not self._pending:
+            return 0
+        batch, self._pending = self._pending, {}
+        try:
+            await self.db.upsert_join_requests_logged_at(
+                (channel_id, user_id, ts) for (channel_id, user_id), ts in batch.items()
+            )
+        except Exception:
+            # Put marks back unless newer ones arrived meanwhile
+            for key, ts in batch.items():
+                self._pending.setdefault(key, ts)
+            raise
+        return len(batch)
+
+    async def prune(self, now_epoch: Optional[int] = None) -> int:
+        """Drop entries older than the window from memory and SQLite."""
+        now_epoch = int(time.time()) if now_epoch is None else now_epoch
+        cutoff = now_epoch - self.window_seconds
+        while self._recent:
+            key = next(iter(self._recent))
+            if self._recent[key] >= cutoff:
+                break
+            self._recent.popitem(last=False)
+        deleted = await self.db.prune_join_request_log(cutoff)
+        if deleted:
+            logging.getLogger(__name__).info(
+                "Pruned %d join_request_log rows older than %ds", deleted, self.window_seconds,
+                extra={"operation": "dedup_prune"},
+            )
+        return deleted
+
+    async def run(self, flush_interval: float, prune_interval: float) -> None:
+        next_prune = time.monotonic()
+        while not self._stopping:
+            try:
+                await self.flush()
+                if time.monotonic() >= next_prune:
+                    await self.prune()
+                    next_prune = time.monotonic() + prune_interval
+            except Exception as e:
+                logging.getLogger(__name__).exception(
+                    "Dedup maintenance failed: %s", e, extra={"operation": "dedup_flush"}
+                )
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    def start(self, flush_interval: float = 1.0, prune_interval: float = 3600.0) -> asyncio.Task:
+        self._stopping = False
+        self._task = asyncio.get_running_loop().create_task(self.run(flush_interval, prune_interval))
+        return self._task
+
+    async def stop(self) -> None:
+        """Stop the maintenance loop and flush remaining marks."""
+        self._stopping = True
+        self._wakeup.set()
+        if self._task is not None:
+            await self._task
+            self._task = None
+        await self.flush()
+
+
+def create_join_request_dedup_from_settings(db: Database, settings: Settings) -> JoinRequestDedup:
+    return JoinRequestDedup(db, window_seconds=settings.JOIN_REQUEST_DEDUP_SECONDS)
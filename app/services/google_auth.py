@@ -0,0 +1,159 @@
+"""Service account credentials for the Sheets client.
+
+Credentials are parsed once per process. ``TokenRefresher`` keeps their
+OAuth access token fresh from a background task, refreshing it ``lead``
+seconds before expiry, so the blocking refresh inside google-auth (run on
+the request path when a token is missing or expired) never delays a write.
+"""
+from __future__ import annotations
+
+import asyncio
+import base64
+import json
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING, Any, Callable, Optional
+
+from ..metrics import SHEETS_TOKEN_EXPIRY, SHEETS_TOKEN_REFRESH_FAILURES, SHEETS_TOKEN_REFRESH_SECONDS
+
+if TYPE_CHECKING:
+    from google.oauth2.service_account import Credentials
+
+
+SCOPES = [
+    "https://www.googleapis.com/auth/spreadsheets",
+    "https://www.googleapis.com/auth/drive",
+]
+
+
+def load_service_account_credentials(source: Optional[str]) -> Credentials:
+    """Build credentials from a file path, raw JSON or base64-encoded JSON."""
+    # google-auth is imported on first use to keep it off the startup path
+    from google.oauth2.service_account import Credentials
+
+    ci = (source or "").strip()
+    # Remove optional surrounding quotes from .env (e.g. "C:\\path\\key.json")
+    if (ci.startswith('"') and ci.endswith('"')) or (ci.startswith("'") and ci.endswith("'")):
+        ci = ci[1:-1].strip()
+    # File path
+    if ci and os.path.isfile(ci):
+        logging.getLogger(__name__).info("Google creds source: file path")
+        return Credentials.from_service_account_file(ci, scopes=SCOPES)
+    # Raw JSON
+    if ci and ci.lstrip("\ufeff").startswith("{"):
+        info = json.loads(ci.lstrip("\ufeff"))
+        logging.getLogger(__name__).info("Google creds source: inline JSON (email=%s)", info.get("client_email"))
+        return Credentials.from_service_account_info(info, scopes=SCOPES)
+    # Base64-encoded JSON (common in env/secrets)
+    if ci:
+        try:
+            decoded = base64.b64decode(ci).decode("utf-8")
+            info = json.loads(decoded.lstrip("\ufeff"))
+            logging.getLogger(__name__).info("Google creds source: base64 JSON (email=%s)", info.get("client_email"))
+            return Credentials.from_service_account_info(info, scopes=SCOPES)
+        except Exception:
+            pass
+    raise RuntimeError("Invalid GOOGLE_SERVICE_ACCOUNT_JSON: provide a file path, raw JSON, or base64 JSON")
+
+
+def _utcnow() -> datetime:
+    # google-auth keeps `expiry` as a naive UTC datetime
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class TokenRefresher:
+    """Refresh an access token ahead of its expiry from a background task.
+
+    Failed refreshes are retried with exponential delay (``retry_base`` up to
+    ``retry_max`` seconds); until one succeeds google-auth still refreshes on
+    demand, so writes keep working, only slower.
+    """
+
+    def __init__(
+        self,
+        credentials: Callable[[], Any],
+        lead: float = 600.0,
+        retry_base: float = 5.0,
+        retry_max: float = 120.0,
+        request_factory: Optional[Callable[[], Any]] = None,
+    ):
+        # A getter, so the source is parsed by the first refresh rather than at construction
+        self._credentials = credentials
+        self.lead = max(0.0, lead)
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self._request_factory = request_factory
+        self.refresh_count = 0
+        self._failures = 0
+        self._stopped = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def seconds_until_refresh(self) -> float:
+        """Seconds until the token enters the refresh window (0 = refresh now)."""
+        creds = self._credentials()
+        if not creds.token or creds.expiry is None:
+            return 0.0
+        return max(0.0, (creds.expiry - _utcnow()).total_seconds() - self.lead)
+
+    async def refresh_once(self) -> None:
+        """Fetch a new access token; the blocking HTTP call runs in a thread."""
+        creds = self._credentials()
+        if self._request_factory is None:
+            from google.auth.transport.requests import Request
+            self._request_factory = Request
+        started = time.perf_counter()
+        status = "ok"
+        try:
+            await asyncio.to_thread(creds.refresh, self._request_factory())
+        except Exception:
+            status = "error"
+            SHEETS_TOKEN_REFRESH_FAILURES.inc()
+            raise
+        finally:
+            SHEETS_TOKEN_REFRESH_SECONDS.observe(time.perf_counter() - started, status=status)
+        self.refresh_count += 1
+        if creds.expiry is not None:
+            SHEETS_TOKEN_EXPIRY.set(creds.expiry.replace(tzinfo=timezone.utc).timestamp())
+        logging.getLogger(__name__).info(
+            "Google access token refreshed in %.3fs, expires %s UTC",
+            time.perf_counter() - started, creds.expiry, extra={"operation": "gsheets_token_refresh"},
+        )
+
+    async def run(self) -> None:
+        while not self._stopped.is_set():
+            try:
+                delay = self.seconds_until_refresh()
+                if delay <= 0:
+                    await self.refresh_once()
+                    self._failures = 0
+                    # Guard against a lead longer than the token lifetime
+                    delay = max(self.seconds_until_refresh(), self.retry_base)
+            except Exception as e:
+                self._failures += 1
+                delay = min(self.retry_max, self.retry_base * (2 ** (self._failures - 1)))
+                logging.getLogger(__name__).warning(
+                    "Google access token refresh failed (attempt %d), retry in %.0fs: %s",
+                    self._failures, delay, e, extra={"operation": "gsheets_token_refresh"},
+                )
+            try:
+                await asyncio.wait_for(self._stopped.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self) -> asyncio.Task:
+        self._stopped.clear()
+        self._task = asyncio.get_running_loop().create_task(self.run())
+        return self._task
+
+    async def stop(self) -> None:
+        self._stopped.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            finally:
+                self._task = None
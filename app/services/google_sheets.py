@@ -1,26 +1,28 @@
 """Async Google Sheets client helpers (Stage 2 implementation)."""
 from __future__ import annotations
 
-import base64
-import json
-import os
+import asyncio
+import importlib
 import re
-from typing import Any, Callable, Optional
+import sys
+import time
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Coroutine, Optional, Sequence, Union
 import logging
 
 import backoff
 from aiohttp import ClientError
-from google.oauth2.service_account import Credentials
-from gspread.exceptions import APIError, WorksheetNotFound
-from gspread_asyncio import AsyncioGspreadClient, AsyncioGspreadClientManager
 
 from ..config import Settings
+from ..metrics import SHEETS_BATCH_ROWS, SHEETS_BATCH_SECONDS, SHEETS_CALL_SECONDS, on_backoff, on_giveup
+from .circuit_breaker import CircuitBreaker, CircuitOpenError
+from .google_auth import TokenRefresher, load_service_account_credentials
+from .sheets_rest import API_BASE, RestClientManager, SheetsApiError, a1_cell, a1_column_tail, a1_row_span, a1_start_row
+from .sheets_quota import READ, WRITE, SheetsQuotaScheduler, create_quota_scheduler_from_settings
 
+if TYPE_CHECKING:
+    from google.oauth2.service_account import Credentials
 
-SCOPES = [
-    "https://www.googleapis.com/auth/spreadsheets",
-    "https://www.googleapis.com/auth/drive",
-]
 
 HEADERS = [
     "Timestamp",
@@ -29,8 +31,91 @@ HEADERS = [
     "Username",
     "Invite Link",
     "Link Name",
+    "Event Key",
+    "Approved At",
+    "Outcome",
+    "Left At",
+    "Status",
 ]
 
+# Stable per-event id (the Telegram update id) used to skip rows already written
+EVENT_KEY_INDEX = HEADERS.index("Event Key")
+
+# Filled on join request rows held back for JOIN_REQUEST_COALESCE_SECONDS:
+# an approval within the window completes the row before it is written
+APPROVED_AT_INDEX = HEADERS.index("Approved At")
+OUTCOME_INDEX = HEADERS.index("Outcome")
+OUTCOME_PENDING = "pending"
+OUTCOME_APPROVED = "approved"
+
+# Edited in place once the row is written (see ``GoogleSheetsService.update_cells``)
+# when the member later leaves ("left") or is removed ("kicked")
+LEFT_AT_INDEX = HEADERS.index("Left At")
+STATUS_INDEX = HEADERS.index("Status")
+
+
+def row_event_key(row: list[Any]) -> str:
+    """Event key carried by a row, or "" for rows without one."""
+    if len(row) > EVENT_KEY_INDEX and row[EVENT_KEY_INDEX]:
+        return str(row[EVENT_KEY_INDEX])
+    return ""
+
+
+BACKEND_GSPREAD = "gspread"
+BACKEND_REST = "rest"
+
+# Client library each backend loads on first use (gspread and google-auth are
+# kept off the startup path; see GoogleSheetsService.warm_up)
+BACKEND_MODULES = {
+    BACKEND_GSPREAD: ("google.oauth2.service_account", "gspread_asyncio"),
+    BACKEND_REST: ("google.oauth2.service_account", "google.auth.transport.requests"),
+}
+
+# API error replies from either backend (gspread's APIError is mapped onto
+# SheetsApiError in GoogleSheetsService._api)
+API_ERRORS = (SheetsApiError,)
+
+
+def _as_api_error(e: BaseException) -> BaseException:
+    """Map a gspread ``APIError`` onto ``SheetsApiError``; return other errors as is."""
+    # gspread is only imported by its backend: if it is not loaded, no gspread error exists
+    gspread_errors = sys.modules.get("gspread.exceptions")
+    if gspread_errors is None or not isinstance(e, gspread_errors.APIError):
+        return e
+    error = getattr(e, "error", None) or {}
+    return SheetsApiError(getattr(e, "code", -1), error.get("message") or str(e))
+
+# Transient Sheets failures are retried with exponential backoff for up to a
+# minute; retries and give-ups are counted in the metrics registry
+_retry = backoff.on_exception(
+    backoff.expo, (*API_ERRORS, ClientError), max_time=60, on_backoff=on_backoff, on_giveup=on_giveup
+)
+
+
+def is_outage_error(e: BaseException) -> bool:
+    """Whether a failed call points at an unavailable API (vs. a bad request).
+
+    Network errors, timeouts, 5xx and 429 replies count against the circuit
+    breaker; other API replies (e.g. "already exists") prove the API is up.
+    """
+    if isinstance(e, API_ERRORS):
+        code = getattr(e, "code", -1)
+        return code == 429 or code >= 500 or code == -1
+    return isinstance(e, (ClientError, asyncio.TimeoutError, OSError))
+
+
+async def _timed(call: str, awaitable: Awaitable[Any]) -> Any:
+    """Await a Sheets API call, recording its latency and outcome."""
+    started = time.perf_counter()
+    status = "ok"
+    try:
+        return await awaitable
+    except Exception:
+        status = "error"
+        raise
+    finally:
+        SHEETS_CALL_SECONDS.observe(time.perf_counter() - started, call=call, status=status)
+
 
 def _sanitize_sheet_title(title: str, max_len: int = 100) -> str:
     """Sanitize sheet title for Google Sheets constraints.
@@ -53,7 +138,16 @@ sanitize_sheet_title = _sanitize_sheet_title
 
 
 class GoogleSheetsService:
-    def __init__(self, credentials: Optional[str], spreadsheet_id: Optional[str]):
+    def __init__(
+        self,
+        credentials: Optional[str],
+        spreadsheet_id: Optional[str],
+        metadata_ttl: float = 300.0,
+        quota: Optional[SheetsQuotaScheduler] = None,
+        backend: str = BACKEND_GSPREAD,
+        api_base: str = API_BASE,
+        breaker: Optional[CircuitBreaker] = None,
+    ):
         if not credentials:
             raise RuntimeError("GOOGLE_SERVICE_ACCOUNT_JSON is not set")
         if not spreadsheet_id:
@@ -61,116 +155,638 @@ class GoogleSheetsService:
 
         self.credentials_input = credentials
         self.spreadsheet_id = spreadsheet_id
+        self._credentials: Optional[Credentials] = None
 
-        def _creds_factory() -> Credentials:
-            # Accept either file path, raw JSON string, or base64-encoded JSON
-            ci = (self.credentials_input or "").strip()
-            # Remove optional surrounding quotes from .env (e.g. "C:\\path\\key.json")
-            if (ci.startswith('"') and ci.endswith('"')) or (ci.startswith("'") and ci.endswith("'")):
-                ci = ci[1:-1].strip()
-            # File path
-            if ci and os.path.isfile(ci):
-                logging.getLogger(__name__).info("Google creds source: file path")
-                return Credentials.from_service_account_file(ci, scopes=SCOPES)
-            # Raw JSON
-            if ci and ci.lstrip("\ufeff").startswith("{"):
-                info = json.loads(ci.lstrip("\ufeff"))
-                logging.getLogger(__name__).info(
-                    "Google creds source: inline JSON (email=%s)", info.get("client_email")
-                )
-                return Credentials.from_service_account_info(info, scopes=SCOPES)
-            # Base64-encoded JSON (common in env/secrets)
-            if ci:
-                try:
-                    decoded = base64.b64decode(ci).decode("utf-8")
-                    info = json.loads(decoded.lstrip("\ufeff"))
-                    logging.getLogger(__name__).info(
-                        "Google creds source: base64 JSON (email=%s)", info.get("client_email")
-                    )
-                    return Credentials.from_service_account_info(info, scopes=SCOPES)
-                except Exception:
-                    pass
-            raise RuntimeError("Invalid GOOGLE_SERVICE_ACCOUNT_JSON: provide a file path, raw JSON, or base64 JSON")
-
-        self._manager = AsyncioGspreadClientManager(_creds_factory)
-
-    async def _get_client(self) -> AsyncioGspreadClient:
-        return await self._manager.authorize()
-
-    @backoff.on_exception(backoff.expo, (APIError, ClientError), max_time=60)
+        backend = backend.lower()
+        if backend == BACKEND_REST:
+            # Native aiohttp client: keep-alive pool, no thread hop per call
+            self._manager = RestClientManager(self.get_credentials, api_base=api_base)
+        elif backend == BACKEND_GSPREAD:
+            # Created on first use, once gspread_asyncio is imported
+            self._manager = None
+        else:
+            raise RuntimeError(f"Unsupported GSHEETS_BACKEND: {backend!r} (use gspread or rest)")
+        self.backend = backend
+
+        # Metadata cache: spreadsheet handle and title -> worksheet map built from
+        # one worksheets() listing. Dropped on a miss (refresh) or after metadata_ttl.
+        self.metadata_ttl = metadata_ttl
+        self._spreadsheet: Any = None
+        self._worksheets: dict[str, Any] = {}
+        self._worksheets_loaded_at: Optional[float] = None
+        # Titles whose header row is known to carry all HEADERS (checked once per process)
+        self._headers_checked: set[str] = set()
+        # Serializes worksheet creation so concurrent first appends create it once
+        self._create_lock = asyncio.Lock()
+
+        # Optional client-side quota metering; every API call below takes a token first
+        self.quota = quota
+        # Optional circuit breaker; every API call below passes through it
+        self.breaker = breaker
+
+    def get_credentials(self) -> Credentials:
+        """Service account credentials, parsed from the configured source once."""
+        if self._credentials is None:
+            self._credentials = load_service_account_credentials(self.credentials_input)
+        return self._credentials
+
+    def _get_manager(self) -> Any:
+        if self._manager is None:
+            from gspread_asyncio import AsyncioGspreadClientManager
+            # The manager asks for credentials again every reauth interval; hand it the
+            # same object each time so a token refreshed in the background stays in use
+            self._manager = AsyncioGspreadClientManager(self.get_credentials)
+        return self._manager
+
+    async def _get_client(self) -> Any:
+        return await self._get_manager().authorize()
+
+    async def warm_up(self) -> None:
+        """Import the backend's client library and parse credentials in a thread.
+
+        Keeps those one-off costs off the event loop; ``health_check`` then
+        opens the spreadsheet.
+        """
+
+        def load() -> None:
+            for module in BACKEND_MODULES[self.backend]:
+                importlib.import_module(module)
+            self.get_credentials()
+
+        await asyncio.to_thread(load)
+
+    async def _throttle(self, kind: str, key: str = "") -> None:
+        if self.quota is not None:
+            await self.quota.acquire(kind, key)
+
+    async def _api(self, call: str, coro: Coroutine[Any, Any, Any], kind: str, key: str = "") -> Any:
+        """Run one API call: circuit breaker, quota token, latency metrics.
+
+        While the circuit is open the call is not started and
+        ``CircuitOpenError`` is raised right away (backoff does not retry it).
+        """
+        probe = False
+        if self.breaker is not None:
+            try:
+                probe = self.breaker.acquire()
+            except CircuitOpenError:
+                coro.close()
+                raise
+        try:
+            await self._throttle(kind, key)
+            result = await _timed(call, coro)
+        except BaseException as e:
+            coro.close()  # no-op once started; avoids a never-awaited warning otherwise
+            error = _as_api_error(e)
+            if self.breaker is not None:
+                self.breaker.release(probe, error)
+            if error is not e:
+                raise error from e
+            raise
+        if self.breaker is not None:
+            self.breaker.release(probe)
+        return result
+
+    @_retry
     async def _get_spreadsheet(self):
+        if self._spreadsheet is not None:
+            return self._spreadsheet
         client = await self._get_client()
         logging.getLogger(__name__).info("Opening spreadsheet by key: %s", self.spreadsheet_id)
-        ss = await client.open_by_key(self.spreadsheet_id)
+        ss = await self._api("open_by_key", client.open_by_key(self.spreadsheet_id), READ)
         logging.getLogger(__name__).info("Opened spreadsheet: %s", getattr(ss, "title", "<unknown>"))
+        self._spreadsheet = ss
         return ss
 
-    @backoff.on_exception(backoff.expo, (APIError, ClientError), max_time=60)
+    def invalidate_metadata(self) -> None:
+        """Forget cached worksheet handles; the next lookup re-lists worksheets."""
+        self._worksheets = {}
+        self._worksheets_loaded_at = None
+
+    def _metadata_fresh(self) -> bool:
+        return (
+            self._worksheets_loaded_at is not None
+            and time.monotonic() - self._worksheets_loaded_at < self.metadata_ttl
+        )
+
+    async def _refresh_worksheets(self) -> dict[str, Any]:
+        spreadsheet = await self._get_spreadsheet()
+        worksheets = await self._api("worksheets", spreadsheet.worksheets(), READ)
+        self._worksheets = {ws.title: ws for ws in worksheets}
+        self._worksheets_loaded_at = time.monotonic()
+        return self._worksheets
+
+    async def _get_worksheet(self, title: str) -> Optional[Any]:
+        """Return a cached worksheet handle, re-listing once on a cache miss."""
+        if not self._metadata_fresh():
+            await self._refresh_worksheets()
+            return self._worksheets.get(title)
+        ws = self._worksheets.get(title)
+        if ws is None:
+            # Sheet may have been created elsewhere since the last listing
+            await self._refresh_worksheets()
+            ws = self._worksheets.get(title)
+        return ws
+
+    async def _worksheet_for_append(self, sheet_title: str) -> Any:
+        ws = await self._get_worksheet(sheet_title)
+        if ws is None:
+            # First append to a new channel or partition: handlers only chose the
+            # name, so the worksheet is created here under exactly that title
+            ws = await self._create_sheet(sheet_title)
+        if ws.title not in self._headers_checked:
+            await self._extend_headers(ws)
+        return ws
+
+    async def _extend_headers(self, ws: Any) -> None:
+        """Label columns added to HEADERS since the worksheet was created.
+
+        Only a header row that is a shorter prefix of HEADERS is extended; an
+        empty first row or one holding something else is left alone.
+        """
+        header = await self._api("row_values", ws.row_values(1), READ, ws.title)
+        if header and len(header) < len(HEADERS) and list(header) == HEADERS[: len(header)]:
+            body = {
+                "valueInputOption": "USER_ENTERED",
+                "data": [{
+                    "range": a1_row_span(ws.title, 1, len(header) + 1, len(HEADERS)),
+                    "values": [HEADERS[len(header):]],
+                }],
+            }
+            spreadsheet = await self._get_spreadsheet()
+            await self._api("values_batch_update", spreadsheet.values_batch_update(body), WRITE, ws.title)
+            logging.getLogger(__name__).info(
+                "Added %d header columns to '%s'", len(HEADERS) - len(header), ws.title,
+                extra={"operation": "gsheets_headers"},
+            )
+        self._headers_checked.add(ws.title)
+
+    async def _create_sheet(self, title: str) -> Any:
+        """Create worksheet `title` with the header row, or return it if it already exists."""
+        async with self._create_lock:
+            ws = await self._get_worksheet(title)
+            if ws is not None:
+                return ws
+            with SheetsQuotaScheduler.prioritized():
+                try:
+                    return await self._add_sheet(await self._get_spreadsheet(), title)
+                except API_ERRORS as e:
+                    if not self._is_duplicate_sheet_error(e):
+                        raise
+                # Created elsewhere since the last listing
+                self.invalidate_metadata()
+                ws = await self._get_worksheet(title)
+            if ws is None:
+                raise RuntimeError(f"Worksheet '{title}' not found after creating it")
+            return ws
+
+    async def _add_sheet(self, spreadsheet: Any, title: str) -> Any:
+        logging.getLogger(__name__).info("Creating sheet '%s'", title)
+        # Size the grid to the header only; appends grow it row by row, so
+        # no empty cells count against the spreadsheet's 10M-cell limit
+        ws = await self._api("add_worksheet", spreadsheet.add_worksheet(title=title, rows=1, cols=len(HEADERS)), WRITE)
+        self._worksheets[title] = ws
+        # Write header row once for a new sheet
+        await self._api("append_row", ws.append_row(HEADERS, value_input_option="USER_ENTERED"), WRITE)
+        self._headers_checked.add(title)
+        logging.getLogger(__name__).info("Created sheet '%s' and wrote headers", title)
+        return ws
+
+    @staticmethod
+    def _is_duplicate_sheet_error(e: Exception) -> bool:
+        message = str(e).lower()
+        return "already exists" in message or "duplicate" in message
+
+    @staticmethod
+    def _is_missing_sheet_error(e: Exception) -> bool:
+        # Appending to a deleted sheet fails with a range error instead of WorksheetNotFound
+        return "unable to parse range" in str(e).lower()
+
+    @_retry
     async def ensure_sheet(self, title: str) -> str:
         """Ensure worksheet with sanitized title exists; return the final title used.
 
         If the worksheet does not exist, create it and write the header row.
         Performs basic collision resolution by appending a numeric suffix.
+        Its API calls jump the quota queue ahead of regular appends.
         """
+        with SheetsQuotaScheduler.prioritized():
+            return await self._ensure_sheet(title)
+
+    async def _ensure_sheet(self, title: str) -> str:
         spreadsheet = await self._get_spreadsheet()
         base = _sanitize_sheet_title(title)
         final_title = base
         # Detect existing base sheet; if found, treat as collision and start with suffix 2
-        try:
-            await spreadsheet.worksheet(final_title)
+        if await self._get_worksheet(final_title) is not None:
             suffix = 2
             final_title = f"{base} {suffix}"[:100]
-        except WorksheetNotFound:
+        else:
             suffix = 1
 
-        # Try creating; on duplicate, add incrementing suffix
+        # Skip titles already known from the cached listing, then try creating;
+        # on duplicate (created concurrently elsewhere), add incrementing suffix
         while True:
+            if final_title in self._worksheets:
+                suffix += 1
+                final_title = f"{base} {suffix}"[:100]
+                continue
             try:
-                logging.getLogger(__name__).info("Ensuring sheet: trying title '%s'", final_title)
-                ws = await spreadsheet.add_worksheet(title=final_title, rows=100, cols=16)
-                # Write header row once for a new sheet
-                await ws.append_row(HEADERS, value_input_option="USER_ENTERED")
-                logging.getLogger(__name__).info("Created sheet '%s' and wrote headers", final_title)
+                await self._add_sheet(spreadsheet, final_title)
                 return final_title
-            except APIError as e:
+            except API_ERRORS as e:
                 # If title already exists (race), try next suffix; else re-raise
-                message = str(e)
-                if "already exists" in message.lower() or "duplicate" in message.lower():
+                if self._is_duplicate_sheet_error(e):
+                    self.invalidate_metadata()
                     suffix += 1
                     final_title = f"{base} {suffix}"[:100]
                     continue
                 raise
 
-    @backoff.on_exception(backoff.expo, (APIError, ClientError), max_time=60)
+    @_retry
     async def append_row(self, sheet_title: str, row: list[Any]) -> None:
         """Append a row to the worksheet with retries on transient errors."""
-        spreadsheet = await self._get_spreadsheet()
+        logging.getLogger(__name__).info("Appending row: locating sheet '%s'", sheet_title)
+        ws = await self._worksheet_for_append(sheet_title)
+
+        logging.getLogger(__name__).debug("Appending row to '%s': %s", sheet_title, row)
         try:
-            logging.getLogger(__name__).info("Appending row: locating sheet '%s'", sheet_title)
-            ws = await spreadsheet.worksheet(sheet_title)
-        except WorksheetNotFound:
-            # Create sheet on the fly if missing
-            created_title = await self.ensure_sheet(sheet_title)
-            ws = await spreadsheet.worksheet(created_title)
-
-        logging.getLogger(__name__).info("Appending row to '%s': %s", sheet_title, row)
-        await ws.append_row(row, value_input_option="USER_ENTERED")
+            await self._api("append_row", ws.append_row(row, value_input_option="USER_ENTERED"), WRITE, sheet_title)
+        except API_ERRORS as e:
+            if self._is_missing_sheet_error(e):
+                self.invalidate_metadata()
+            raise
         logging.getLogger(__name__).info("Row appended to '%s'", sheet_title)
 
+    async def append_rows(
+        self, sheet_title: str, rows: list[list[Any]], verify: bool = False, known_rows: int = 0
+    ) -> dict[str, int]:
+        """Append several rows to the worksheet with a single API call.
+
+        A failed append may still have been applied by Google (e.g. a timeout),
+        so every retry, and the first attempt when `verify` is set, first reads
+        the sheet's Event Key column and drops rows that are already there.
+        `known_rows` says rows 1..known_rows hold none of `rows`; only the
+        column below them is read.
+
+        Returns the sheet row number of each row by event key, taken from the
+        reply's ``updatedRange`` (or the Event Key column for skipped rows).
+        """
+        if not rows:
+            return {}
+        pending = list(rows)
+        check = verify
+        locations: dict[str, int] = {}
+
+        @_retry
+        async def append_rows() -> None:
+            nonlocal pending, check
+            ws = await self._worksheet_for_append(sheet_title)
+            if check:
+                pending = await self._drop_written_rows(ws, sheet_title, pending, locations, known_rows)
+                if not pending:
+                    return
+            check = True
+            try:
+                reply = await self._api(
+                    "append_rows", ws.append_rows(pending, value_input_option="USER_ENTERED"), WRITE, sheet_title
+                )
+            except API_ERRORS as e:
+                if self._is_missing_sheet_error(e):
+                    self.invalidate_metadata()
+                raise
+            start = a1_start_row(reply.get("updates", {}).get("updatedRange", "")) if isinstance(reply, dict) else None
+            if start is not None:
+                for offset, row in enumerate(pending):
+                    key = row_event_key(row)
+                    if key:
+                        locations[key] = start + offset
+            logging.getLogger(__name__).info("Appended %d rows to '%s'", len(pending), sheet_title)
+
+        await append_rows()
+        return locations
+
+    async def _drop_written_rows(
+        self, ws: Any, sheet_title: str, rows: list[list[Any]], locations: dict[str, int], known_rows: int = 0
+    ) -> list[list[Any]]:
+        keys = {row_event_key(r) for r in rows} - {""}
+        if not keys:
+            return rows
+        first = max(1, known_rows + 1)
+        column = await self._event_keys(ws, sheet_title, first)
+        written = set(column) & keys
+        if written:
+            logging.getLogger(__name__).warning(
+                "Skipping %d rows already present in '%s'", len(written), sheet_title,
+                extra={"operation": "gsheets_idempotent_skip"},
+            )
+            for number, key in enumerate(column, start=first):
+                if key in written:
+                    locations[key] = number
+        return [r for r in rows if row_event_key(r) not in written]
+
+    async def _event_keys(self, ws: Any, sheet_title: str, first_row: int = 1) -> list[Any]:
+        """Event Key column of the worksheet from `first_row` down."""
+        values = await self._api(
+            "get", ws.get(a1_column_tail(EVENT_KEY_INDEX + 1, first_row), major_dimension="COLUMNS"), READ, sheet_title
+        )
+        return values[0] if values else []
+
+    async def locate_rows(self, sheet_title: str, keys: set[str]) -> dict[str, int]:
+        """Current row number of each of `keys` found in the worksheet's Event Key column."""
+
+        @_retry
+        async def locate_rows() -> dict[str, int]:
+            ws = await self._get_worksheet(sheet_title)
+            if ws is None:
+                return {}
+            column = await self._event_keys(ws, sheet_title)
+            return {str(key): number for number, key in enumerate(column, start=1) if str(key) in keys}
+
+        return await locate_rows()
+
+    async def _moved_rows(self, row_keys: dict[tuple[str, int], str]) -> set[tuple[str, int]]:
+        """Rows among `row_keys` whose Event Key cell holds another key, with one ``values.batchGet``."""
+        locations = list(row_keys)
+        ranges = [a1_cell(title, row, EVENT_KEY_INDEX + 1) for title, row in locations]
+
+        @_retry
+        async def read_keys() -> Any:
+            spreadsheet = await self._get_spreadsheet()
+            return await self._api("values_batch_get", spreadsheet.values_batch_get(ranges), READ)
+
+        reply = await read_keys()
+        value_ranges = (reply or {}).get("valueRanges", [])
+        moved: set[tuple[str, int]] = set()
+        for i, location in enumerate(locations):
+            values = value_ranges[i].get("values") if i < len(value_ranges) else None
+            key = values[0][0] if values and values[0] else ""
+            if str(key) != row_keys[location]:
+                moved.add(location)
+        return moved
+
+    async def update_cells(
+        self,
+        cells: list[tuple[str, int, int, Any]],
+        row_keys: Optional[dict[tuple[str, int], str]] = None,
+    ) -> set[tuple[str, int]]:
+        """Overwrite single cells with one ``values.batchUpdate`` call.
+
+        `cells` holds (worksheet title, 1-based row, 0-based column, value).
+        With `row_keys` ((title, row) -> event key) the Event Key cell of each
+        row is checked first; rows now holding another key (the sheet was
+        sorted or rows were deleted) are left alone and returned.
+        """
+        moved: set[tuple[str, int]] = set()
+        if cells and row_keys:
+            moved = await self._moved_rows(row_keys)
+            cells = [c for c in cells if (c[0], c[1]) not in moved]
+        if not cells:
+            return moved
+        body = {
+            "valueInputOption": "USER_ENTERED",
+            "data": [
+                {"range": a1_cell(title, row, col + 1), "values": [[value]]}
+                for title, row, col, value in cells
+            ],
+        }
+
+        @_retry
+        async def update_cells() -> None:
+            spreadsheet = await self._get_spreadsheet()
+            await self._api("values_batch_update", spreadsheet.values_batch_update(body), WRITE)
+            logging.getLogger(__name__).info("Updated %d cells", len(cells))
+
+        await update_cells()
+        return moved
+
     async def health_check(self) -> None:
         """Lightweight check that we can auth and access the spreadsheet."""
-        ss = await self._get_spreadsheet()
         try:
-            # Try to list first worksheet to confirm access
-            await ss.worksheets()
+            # List worksheets to confirm access; this also warms the metadata cache
+            with SheetsQuotaScheduler.prioritized():
+                await self._refresh_worksheets()
             logging.getLogger(__name__).info("Google Sheets health_check OK")
         except Exception as e:
             logging.getLogger(__name__).exception("Google Sheets health_check failed: %s", e)
             raise
 
+    async def close(self) -> None:
+        """Release pooled HTTP connections (native backend only)."""
+        close = getattr(self._manager, "close", None)
+        if close is not None:
+            await close()
+
+
+@dataclass
+class BatchFlush:
+    """Outcome of a single batched append."""
+
+    sheet_title: str
+    size: int
+    latency: float
+    error: Optional[BaseException] = None
+    shard: int = 0
+
+
+# Buffers are kept per (shard, worksheet title)
+_BufferKey = tuple[int, str]
+
 
-def create_google_sheets_service_from_settings(settings: Settings) -> GoogleSheetsService:
+class SheetsBatchWriter:
+    """Buffer rows per worksheet and write them with one multi-row append.
+
+    A worksheet buffer is flushed when it reaches ``max_batch_size`` rows or when
+    its oldest row has waited ``max_latency`` seconds, whichever comes first.
+    ``append_row`` resolves once the batch holding the row has been written, so
+    callers still observe delivery errors. ``close()`` flushes everything left.
+
+    `sheets` is one service or a sequence of them (spreadsheet shards); a
+    row's `shard` selects the service it is written through.
+    """
+
+    def __init__(
+        self,
+        sheets: Union[GoogleSheetsService, Sequence[GoogleSheetsService]],
+        max_batch_size: int = 100,
+        max_latency: float = 1.0,
+        on_flush: Optional[Callable[[BatchFlush], None]] = None,
+    ):
+        self.shards: Sequence[GoogleSheetsService] = sheets if isinstance(sheets, Sequence) else [sheets]
+        self.sheets = self.shards[0]
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_latency = max(0.0, max_latency)
+        self.on_flush = on_flush
+        self.last_flush: Optional[BatchFlush] = None
+        self.flush_count = 0
+        self.rows_flushed = 0
+        self._buffers: dict[_BufferKey, list[tuple[list[Any], asyncio.Future]]] = {}
+        self._timers: dict[_BufferKey, asyncio.TimerHandle] = {}
+        self._locks: dict[_BufferKey, asyncio.Lock] = {}
+        # Worksheets whose next batch must be checked for already written rows,
+        # with the number of leading rows known not to hold any of them
+        self._verify: dict[_BufferKey, int] = {}
+        self._tasks: set[asyncio.Task] = set()
+        self._closed = False
+
+    @property
+    def pending(self) -> int:
+        """Number of rows buffered and not yet handed to the Sheets API."""
+        return sum(len(buf) for buf in self._buffers.values())
+
+    def submit(
+        self, sheet_title: str, row: list[Any], verify: bool = False, shard: int = 0, known_rows: int = 0
+    ) -> asyncio.Future:
+        """Buffer a row and return a future resolved when its batch is written.
+
+        The future's result is the row's sheet row number, if known.
+
+        `verify` marks a row that may already be in the sheet (a retry); its
+        batch then skips rows whose event key is present below the first
+        `known_rows` rows.
+        """
+        if self._closed:
+            raise RuntimeError("SheetsBatchWriter is closed")
+        loop = asyncio.get_running_loop()
+        fut: asyncio.Future = loop.create_future()
+        key = (shard, sheet_title)
+        if verify:
+            self._verify[key] = min(known_rows, self._verify.get(key, known_rows))
+        buf = self._buffers.setdefault(key, [])
+        buf.append((row, fut))
+        if len(buf) >= self.max_batch_size:
+            self._spawn_flush(key)
+        elif key not in self._timers:
+            self._timers[key] = loop.call_later(self.max_latency, self._spawn_flush, key)
+        return fut
+
+    async def append_row(self, sheet_title: str, row: list[Any]) -> None:
+        """Drop-in for ``GoogleSheetsService.append_row`` that goes through the buffer."""
+        await self.submit(sheet_title, row)
+
+    async def flush(self, sheet_title: Optional[str] = None) -> None:
+        """Flush one worksheet buffer (or all of them) and wait for the writes."""
+        keys = [k for k in self._buffers if sheet_title is None or k[1] == sheet_title]
+        for key in keys:
+            self._spawn_flush(key)
+        if self._tasks:
+            await asyncio.gather(*list(self._tasks), return_exceptions=True)
+
+    async def close(self) -> None:
+        """Stop accepting rows and flush everything still buffered."""
+        self._closed = True
+        await self.flush()
+
+    def _spawn_flush(self, key: _BufferKey) -> None:
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        batch = self._buffers.pop(key, None)
+        if not batch:
+            return
+        verify = key in self._verify
+        known_rows = self._verify.pop(key, 0)
+        task = asyncio.get_running_loop().create_task(self._write_batch(key, batch, verify, known_rows))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _write_batch(
+        self,
+        key: _BufferKey,
+        batch: list[tuple[list[Any], asyncio.Future]],
+        verify: bool = False,
+        known_rows: int = 0,
+    ) -> None:
+        shard, sheet_title = key
+        # Serialize writes per worksheet so rows keep their submission order
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            started = time.monotonic()
+            error: Optional[BaseException] = None
+            locations: dict[str, int] = {}
+            try:
+                sheets = self.shards[shard]
+                locations = await sheets.append_rows(
+                    sheet_title, [row for row, _fut in batch], verify=verify, known_rows=known_rows
+                ) or {}
+            except Exception as e:
+                error = e
+            latency = time.monotonic() - started
+        SHEETS_BATCH_ROWS.observe(len(batch))
+        SHEETS_BATCH_SECONDS.observe(latency, status="ok" if error is None else "error")
+
+        for row, fut in batch:
+            if fut.done():
+                continue
+            if error is None:
+                fut.set_result(locations.get(row_event_key(row)))
+            else:
+                fut.set_exception(error)
+
+        result = BatchFlush(sheet_title=sheet_title, size=len(batch), latency=latency, error=error, shard=shard)
+        self.last_flush = result
+        self.flush_count += 1
+        if error is None:
+            self.rows_flushed += len(batch)
+            logging.getLogger(__name__).info(
+                "Flushed batch to '%s' (shard %d): size=%d latency=%.3fs", sheet_title, shard, len(batch), latency,
+                extra={"operation": "gsheets_batch_flush"},
+            )
+        else:
+            logging.getLogger(__name__).warning(
+                "Batch flush to '%s' (shard %d) failed: size=%d latency=%.3fs error=%s",
+                sheet_title, shard, len(batch), latency, error,
+                extra={"operation": "gsheets_batch_flush"},
+            )
+        if self.on_flush is not None:
+            try:
+                self.on_flush(result)
+            except Exception:
+                logging.getLogger(__name__).exception("on_flush callback failed")
+
+
+def create_google_sheets_service_from_settings(
+    settings: Settings,
+    spreadsheet_id: Optional[str] = None,
+    credentials: Optional[str] = None,
+    quota: Optional[SheetsQuotaScheduler] = None,
+    breaker_name: str = "sheets",
+) -> GoogleSheetsService:
+    """Service for the primary spreadsheet, or for one shard when overrides are given."""
+    if quota is None and settings.GSHEETS_QUOTA_ENABLED:
+        quota = create_quota_scheduler_from_settings(settings)
     return GoogleSheetsService(
-        credentials=settings.GOOGLE_SERVICE_ACCOUNT_JSON,
-        spreadsheet_id=settings.GOOGLE_SPREADSHEET_ID,
+        credentials=credentials or settings.GOOGLE_SERVICE_ACCOUNT_JSON,
+        spreadsheet_id=spreadsheet_id or settings.GOOGLE_SPREADSHEET_ID,
+        metadata_ttl=settings.GSHEETS_METADATA_TTL,
+        quota=quota,
+        backend=settings.GSHEETS_BACKEND,
+        breaker=create_circuit_breaker_from_settings(settings, breaker_name),
+    )
+
+
+def create_circuit_breaker_from_settings(settings: Settings, name: str = "sheets") -> Optional[CircuitBreaker]:
+    if settings.GSHEETS_BREAKER_FAILURES <= 0:
+        return None
+    return CircuitBreaker(
+        name,
+        failure_threshold=settings.GSHEETS_BREAKER_FAILURES,
+        reset_timeout=settings.GSHEETS_BREAKER_RESET_TIMEOUT,
+        is_failure=is_outage_error,
     )
+
+
+def create_batch_writer_from_settings(
+    sheets: Union[GoogleSheetsService, Sequence[GoogleSheetsService]], settings: Settings
+) -> SheetsBatchWriter:
+    return SheetsBatchWriter(
+        sheets,
+        max_batch_size=settings.GSHEETS_BATCH_MAX_ROWS,
+        max_latency=settings.GSHEETS_BATCH_MAX_LATENCY,
+    )
+
+
+def create_token_refresher_from_settings(sheets: GoogleSheetsService, settings: Settings) -> Optional[TokenRefresher]:
+    if settings.GSHEETS_TOKEN_REFRESH_LEAD <= 0:
+        return None
+    return TokenRefresher(sheets.get_credentials, lead=settings.GSHEETS_TOKEN_REFRESH_LEAD)
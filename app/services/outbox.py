@@ -0,0 +1,326 @@
+"""Background delivery of the SQLite outbox to Google Sheets.
+
+Handlers only persist rows into ``sheets_outbox`` and return. The drainer
+picks up due rows, hands them to the batch writer and removes them once the
+append succeeded; failed rows are rescheduled with exponential delay, so
+nothing is lost across restarts.
+
+Delivery is idempotent per event key: rows whose key is recorded in
+``sheets_delivered`` are dropped without a write, and rows that may already
+have reached the sheet (retries, and everything picked up right after a
+restart) are checked against the sheet's Event Key column first. Only the
+column below the last indexed row written before the row was queued is read.
+
+Rows of a spreadsheet shard whose circuit breaker is open are not sent;
+they are deferred in SQLite until the breaker admits its recovery probe
+(with every shard open the drainer does not fetch at all).
+
+Delivered rows are indexed by event key in ``sheet_rows`` (worksheet and row
+number from the append reply). Later status changes of a row, e.g. the member
+leaving, are queued in ``sheets_row_updates`` and written in place with one
+``values.batchUpdate`` per shard once the row's location is known. The
+Event Key cell of each target row is checked first (one ``values.batchGet``):
+if the sheet was sorted or rows were deleted, the row is looked up by its key
+and edited at its new place. Row locations are forgotten together with the
+delivery records.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import math
+import time
+from typing import Dict, Optional
+
+from ..config import Settings
+from .circuit_breaker import CircuitBreaker
+from .db import Database, OutboxItem, RowUpdate
+from .google_sheets import SheetsBatchWriter
+
+
+class OutboxDrainer:
+    def __init__(
+        self,
+        db: Database,
+        writer: SheetsBatchWriter,
+        batch_size: int = 200,
+        poll_interval: float = 0.5,
+        retry_base: float = 5.0,
+        retry_max: float = 300.0,
+        delivered_retention: float = 30 * 24 * 3600.0,
+        breakers: Optional[Dict[int, CircuitBreaker]] = None,
+    ):
+        self.db = db
+        self.writer = writer
+        self.batch_size = max(1, batch_size)
+        self.poll_interval = poll_interval
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.delivered_retention = delivered_retention
+        # shard -> circuit breaker of its spreadsheet
+        self.breakers = breakers or {}
+        # Rows fetched before the first completed cycle may have been in flight
+        # when the previous process stopped
+        self._recovering = True
+        self._next_prune = 0.0
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        self._task: Optional[asyncio.Task] = None
+
+    def notify(self) -> None:
+        """Wake the drainer early (handlers call it via ``ServiceContainer.notify_outbox``)."""
+        self._wakeup.set()
+
+    async def drain_once(self) -> int:
+        """Deliver one batch of due rows; return how many were delivered."""
+        open_shards = {shard for shard, b in self.breakers.items() if not b.allows_request()}
+        if open_shards and len(open_shards) == len(self.breakers):
+            return 0
+        now = int(time.time())
+        items = await self.db.fetch_due_outbox(now, limit=self.batch_size)
+        if not items:
+            self._recovering = False
+            return 0
+        fetched = len(items)
+        if open_shards:
+            items = await self._defer_open_shards(items, open_shards, now)
+
+        # Drop rows whose event was already written (replayed or queued twice)
+        already = await self.db.delivered_keys(i.event_key for i in items)
+        duplicates: list[OutboxItem] = []
+        unique: list[OutboxItem] = []
+        for item in items:
+            if item.event_key and item.event_key in already:
+                duplicates.append(item)
+            else:
+                already.add(item.event_key)
+                unique.append(item)
+        if duplicates:
+            await self.db.delete_outbox(i.id for i in duplicates)
+            logging.getLogger(__name__).info(
+                "Dropped %d outbox rows already delivered", len(duplicates), extra={"operation": "outbox_drain"}
+            )
+
+        verify = [self._recovering or item.attempts > 0 for item in unique]
+        known_rows = await self._known_rows([i for i, v in zip(unique, verify) if v])
+        futures = [
+            self.writer.submit(
+                item.sheet_name,
+                item.row,
+                verify=check,
+                shard=item.shard,
+                known_rows=known_rows.get((item.shard, item.sheet_name), 0),
+            )
+            for item, check in zip(unique, verify)
+        ]
+        results = await asyncio.gather(*futures, return_exceptions=True)
+        if len(items) == fetched:
+            # Deferred rows keep the recovery check for their next attempt
+            self._recovering = False
+
+        delivered: list[OutboxItem] = []
+        row_numbers: dict[int, int] = {}
+        failed: dict[int, list[OutboxItem]] = {}
+        errors: dict[int, str] = {}
+        for item, result in zip(unique, results):
+            if isinstance(result, BaseException):
+                failed.setdefault(item.attempts, []).append(item)
+                errors[item.attempts] = str(result) or type(result).__name__
+            else:
+                delivered.append(item)
+                if isinstance(result, int):
+                    row_numbers[item.id] = result
+
+        try:
+            # Stamped after the appends: sheet_rows_before relies on it
+            await self.db.complete_outbox(delivered, int(time.time()), row_numbers)
+        except Exception:
+            # The rows reached the sheet but are still queued: the next cycle
+            # checks the Event Key column before resending anything
+            self._recovering = True
+            raise
+        for attempts, group in failed.items():
+            delay = min(self.retry_max, self.retry_base * (2 ** attempts))
+            await self.db.reschedule_outbox((i.id for i in group), now + int(delay), errors[attempts])
+            logging.getLogger(__name__).warning(
+                "Outbox delivery failed for %d rows (attempt %d), retry in %ds: %s",
+                len(group), attempts + 1, int(delay), errors[attempts],
+                extra={"operation": "outbox_drain"},
+            )
+        return len(delivered) + len(duplicates)
+
+    async def _known_rows(self, items: list[OutboxItem]) -> dict[tuple[int, str], int]:
+        """Per worksheet, how many leading rows were written before any of `items` was queued.
+
+        The idempotency check of those rows then reads only the sheet below.
+        """
+        queued: dict[tuple[int, str], int] = {}
+        for item in items:
+            key = (item.shard, item.sheet_name)
+            queued[key] = min(item.created_at, queued.get(key, item.created_at))
+        known: dict[tuple[int, str], int] = {}
+        for (shard, sheet_name), created_at in queued.items():
+            known[(shard, sheet_name)] = await self.db.sheet_rows_before(shard, sheet_name, created_at)
+        return known
+
+    async def _defer_open_shards(self, items: list[OutboxItem], open_shards: set[int], now: int) -> list[OutboxItem]:
+        """Postpone rows of shards that are failing fast; return the others."""
+        ready: list[OutboxItem] = []
+        blocked: dict[int, list[int]] = {}
+        for item in items:
+            if item.shard in open_shards:
+                blocked.setdefault(item.shard, []).append(item.id)
+            else:
+                ready.append(item)
+        for shard, ids in blocked.items():
+            await self.db.defer_outbox(ids, now + max(1, math.ceil(self.breakers[shard].retry_in())))
+        return ready
+
+    async def apply_row_updates(self) -> int:
+        """Write due in-place row edits, one ``values.batchUpdate`` per shard; return how many."""
+        now = int(time.time())
+        updates = await self.db.fetch_due_row_updates(now, limit=self.batch_size)
+        if not updates:
+            return 0
+        orphaned = [u.id for u in updates if u.row_number is None and not u.queued]
+        if orphaned:
+            # The row was written before the index existed, without a ledger event,
+            # or its location was pruned
+            await self.db.delete_row_updates(orphaned)
+            logging.getLogger(__name__).warning(
+                "Dropped %d row updates whose row is not indexed", len(orphaned),
+                extra={"operation": "outbox_row_update"},
+            )
+        # Rows still in the outbox are edited once they are written
+        await self.db.reschedule_row_updates(
+            (u.id for u in updates if u.row_number is None and u.queued), now + max(1, math.ceil(self.poll_interval))
+        )
+        by_shard: dict[int, list[RowUpdate]] = {}
+        for update in updates:
+            if update.row_number is not None:
+                by_shard.setdefault(update.shard, []).append(update)
+
+        applied = 0
+        for shard, group in by_shard.items():
+            breaker = self.breakers.get(shard)
+            if breaker is not None and not breaker.allows_request():
+                await self.db.reschedule_row_updates(
+                    (u.id for u in group), now + max(1, math.ceil(breaker.retry_in()))
+                )
+                continue
+            cells = [
+                (u.sheet_name, u.row_number, column, value)
+                for u in group
+                for column, value in sorted(u.cells.items())
+            ]
+            # Only rows whose Event Key cell still matches are written
+            row_keys = {(u.sheet_name, u.row_number): u.event_key for u in group}
+            try:
+                moved = await self.writer.shards[shard].update_cells(cells, row_keys) or set()
+            except Exception as e:
+                attempts = min(u.attempts for u in group)
+                delay = min(self.retry_max, self.retry_base * (2 ** attempts))
+                await self.db.reschedule_row_updates(
+                    (u.id for u in group), now + int(delay), str(e) or type(e).__name__
+                )
+                logging.getLogger(__name__).warning(
+                    "Row updates failed for %d rows (shard %d), retry in %ds: %s", len(group), shard, int(delay), e,
+                    extra={"operation": "outbox_row_update"},
+                )
+                continue
+            stale = [u for u in group if (u.sheet_name, u.row_number) in moved]
+            await self.db.delete_row_updates(u.id for u in group if (u.sheet_name, u.row_number) not in moved)
+            applied += len(group) - len(stale)
+            if stale:
+                await self._relocate(shard, stale, now)
+        return applied
+
+    async def _relocate(self, shard: int, stale: list[RowUpdate], now: int) -> None:
+        """Find rows that moved in the sheet by their Event Key and retarget their edits."""
+        sheets = self.writer.shards[shard]
+        by_sheet: dict[str, list[RowUpdate]] = {}
+        for update in stale:
+            by_sheet.setdefault(update.sheet_name, []).append(update)
+        for sheet_name, group in by_sheet.items():
+            try:
+                found = await sheets.locate_rows(sheet_name, {u.event_key for u in group})
+            except Exception as e:
+                delay = min(self.retry_max, self.retry_base * (2 ** min(u.attempts for u in group)))
+                await self.db.reschedule_row_updates(
+                    (u.id for u in group), now + int(delay), str(e) or type(e).__name__
+                )
+                continue
+            await self.db.move_sheet_rows({u.event_key: found.get(u.event_key) for u in group})
+            # Moved rows are edited at their new place on the next cycle
+            await self.db.reschedule_row_updates((u.id for u in group if u.event_key in found), now)
+            gone = [u for u in group if u.event_key not in found]
+            if gone:
+                await self.db.delete_row_updates(u.id for u in gone)
+            logging.getLogger(__name__).warning(
+                "Rows moved in '%s' (shard %d): %d relocated, %d no longer in the sheet",
+                sheet_name, shard, len(group) - len(gone), len(gone),
+                extra={"operation": "outbox_row_update"},
+            )
+
+    async def prune(self) -> int:
+        """Forget old delivery records and row locations, and stale join_stats user sets.
+
+        Runs at most hourly; returns the number of rows deleted.
+        """
+        if time.monotonic() < self._next_prune:
+            return 0
+        self._next_prune = time.monotonic() + 3600.0
+        deleted = await self.db.prune_delivered(int(time.time() - self.delivered_retention))
+        return deleted + await self.db.prune_join_stats_users()
+
+    async def run(self) -> None:
+        """Drain until stopped; errors are logged and retried on the next tick."""
+        while not self._stopping:
+            try:
+                delivered = await self.drain_once()
+                await self.apply_row_updates()
+                await self.prune()
+            except Exception as e:
+                delivered = 0
+                logging.getLogger(__name__).exception(
+                    "Outbox drain cycle failed: %s", e, extra={"operation": "outbox_drain"}
+                )
+            if delivered >= self.batch_size:
+                # Backlog: keep going without waiting
+                continue
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    def start(self) -> asyncio.Task:
+        self._stopping = False
+        self._task = asyncio.get_running_loop().create_task(self.run())
+        return self._task
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        """Let the current cycle finish, then stop. Pending rows stay in SQLite."""
+        self._stopping = True
+        self._wakeup.set()
+        if self._task is not None:
+            try:
+                await asyncio.wait_for(self._task, timeout=timeout)
+            except asyncio.TimeoutError:
+                logging.getLogger(__name__).warning(
+                    "Outbox drainer did not stop in %.0fs; undelivered rows stay queued", timeout
+                )
+            finally:
+                self._task = None
+
+
+def create_outbox_drainer_from_settings(db: Database, writer: SheetsBatchWriter, settings: Settings) -> OutboxDrainer:
+    return OutboxDrainer(
+        db,
+        writer,
+        batch_size=settings.OUTBOX_BATCH_SIZE,
+        poll_interval=settings.OUTBOX_POLL_INTERVAL,
+        retry_max=settings.OUTBOX_RETRY_MAX_DELAY,
+        delivered_retention=settings.OUTBOX_DELIVERED_RETENTION_DAYS * 24 * 3600.0,
+        breakers={shard: s.breaker for shard, s in enumerate(writer.shards) if s.breaker is not None},
+    )
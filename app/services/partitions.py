@@ -0,0 +1,97 @@
+"""Per-channel worksheet partitioning.
+
+A channel writes to one active worksheet (its partition). With rollover
+enabled, a new partition is started when the active one reaches
+``max_rows`` data rows or when the calendar period changes; partitions are
+named after the channel title, e.g. "Title 2025-Q3" or "Title 2025-Q3 (2)".
+The active partition, its period and its row count live in ``channels``,
+together with the spreadsheet shard the channel was assigned to (see
+services/shards.py); rollover keeps a channel on its shard.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+from zoneinfo import ZoneInfo
+
+from ..config import Settings
+
+
+PERIOD_NONE = ""
+PERIOD_MONTH = "month"
+PERIOD_QUARTER = "quarter"
+PERIOD_YEAR = "year"
+PERIODS = (PERIOD_NONE, PERIOD_MONTH, PERIOD_QUARTER, PERIOD_YEAR)
+
+# Sheets limits titles to 100 characters; keep room for the partition suffix
+_MAX_TITLE = 100
+
+
+@dataclass
+class ChannelPartition:
+    """Active worksheet of a channel as stored in ``channels``."""
+
+    sheet_name: str
+    base_title: str
+    period_key: str = ""
+    index: int = 1
+    rows: int = 0
+    shard: int = 0
+
+
+class RolloverPolicy:
+    def __init__(self, max_rows: int = 0, period: str = PERIOD_NONE, timezone: str = "UTC"):
+        period = (period or PERIOD_NONE).lower()
+        if period not in PERIODS:
+            raise RuntimeError(f"Unsupported GSHEETS_ROLLOVER_PERIOD: {period!r} (use month, quarter or year)")
+        self.max_rows = max(0, max_rows)
+        self.period = period
+        self.tz = ZoneInfo(timezone)
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.max_rows or self.period)
+
+    def period_key(self, now_epoch: int) -> str:
+        if not self.period:
+            return ""
+        now = datetime.fromtimestamp(now_epoch, self.tz)
+        if self.period == PERIOD_MONTH:
+            return f"{now.year}-{now.month:02d}"
+        if self.period == PERIOD_QUARTER:
+            return f"{now.year}-Q{(now.month - 1) // 3 + 1}"
+        return str(now.year)
+
+    def title(self, base_title: str, period_key: str, index: int) -> str:
+        suffix = f" {period_key}" if period_key else ""
+        if index > 1:
+            suffix += f" ({index})"
+        return base_title[: _MAX_TITLE - len(suffix)].rstrip() + suffix
+
+    def needs_rollover(self, partition: ChannelPartition, now_epoch: int) -> bool:
+        if self.max_rows and partition.rows >= self.max_rows:
+            return True
+        return bool(self.period) and self.period_key(now_epoch) != partition.period_key
+
+    def next_partition(self, base_title: str, current: Optional[ChannelPartition], now_epoch: int) -> ChannelPartition:
+        """Partition to open for a channel whose current one is missing or full."""
+        key = self.period_key(now_epoch)
+        index = 1
+        if current is not None and current.period_key == key:
+            index = current.index + 1
+        return ChannelPartition(
+            sheet_name=self.title(base_title, key, index),
+            base_title=base_title,
+            period_key=key,
+            index=index,
+            shard=current.shard if current is not None else 0,
+        )
+
+
+def create_rollover_policy_from_settings(settings: Settings) -> RolloverPolicy:
+    return RolloverPolicy(
+        max_rows=settings.GSHEETS_ROLLOVER_ROWS,
+        period=settings.GSHEETS_ROLLOVER_PERIOD,
+        timezone=settings.TIMEZONE,
+    )
@@ -0,0 +1,119 @@
+"""Spreadsheet shards: channels spread across several spreadsheets/accounts.
+
+Google meters Sheets calls per project and per user (service account), and
+a spreadsheet serializes writes to itself. With ``GOOGLE_EXTRA_SPREADSHEET_IDS``
+(and optionally ``GOOGLE_EXTRA_SERVICE_ACCOUNTS``) every shard is its own
+``GoogleSheetsService`` with its own per-account quota buckets and circuit
+breaker. Per-project buckets are shared by the accounts of one Google Cloud
+project (``GOOGLE_SERVICE_ACCOUNT_PROJECTS``; by default all accounts are
+assumed to live in one), so accounts in separate projects add up their quota.
+
+A channel is assigned a shard once, when its first worksheet is created, and
+the choice is stored in ``channels.shard``; its outbox rows carry the shard,
+so delivery never needs to look it up again.
+"""
+from __future__ import annotations
+
+import asyncio
+from collections.abc import Sequence
+from typing import Iterator, Optional
+
+from ..config import Settings
+from .db import Database
+from .google_sheets import GoogleSheetsService, create_google_sheets_service_from_settings
+from .sheets_quota import (
+    SheetsQuotaScheduler,
+    TokenBucket,
+    create_project_buckets_from_settings,
+    create_quota_scheduler_from_settings,
+)
+
+
+ASSIGN_HASH = "hash"
+ASSIGN_LOAD = "load"
+
+
+class SheetsShards(Sequence):
+    """Ordered pool of ``GoogleSheetsService`` instances, index = shard number."""
+
+    def __init__(self, services: Sequence[GoogleSheetsService], assignment: str = ASSIGN_HASH):
+        if not services:
+            raise RuntimeError("At least one spreadsheet shard is required")
+        assignment = assignment.lower()
+        if assignment not in (ASSIGN_HASH, ASSIGN_LOAD):
+            raise RuntimeError(f"Unsupported GSHEETS_SHARD_ASSIGNMENT: {assignment!r} (use hash or load)")
+        self._services = list(services)
+        self.assignment = assignment
+
+    def __getitem__(self, shard: int) -> GoogleSheetsService:  # type: ignore[override]
+        if not 0 <= shard < len(self._services):
+            raise RuntimeError(
+                f"Spreadsheet shard {shard} is not configured ({len(self._services)} shards); "
+                "only append to GOOGLE_EXTRA_SPREADSHEET_IDS"
+            )
+        return self._services[shard]
+
+    def __len__(self) -> int:
+        return len(self._services)
+
+    def __iter__(self) -> Iterator[GoogleSheetsService]:
+        return iter(self._services)
+
+    async def assign(self, db: Database, channel_id: int) -> int:
+        """Shard for a channel that has none yet."""
+        if len(self._services) == 1:
+            return 0
+        if self.assignment == ASSIGN_LOAD:
+            counts = await db.count_channels_by_shard()
+            return min(range(len(self._services)), key=lambda i: (counts.get(i, 0), i))
+        return channel_id % len(self._services)
+
+    def queued(self) -> int:
+        """Calls waiting for quota across all service accounts."""
+        schedulers = {id(s.quota): s.quota for s in self._services if s.quota is not None}
+        return sum(q.queued() for q in schedulers.values())
+
+    async def warm_up(self) -> None:
+        await asyncio.gather(*(service.warm_up() for service in self._services))
+
+    async def health_check(self) -> None:
+        for service in self._services:
+            await service.health_check()
+
+    async def close(self) -> None:
+        for service in self._services:
+            await service.close()
+
+
+def create_sheets_shards_from_settings(settings: Settings) -> SheetsShards:
+    spreadsheet_ids = [settings.GOOGLE_SPREADSHEET_ID, *settings.GOOGLE_EXTRA_SPREADSHEET_IDS]
+    accounts = [settings.GOOGLE_SERVICE_ACCOUNT_JSON, *settings.GOOGLE_EXTRA_SERVICE_ACCOUNTS]
+    projects = list(settings.GOOGLE_SERVICE_ACCOUNT_PROJECTS)
+    if len(projects) > len(accounts):
+        raise RuntimeError(
+            f"GOOGLE_SERVICE_ACCOUNT_PROJECTS lists {len(projects)} projects for {len(accounts)} service accounts"
+        )
+    projects += [projects[0] if projects else ""] * (len(accounts) - len(projects))
+    # One scheduler (per-user buckets) per service account, on the buckets of its project
+    project_buckets: dict[str, dict[str, TokenBucket]] = {}
+    schedulers: dict[Optional[str], SheetsQuotaScheduler] = {}
+    services = []
+    for shard, spreadsheet_id in enumerate(spreadsheet_ids):
+        index = shard % len(accounts)
+        account = accounts[index]
+        quota = None
+        if settings.GSHEETS_QUOTA_ENABLED:
+            if account not in schedulers:
+                project = projects[index]
+                if project not in project_buckets:
+                    project_buckets[project] = create_project_buckets_from_settings(settings)
+                schedulers[account] = create_quota_scheduler_from_settings(settings, project_buckets[project])
+            quota = schedulers[account]
+        services.append(create_google_sheets_service_from_settings(
+            settings,
+            spreadsheet_id=spreadsheet_id,
+            credentials=account,
+            quota=quota,
+            breaker_name="sheets" if shard == 0 else f"sheets_{shard}",
+        ))
+    return SheetsShards(services, assignment=settings.GSHEETS_SHARD_ASSIGNMENT)
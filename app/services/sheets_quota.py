@@ -0,0 +1,201 @@
+"""Client-side metering of Google Sheets API quota.
+
+Google enforces per-minute read and write quotas per project and per user
+(service account). Every Sheets call first takes one token from each bucket
+of its kind; when a bucket is empty the call waits in a queue instead of
+being sent and bounced with a 429. Waiters are served high priority first
+(``ensure_sheet``, health checks), then round-robin across fairness keys
+(worksheet titles), so one busy channel cannot starve the others.
+"""
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from typing import Callable, Deque, Dict, Iterator, Optional, Sequence
+
+from ..config import Settings
+
+
+READ = "read"
+WRITE = "write"
+
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 1
+
+# Priority applied to calls that do not pass one explicitly
+_current_priority: contextvars.ContextVar[int] = contextvars.ContextVar(
+    "sheets_quota_priority", default=PRIORITY_NORMAL
+)
+
+
+class TokenBucket:
+    """Token bucket sized so that no 60s window exceeds ``per_minute`` calls.
+
+    Up to ``burst`` tokens can be spent at once; the refill rate is reduced by
+    the same amount, so burst plus a minute of refill never exceeds the quota.
+    """
+
+    __slots__ = ("name", "capacity", "rate", "tokens", "updated", "_clock")
+
+    def __init__(
+        self,
+        name: str,
+        per_minute: int,
+        burst: int = 5,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        per_minute = max(1, per_minute)
+        self.name = name
+        self.capacity = float(max(1, min(burst, per_minute // 2)))
+        self.rate = max(per_minute - self.capacity, 1.0) / 60.0
+        self.tokens = self.capacity
+        self._clock = clock
+        self.updated = clock()
+
+    def _refill(self) -> None:
+        now = self._clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def available(self) -> bool:
+        self._refill()
+        return self.tokens >= 1.0
+
+    def take(self) -> None:
+        self.tokens -= 1.0
+
+    def wait_time(self) -> float:
+        """Seconds until one token is available."""
+        self._refill()
+        if self.tokens >= 1.0:
+            return 0.0
+        return (1.0 - self.tokens) / self.rate
+
+
+class _KindQueue:
+    __slots__ = ("buckets", "high", "normal", "timer")
+
+    def __init__(self, buckets: Sequence[TokenBucket]):
+        self.buckets = list(buckets)
+        self.high: Deque[asyncio.Future] = deque()
+        # fairness key -> waiters; iteration order is the round-robin order
+        self.normal: "OrderedDict[str, Deque[asyncio.Future]]" = OrderedDict()
+        self.timer: Optional[asyncio.TimerHandle] = None
+
+    def waiting(self) -> int:
+        return len(self.high) + sum(len(q) for q in self.normal.values())
+
+    def ready(self) -> bool:
+        return all(b.available() for b in self.buckets)
+
+    def take(self) -> None:
+        for b in self.buckets:
+            b.take()
+
+    def wait_time(self) -> float:
+        return max((b.wait_time() for b in self.buckets), default=0.0)
+
+    def next_waiter(self) -> Optional[asyncio.Future]:
+        while self.high:
+            fut = self.high.popleft()
+            if not fut.done():
+                return fut
+        while self.normal:
+            key, waiters = next(iter(self.normal.items()))
+            fut = waiters.popleft()
+            # Rotate: this key goes to the back if it still has waiters
+            del self.normal[key]
+            if waiters:
+                self.normal[key] = waiters
+            if not fut.done():
+                return fut
+        return None
+
+
+class SheetsQuotaScheduler:
+    def __init__(self, read_buckets: Sequence[TokenBucket], write_buckets: Sequence[TokenBucket]):
+        self._queues: Dict[str, _KindQueue] = {
+            READ: _KindQueue(read_buckets),
+            WRITE: _KindQueue(write_buckets),
+        }
+        self.waited = 0
+
+    def queued(self, kind: Optional[str] = None) -> int:
+        """Number of calls currently waiting for quota."""
+        kinds = [kind] if kind else list(self._queues)
+        return sum(self._queues[k].waiting() for k in kinds)
+
+    @staticmethod
+    @contextmanager
+    def prioritized(priority: int = PRIORITY_HIGH) -> Iterator[None]:
+        """Run the enclosed calls (in this task) with the given priority."""
+        token = _current_priority.set(priority)
+        try:
+            yield
+        finally:
+            _current_priority.reset(token)
+
+    async def acquire(self, kind: str, key: str = "", priority: Optional[int] = None) -> None:
+        """Wait until a call of `kind` fits the budget, then consume one token."""
+        q = self._queues[kind]
+        if priority is None:
+            priority = _current_priority.get()
+        # Fast path: nobody queued ahead of us and budget available
+        if not q.waiting() and q.ready():
+            q.take()
+            return
+        fut: asyncio.Future = asyncio.get_running_loop().create_future()
+        if priority <= PRIORITY_HIGH:
+            q.high.append(fut)
+        else:
+            q.normal.setdefault(key, deque()).append(fut)
+        self.waited += 1
+        self._pump(kind)
+        await fut
+
+    def _pump(self, kind: str) -> None:
+        q = self._queues[kind]
+        if q.timer is not None:
+            q.timer.cancel()
+            q.timer = None
+        while q.waiting():
+            if not q.ready():
+                delay = q.wait_time()
+                q.timer = asyncio.get_running_loop().call_later(delay, self._pump, kind)
+                return
+            fut = q.next_waiter()
+            if fut is None:
+                return
+            q.take()
+            fut.set_result(None)
+
+
+def create_quota_scheduler_from_settings(
+    settings: Settings,
+    project_buckets: Optional[Dict[str, TokenBucket]] = None,
+) -> SheetsQuotaScheduler:
+    """Build a scheduler with per-user buckets and (possibly shared) per-project buckets."""
+    burst = settings.GSHEETS_QUOTA_BURST
+    if project_buckets is None:
+        project_buckets = create_project_buckets_from_settings(settings)
+    return SheetsQuotaScheduler(
+        read_buckets=[
+            project_buckets[READ],
+            TokenBucket("user_read", settings.GSHEETS_READS_PER_MINUTE_USER, burst),
+        ],
+        write_buckets=[
+            project_buckets[WRITE],
+            TokenBucket("user_write", settings.GSHEETS_WRITES_PER_MINUTE_USER, burst),
+        ],
+    )
+
+
+def create_project_buckets_from_settings(settings: Settings) -> Dict[str, TokenBucket]:
+    burst = settings.GSHEETS_QUOTA_BURST
+    return {
+        READ: TokenBucket("project_read", settings.GSHEETS_READS_PER_MINUTE_PROJECT, burst),
+        WRITE: TokenBucket("project_write", settings.GSHEETS_WRITES_PER_MINUTE_PROJECT, burst),
+    }
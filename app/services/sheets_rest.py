@@ -0,0 +1,240 @@
+"""Native async Google Sheets backend over the v4 REST API.
+
+Drop-in for the ``gspread_asyncio`` client manager used by
+``GoogleSheetsService``: ``authorize()`` returns a client whose spreadsheet
+and worksheet objects expose the same coroutine methods the service calls
+(``worksheets``, ``add_worksheet``, ``append_row(s)``, ``row_values``,
+``col_values``, ``get``, ``values_batch_get``, ``values_batch_update``).
+Requests go straight from the event loop through one keep-alive aiohttp
+session instead of a thread pool running synchronous ``requests`` calls.
+"""
+from __future__ import annotations
+
+import asyncio
+from typing import Any, Callable, Optional
+from urllib.parse import quote
+
+import aiohttp
+from aiohttp import ClientError, ServerTimeoutError
+
+
+API_BASE = "https://sheets.googleapis.com/v4/spreadsheets"
+
+
+class SheetsApiError(Exception):
+    """Non-2xx reply from the Sheets API; ``code`` is the HTTP status."""
+
+    def __init__(self, code: int, message: str):
+        super().__init__(f"APIError: [{code}]: {message}")
+        self.code = code
+        self.message = message
+
+
+def a1_range(title: str, cells: str = "") -> str:
+    """Quote a worksheet title for A1 notation, e.g. 'It''s'!G:G."""
+    quoted = "'" + title.replace("'", "''") + "'"
+    return f"{quoted}!{cells}" if cells else quoted
+
+
+def a1_cell(title: str, row: int, col: int) -> str:
+    """A1 reference of one cell (1-based row and column), e.g. 'Sheet'!H5."""
+    return a1_range(title, f"{_column_letter(col)}{row}")
+
+
+def a1_row_span(title: str, row: int, first_col: int, last_col: int) -> str:
+    """A1 reference of cells first_col..last_col (1-based) of one row, e.g. 'Sheet'!G1:K1."""
+    return a1_range(title, f"{_column_letter(first_col)}{row}:{_column_letter(last_col)}{row}")
+
+
+def a1_column_tail(col: int, first_row: int) -> str:
+    """A1 cells of one column (1-based) from `first_row` down, e.g. G120:G."""
+    letter = _column_letter(col)
+    return f"{letter}{first_row}:{letter}"
+
+
+def a1_start_row(a1: str) -> Optional[int]:
+    """First row number of an A1 range such as 'Sheet'!A5:I7 (None if it has none)."""
+    cells = a1.rsplit("!", 1)[-1].split(":", 1)[0]
+    digits = cells.lstrip("$ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz")
+    return int(digits) if digits.isdigit() else None
+
+
+class RestWorksheet:
+    def __init__(self, spreadsheet: "RestSpreadsheet", properties: dict[str, Any]):
+        self.spreadsheet = spreadsheet
+        self.id = properties.get("sheetId")
+        self.title = properties.get("title", "")
+        grid = properties.get("gridProperties", {})
+        self.row_count = grid.get("rowCount", 0)
+        self.col_count = grid.get("columnCount", 0)
+
+    async def append_row(self, values: list[Any], value_input_option: str = "RAW") -> dict[str, Any]:
+        return await self.append_rows([values], value_input_option=value_input_option)
+
+    async def append_rows(self, values: list[list[Any]], value_input_option: str = "RAW") -> dict[str, Any]:
+        """``values:append`` after the last row of the table; returns the API reply."""
+        return await self.spreadsheet.client.request(
+            "POST",
+            f"{self.spreadsheet.url}/values/{quote(a1_range(self.title), safe='')}:append",
+            params={"valueInputOption": value_input_option, "insertDataOption": "INSERT_ROWS"},
+            json={"majorDimension": "ROWS", "values": values},
+        )
+
+    async def row_values(self, row: int) -> list[Any]:
+        """Values of one row (1-based), trailing empty cells omitted."""
+        reply = await self.spreadsheet.client.request(
+            "GET",
+            f"{self.spreadsheet.url}/values/{quote(a1_range(self.title, f'{row}:{row}'), safe='')}",
+            params={"majorDimension": "ROWS"},
+        )
+        values = reply.get("values") or [[]]
+        return values[0]
+
+    async def col_values(self, col: int) -> list[Any]:
+        """Values of one column (1-based), trailing empty cells omitted."""
+        letter = _column_letter(col)
+        reply = await self.spreadsheet.client.request(
+            "GET",
+            f"{self.spreadsheet.url}/values/{quote(a1_range(self.title, f'{letter}:{letter}'), safe='')}",
+            params={"majorDimension": "COLUMNS"},
+        )
+        values = reply.get("values") or [[]]
+        return values[0]
+
+    async def get(self, range_name: str, major_dimension: str = "ROWS") -> list[list[Any]]:
+        """Values of a range of this worksheet (A1 without the title), like gspread's ``get``."""
+        reply = await self.spreadsheet.client.request(
+            "GET",
+            f"{self.spreadsheet.url}/values/{quote(a1_range(self.title, range_name), safe='')}",
+            params={"majorDimension": major_dimension},
+        )
+        return reply.get("values") or []
+
+
+class RestSpreadsheet:
+    def __init__(self, client: "RestClient", spreadsheet_id: str, title: str = ""):
+        self.client = client
+        self.id = spreadsheet_id
+        self.title = title
+        self.url = f"{client.api_base}/{spreadsheet_id}"
+
+    async def worksheets(self) -> list[RestWorksheet]:
+        reply = await self.client.request(
+            "GET", self.url, params={"fields": "properties.title,sheets.properties"}
+        )
+        self.title = reply.get("properties", {}).get("title", self.title)
+        return [RestWorksheet(self, s.get("properties", {})) for s in reply.get("sheets", [])]
+
+    async def add_worksheet(self, title: str, rows: int, cols: int) -> RestWorksheet:
+        reply = await self.batch_update([{
+            "addSheet": {
+                "properties": {"title": title, "gridProperties": {"rowCount": rows, "columnCount": cols}}
+            }
+        }])
+        return RestWorksheet(self, reply["replies"][0]["addSheet"]["properties"])
+
+    async def values_batch_get(self, ranges: list[str], params: Optional[dict[str, Any]] = None) -> dict[str, Any]:
+        """Read several ranges (``values.batchGet``) in one call."""
+        query = [("ranges", r) for r in ranges] + list((params or {}).items())
+        return await self.client.request("GET", f"{self.url}/values:batchGet", params=query)
+
+    async def values_batch_update(self, body: dict[str, Any]) -> dict[str, Any]:
+        """Write several ranges (``values.batchUpdate``) in one call."""
+        return await self.client.request("POST", f"{self.url}/values:batchUpdate", json=body)
+
+    async def batch_update(self, requests: list[dict[str, Any]]) -> dict[str, Any]:
+        """Apply structural changes (``spreadsheets.batchUpdate``) in one call."""
+        return await self.client.request("POST", f"{self.url}:batchUpdate", json={"requests": requests})
+
+
+class RestClient:
+    def __init__(self, manager: "RestClientManager"):
+        self.manager = manager
+        self.api_base = manager.api_base
+
+    async def open_by_key(self, key: str) -> RestSpreadsheet:
+        spreadsheet = RestSpreadsheet(self, key)
+        reply = await self.request("GET", spreadsheet.url, params={"fields": "properties.title"})
+        spreadsheet.title = reply.get("properties", {}).get("title", "")
+        return spreadsheet
+
+    async def request(self, method: str, url: str, **kwargs: Any) -> dict[str, Any]:
+        return await self.manager.request(method, url, **kwargs)
+
+
+class RestClientManager:
+    """Owns the pooled HTTP session and applies the OAuth token to each call.
+
+    The token is normally kept fresh by ``TokenRefresher``; if it is missing
+    or expired anyway, it is refreshed once (in a thread) before the request.
+    Timeouts surface as ``ServerTimeoutError`` so callers retry them like any
+    other ``ClientError``.
+    """
+
+    def __init__(
+        self,
+        credentials: Callable[[], Any],
+        api_base: str = API_BASE,
+        pool_size: int = 10,
+        timeout: float = 30.0,
+        request_factory: Optional[Callable[[], Any]] = None,
+    ):
+        self._credentials = credentials
+        self.api_base = api_base.rstrip("/")
+        self.pool_size = pool_size
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self._request_factory = request_factory
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._token_lock = asyncio.Lock()
+        self._client = RestClient(self)
+
+    async def authorize(self) -> RestClient:
+        return self._client
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=60)
+            self._session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+        return self._session
+
+    async def _token(self) -> str:
+        creds = self._credentials()
+        if not creds.valid:
+            async with self._token_lock:
+                if not creds.valid:
+                    if self._request_factory is None:
+                        from google.auth.transport.requests import Request
+                        self._request_factory = Request
+                    await asyncio.to_thread(creds.refresh, self._request_factory())
+        return creds.token
+
+    async def request(self, method: str, url: str, **kwargs: Any) -> dict[str, Any]:
+        headers = {"Authorization": f"Bearer {await self._token()}"}
+        try:
+            async with self._get_session().request(method, url, headers=headers, **kwargs) as resp:
+                if resp.status >= 400:
+                    raise SheetsApiError(resp.status, await _error_message(resp))
+                return await resp.json(content_type=None) or {}
+        except asyncio.TimeoutError as e:
+            raise ServerTimeoutError(f"Sheets API {method} timed out") from e
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+
+async def _error_message(resp: aiohttp.ClientResponse) -> str:
+    try:
+        payload = await resp.json(content_type=None)
+        return payload.get("error", {}).get("message") or str(payload)
+    except (ClientError, ValueError, AttributeError):
+        return await resp.text()
+
+
+def _column_letter(col: int) -> str:
+    letters = ""
+    while col > 0:
+        col, rem = divmod(col - 1, 26)
+        letters = chr(ord("A") + rem) + letters
+    return letters
@@ -3,30 +3,66 @@
 Stores recent (chat_id, user_id) -> (invite_url, invite_name) for a short TTL
 so that when ChatMemberUpdated arrives after an approval, we can enrich the
 row with the original invite link details.
+
+Entries live in an insertion-ordered dict. With the (default) constant TTL,
+insertion order is expiry order, so pruning only pops expired entries from
+the front and stops at the first live one: amortized O(1) per call instead
+of a full scan. An entry stored with a longer TTL may shield shorter-lived
+ones behind it from pruning for a while; ``pop`` still checks each entry's
+own deadline, and the hard ``MAX_ENTRIES`` cap bounds memory in any case.
 """
 from __future__ import annotations
 
 import time
-from typing import Dict, Optional, Tuple
+from collections import OrderedDict
+from typing import Optional, Tuple
 import logging
 
 
-# key: (chat_id, user_id) -> value: (expires_at, invite_url, invite_name)
-_cache: Dict[Tuple[int, int], Tuple[float, str, str]] = {}
+# Hard cap on cached requests; the oldest entries are evicted beyond it
+MAX_ENTRIES = 100_000
+
+
+class _Entry:
+    __slots__ = ("expires_at", "invite_url", "invite_name")
+
+    def __init__(self, expires_at: float, invite_url: str, invite_name: str):
+        self.expires_at = expires_at
+        self.invite_url = invite_url
+        self.invite_name = invite_name
+
+
+# key: (chat_id, user_id) -> _Entry, oldest first
+_cache: "OrderedDict[Tuple[int, int], _Entry]" = OrderedDict()
+# Accounting: entries dropped by TTL and by the size cap
+_expired = 0
+_evicted = 0
 
 
-def _prune(now: float | None = None) -> None:
-    now = now or time.time()
-    expired = [key for key, (exp, _u, _n) in _cache.items() if exp <= now]
-    for key in expired:
-        _cache.pop(key, None)
+def _prune(now: Optional[float] = None) -> None:
+    global _expired
+    if now is None:
+        now = time.time()
+    while _cache:
+        key = next(iter(_cache))
+        if _cache[key].expires_at > now:
+            break
+        _cache.popitem(last=False)
+        _expired += 1
 
 
 def remember(chat_id: int, user_id: int, invite_url: str, invite_name: str, ttl_seconds: int = 900) -> None:
     """Remember invite metadata for a limited time (default 15 minutes)."""
+    global _evicted
     now = time.time()
     _prune(now)
-    _cache[(chat_id, user_id)] = (now + ttl_seconds, invite_url or "", invite_name or "")
+    key = (chat_id, user_id)
+    # Re-insert at the back so order keeps following expiry
+    _cache.pop(key, None)
+    while len(_cache) >= MAX_ENTRIES:
+        _cache.popitem(last=False)
+        _evicted += 1
+    _cache[key] = _Entry(now + ttl_seconds, invite_url or "", invite_name or "")
     logging.getLogger(__name__).info(
         "Cached join request metadata (ttl=%ss)", ttl_seconds,
         extra={"channel_id": chat_id, "user_id": user_id, "operation": "join_cache_remember"},
@@ -37,14 +73,31 @@ def pop(chat_id: int, user_id: int) -> Optional[Tuple[str, str]]:
     """Pop and return (invite_url, invite_name) if present and not expired."""
     now = time.time()
     _prune(now)
-    val = _cache.pop((chat_id, user_id), None)
-    if not val:
+    entry = _cache.pop((chat_id, user_id), None)
+    if entry is None:
         return None
-    exp, url, name = val
-    if exp <= now:
+    if entry.expires_at <= now:
         return None
     logging.getLogger(__name__).info(
         "Recovered cached invite metadata",
         extra={"channel_id": chat_id, "user_id": user_id, "operation": "join_cache_hit"},
     )
-    return url, name
+    return entry.invite_url, entry.invite_name
+
+
+def size() -> int:
+    """Number of entries currently held (including not yet pruned expired ones)."""
+    return len(_cache)
+
+
+def stats() -> dict:
+    """Size and eviction accounting for diagnostics/metrics."""
+    return {"size": len(_cache), "expired": _expired, "evicted": _evicted, "max_entries": MAX_ENTRIES}
+
+
+def clear() -> None:
+    """Drop all entries and reset counters."""
+    global _expired, _evicted
+    _cache.clear()
+    _expired = 0
+    _evicted = 0
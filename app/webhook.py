@@ -0,0 +1,66 @@
+"""Webhook ingestion mode (alternative to long polling).
+
+Telegram POSTs updates to an aiohttp server. Requests must carry the
+``X-Telegram-Bot-Api-Secret-Token`` header configured with ``setWebhook``;
+valid updates are answered with 200 right away and processed by the
+Dispatcher in a background task.
+
+Local testing: run with ``BOT_MODE=webhook WEBHOOK_SET_ON_STARTUP=false`` and
+POST a recorded update with ``python -m scripts.post_update update.json``.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiohttp import web
+
+from .config import Settings
+
+
+def build_webhook_app(dp: Dispatcher, bot: Bot, path: str, secret_token: str) -> web.Application:
+    """Create the aiohttp application that feeds webhook updates to `dp`."""
+    app = web.Application()
+    handler = SimpleRequestHandler(
+        dispatcher=dp,
+        bot=bot,
+        secret_token=secret_token,
+        # Reply to Telegram immediately; handlers run as background tasks
+        handle_in_background=True,
+    )
+    handler.register(app, path=path)
+    setup_application(app, dp, bot=bot)
+    return app
+
+
+async def run_webhook(dp: Dispatcher, bot: Bot, settings: Settings) -> None:
+    """Serve webhook updates until cancelled."""
+    if not settings.WEBHOOK_SECRET:
+        raise RuntimeError("WEBHOOK_SECRET is not set (required when BOT_MODE=webhook)")
+
+    if settings.WEBHOOK_SET_ON_STARTUP:
+        if not settings.WEBHOOK_BASE_URL:
+            raise RuntimeError("WEBHOOK_BASE_URL is not set (required to register the webhook)")
+        url = settings.WEBHOOK_BASE_URL.rstrip("/") + settings.WEBHOOK_PATH
+        await bot.set_webhook(
+            url=url,
+            secret_token=settings.WEBHOOK_SECRET,
+            # chat_member updates are only delivered when explicitly requested
+            allowed_updates=dp.resolve_used_update_types(),
+        )
+        logging.getLogger(__name__).info("Webhook registered: %s", url)
+
+    app = build_webhook_app(dp, bot, settings.WEBHOOK_PATH, settings.WEBHOOK_SECRET)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, host=settings.WEBHOOK_HOST, port=settings.WEBHOOK_PORT)
+    await site.start()
+    logging.getLogger(__name__).info(
+        "Listening for webhook updates on %s:%s%s", settings.WEBHOOK_HOST, settings.WEBHOOK_PORT, settings.WEBHOOK_PATH
+    )
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
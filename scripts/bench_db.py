@@ -0,0 +1,96 @@
+"""Micro-benchmark for the SQLite layer.
+
+Compares the old connection-per-call pattern with the shared WAL connection
+used by ``Database``. Runs the hot-path mix of a join request: mapping lookup,
+dedup read and dedup upsert.
+
+Usage: python -m scripts.bench_db [--ops 2000] [--concurrency 50]
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+import aiosqlite
+
+from app.services.db import Database
+
+
+class PerCallConnectionDatabase(Database):
+    """Baseline: open a fresh aiosqlite connection for every call (pre-WAL behaviour)."""
+
+    async def get_sheet_name(self, channel_id):
+        async with aiosqlite.connect(self.db_path) as db:
+            async with db.execute("SELECT sheet_name FROM channels WHERE channel_id = ?", (channel_id,)) as cursor:
+                row = await cursor.fetchone()
+                return row[0] if row else None
+
+    async def get_last_join_request_logged_at(self, channel_id, user_id):
+        async with aiosqlite.connect(self.db_path) as db:
+            async with db.execute(
+                "SELECT last_logged_at FROM join_request_log WHERE channel_id = ? AND user_id = ?",
+                (channel_id, user_id),
+            ) as cursor:
+                row = await cursor.fetchone()
+                return int(row[0]) if row else None
+
+    async def upsert_join_request_logged_at(self, channel_id, user_id, ts_epoch):
+        async with aiosqlite.connect(self.db_path) as db:
+            await db.execute(
+                """
+                INSERT INTO join_request_log (channel_id, user_id, last_logged_at)
+                VALUES (?, ?, ?)
+                ON CONFLICT(channel_id, user_id) DO UPDATE SET last_logged_at = excluded.last_logged_at
+                """,
+                (channel_id, user_id, ts_epoch),
+            )
+            await db.commit()
+
+
+async def _run(db: Database, ops: int, concurrency: int) -> float:
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one(i: int) -> None:
+        async with sem:
+            channel_id = -100 - (i % 10)
+            await db.get_sheet_name(channel_id)
+            await db.get_last_join_request_logged_at(channel_id, i)
+            await db.upsert_join_request_logged_at(channel_id, i, 1_700_000_000 + i)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(ops)))
+    elapsed = time.perf_counter() - started
+    # three statements per logical op
+    return ops * 3 / elapsed
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--ops", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        results = {}
+        for label, cls in (("per-call connection", PerCallConnectionDatabase), ("shared WAL connection", Database)):
+            db = cls(os.path.join(tmp, f"{cls.__name__}.db"))
+            await db.init_db()
+            for ch in range(10):
+                await db.upsert_channel(-100 - ch, f"Sheet {ch}")
+            # The baseline must not see the shared connection's WAL settings
+            if cls is PerCallConnectionDatabase:
+                await db.close()
+                async with aiosqlite.connect(db.db_path) as raw:
+                    await raw.execute("PRAGMA journal_mode=DELETE")
+            results[label] = await _run(db, args.ops, args.concurrency)
+            await db.close()
+
+        for label, ops_per_sec in results.items():
+            print(f"{label:>24}: {ops_per_sec:10.0f} ops/sec")
+        base, new = results.values()
+        print(f"{'speedup':>24}: {new / base:10.1f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,295 @@
+"""End-to-end load benchmark: synthetic updates through the real routers.
+
+Generates ChatJoinRequest / ChatMemberUpdated streams across many channels,
+feeds them to a Dispatcher with the production routers via
+``Dispatcher.feed_update`` (concurrently, like polling does) and delivers the
+resulting outbox rows through the real batch writer to a fake Sheets backend
+with configurable latency and error rate.
+
+Reports ingestion throughput, p50/p95/p99 handler latency, time to drain the
+outbox, and SQLite / Sheets call counts. Results are printed as JSON and can be
+saved (``--output``) and compared with a previous run (``--compare``).
+
+Usage: python -m scripts.bench_load [--updates 5000] [--channels 50] [--output run.json]
+"""
+import argparse
+import asyncio
+import inspect
+import json
+import os
+import random
+import tempfile
+import time
+from collections import Counter
+from typing import Any
+
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+
+from app.handlers.chat_join_request import router as chat_join_request_router
+from app.handlers.chat_member import router as chat_member_router
+from app.handlers.my_chat_member import router as my_chat_member_router
+from app.services.container import ServiceContainer, set_container
+from app.services.db import Database
+from app.services.dedup import JoinRequestDedup
+from app.services.google_sheets import SheetsBatchWriter
+from app.services.outbox import OutboxDrainer
+
+
+class FakeSheetsBackend:
+    """Stands in for GoogleSheetsService: sleeps `latency` per call, fails with `error_rate`."""
+
+    def __init__(self, latency: float, error_rate: float, seed: int):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.calls: Counter = Counter()
+        self.rows_written = 0
+        self._rng = random.Random(seed)
+
+    async def _call(self, name: str) -> None:
+        self.calls[name] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self._rng.random() < self.error_rate:
+            self.calls[f"{name}_error"] += 1
+            raise ConnectionError("synthetic Sheets failure")
+
+    async def ensure_sheet(self, title: str) -> str:
+        await self._call("ensure_sheet")
+        return title
+
+    async def append_row(self, title: str, row: list[Any]) -> None:
+        await self._call("append_row")
+        self.rows_written += 1
+
+    async def append_rows(self, title: str, rows: list[list[Any]], verify: bool = False) -> None:
+        await self._call("append_rows")
+        self.rows_written += len(rows)
+
+    async def health_check(self) -> None:
+        await self._call("health_check")
+
+
+def count_database_calls(db: Database, counter: Counter) -> None:
+    """Wrap public coroutine methods of `db` to count calls per method."""
+    for name, method in inspect.getmembers(db, inspect.iscoroutinefunction):
+        if name.startswith("_") or name in ("close", "init_db"):
+            continue
+
+        def wrap(fn, method_name=name):
+            async def counted(*args, **kwargs):
+                counter[method_name] += 1
+                return await fn(*args, **kwargs)
+            return counted
+
+        setattr(db, name, wrap(method))
+
+
+def _user(user_id: int) -> dict:
+    return {"id": user_id, "is_bot": False, "first_name": f"User{user_id}", "username": f"user{user_id}"}
+
+
+def _invite(channel_id: int, n: int, creates_join_request: bool) -> dict:
+    return {
+        "invite_link": f"https://t.me/+c{abs(channel_id)}l{n}",
+        "creator": {"id": 1, "is_bot": True, "first_name": "Bot"},
+        "creates_join_request": creates_join_request,
+        "is_primary": False,
+        "is_revoked": False,
+        "name": f"Link {n}",
+    }
+
+
+def generate_updates(count: int, channels: int, join_request_ratio: float, seed: int) -> list[Update]:
+    """Mix of join requests, their approvals and direct invite-link joins."""
+    rng = random.Random(seed)
+    channel_ids = [-1000000000000 - i for i in range(channels)]
+    updates: list[Update] = []
+    pending_requests: list[tuple[int, int, int]] = []
+    update_id = 1
+    next_user = 10_000
+    while len(updates) < count:
+        channel_id = rng.choice(channel_ids)
+        chat = {"id": channel_id, "type": "channel", "title": f"Channel {abs(channel_id)}"}
+        link_n = rng.randrange(5)
+        roll = rng.random()
+        if pending_requests and roll < join_request_ratio / 2:
+            # Approval of an earlier request
+            ch, uid, n = pending_requests.pop(rng.randrange(len(pending_requests)))
+            payload = {
+                "chat_member": {
+                    "chat": {"id": ch, "type": "channel", "title": f"Channel {abs(ch)}"},
+                    "from": _user(1),
+                    "date": 1700000000,
+                    "old_chat_member": {"status": "left", "user": _user(uid)},
+                    "new_chat_member": {"status": "member", "user": _user(uid)},
+                    "invite_link": _invite(ch, n, True),
+                    "via_join_request": True,
+                }
+            }
+        elif roll < join_request_ratio:
+            uid = next_user
+            next_user += 1
+            pending_requests.append((channel_id, uid, link_n))
+            payload = {
+                "chat_join_request": {
+                    "chat": chat,
+                    "from": _user(uid),
+                    "user_chat_id": uid,
+                    "date": 1700000000,
+                    "invite_link": _invite(channel_id, link_n, True),
+                }
+            }
+        else:
+            uid = next_user
+            next_user += 1
+            payload = {
+                "chat_member": {
+                    "chat": chat,
+                    "from": _user(uid),
+                    "date": 1700000000,
+                    "old_chat_member": {"status": "left", "user": _user(uid)},
+                    "new_chat_member": {"status": "member", "user": _user(uid)},
+                    "invite_link": _invite(channel_id, link_n, False),
+                }
+            }
+        updates.append(Update.model_validate({"update_id": update_id, **payload}))
+        update_id += 1
+    return updates
+
+
+def percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[idx]
+
+
+async def run(args: argparse.Namespace) -> dict:
+    updates = generate_updates(args.updates, args.channels, args.join_request_ratio, args.seed)
+    sheets = FakeSheetsBackend(args.sheets_latency, args.sheets_error_rate, args.seed)
+    db_calls: Counter = Counter()
+    sql_statements = 0
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(os.path.join(tmp, "bench.db"))
+        await db.init_db()
+
+        def on_statement(_sql: str) -> None:
+            nonlocal sql_statements
+            sql_statements += 1
+
+        await (await db._connection()).set_trace_callback(on_statement)
+        # The harness polls the backlog itself; keep that out of the call counts
+        outbox_size = db.count_outbox
+        count_database_calls(db, db_calls)
+
+        writer = SheetsBatchWriter(sheets, max_batch_size=args.batch_rows, max_latency=args.batch_latency)
+        dedup = JoinRequestDedup(db)
+        await dedup.warm_up()
+        dedup.start(flush_interval=1.0, prune_interval=3600.0)
+        drainer = OutboxDrainer(db, writer, poll_interval=0.05, retry_base=0.1, retry_max=1.0)
+        set_container(ServiceContainer(db=db, gsheets=sheets, writer=writer, dedup=dedup))  # type: ignore[arg-type]
+
+        dp = Dispatcher()
+        dp.include_router(my_chat_member_router)
+        dp.include_router(chat_member_router)
+        dp.include_router(chat_join_request_router)
+        bot = Bot(token="123456:BENCHMARK")
+
+        latencies: list[float] = []
+        errors = 0
+        sem = asyncio.Semaphore(args.concurrency)
+
+        async def feed(update: Update) -> None:
+            nonlocal errors
+            async with sem:
+                started = time.perf_counter()
+                try:
+                    await dp.feed_update(bot, update)
+                except Exception:
+                    errors += 1
+                latencies.append(time.perf_counter() - started)
+
+        drainer.start()
+        started = time.perf_counter()
+        await asyncio.gather(*(feed(u) for u in updates))
+        ingest_seconds = time.perf_counter() - started
+
+        queued = await outbox_size()
+        while await outbox_size():
+            await asyncio.sleep(0.05)
+        drain_seconds = time.perf_counter() - started
+        await drainer.stop()
+        await writer.close()
+        await dedup.stop()
+        await bot.session.close()
+        await db.close()
+
+    return {
+        "config": vars(args) | {"output": None, "compare": None},
+        "updates": len(updates),
+        "handler_errors": errors,
+        "ingest_seconds": round(ingest_seconds, 3),
+        "throughput_updates_per_sec": round(len(updates) / ingest_seconds, 1),
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50) * 1000, 3),
+            "p95": round(percentile(latencies, 95) * 1000, 3),
+            "p99": round(percentile(latencies, 99) * 1000, 3),
+            "max": round(max(latencies, default=0.0) * 1000, 3),
+        },
+        "outbox_backlog_after_ingest": queued,
+        "end_to_end_seconds": round(drain_seconds, 3),
+        "rows_written": sheets.rows_written,
+        "sqlite_calls": dict(sorted(db_calls.items())),
+        "sqlite_statements": sql_statements,
+        "sheets_calls": dict(sorted(sheets.calls.items())),
+        "writer_flushes": writer.flush_count,
+    }
+
+
+def compare(current: dict, previous: dict) -> dict:
+    """Relative change of the headline numbers versus a previous run."""
+    def delta(a: float, b: float) -> str:
+        return f"{(a - b) / b * 100:+.1f}%" if b else "n/a"
+
+    return {
+        "throughput_updates_per_sec": delta(current["throughput_updates_per_sec"], previous["throughput_updates_per_sec"]),
+        **{
+            f"latency_{k}": delta(current["latency_ms"][k], previous["latency_ms"][k])
+            for k in ("p50", "p95", "p99")
+        },
+        "sqlite_statements": delta(current["sqlite_statements"], previous["sqlite_statements"]),
+        "end_to_end_seconds": delta(current["end_to_end_seconds"], previous["end_to_end_seconds"]),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--updates", type=int, default=5000)
+    parser.add_argument("--channels", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=200, help="updates processed at once")
+    parser.add_argument("--join-request-ratio", type=float, default=0.5)
+    parser.add_argument("--sheets-latency", type=float, default=0.05, help="seconds per fake Sheets call")
+    parser.add_argument("--sheets-error-rate", type=float, default=0.0)
+    parser.add_argument("--batch-rows", type=int, default=100)
+    parser.add_argument("--batch-latency", type=float, default=0.2)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="write results JSON to this path")
+    parser.add_argument("--compare", help="previous results JSON to compare against")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            results["compared_to"] = {"path": args.compare, **compare(results, json.load(f))}
+    text = json.dumps(results, indent=2, ensure_ascii=False)
+    print(text)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
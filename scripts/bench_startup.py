@@ -0,0 +1,154 @@
+"""Startup benchmark: how long a (re)started bot is deaf to updates.
+
+Starts ``python -m app.main`` in webhook mode (no setWebhook call) against a
+fresh SQLite file with one known channel, then POSTs a recorded join request
+until the bot answers. Reports per run:
+
+- ``import_seconds``: ``import app.main`` in a fresh interpreter, and which
+  heavy optional modules it pulled in (they should be none);
+- ``accepted_seconds``: process start -> first update accepted (HTTP 200);
+- ``handled_seconds``: process start -> that update recorded in ``join_events``.
+
+Sheets credentials are a placeholder, so the Sheets warm-up fails in the
+background; the point is that it must not delay the first update.
+
+Usage: python -m scripts.bench_startup [--runs 5] [--output startup.json]
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from aiohttp import ClientError, ClientSession
+
+from app.services.db import Database
+
+
+SECRET = "bench-secret"
+CHANNEL_ID = -1009000
+UPDATE_ID = 777001
+HEAVY_MODULES = ("gspread", "gspread_asyncio", "google.auth", "google.oauth2", "sentry_sdk")
+
+JOIN_REQUEST_UPDATE = {
+    "update_id": UPDATE_ID,
+    "chat_join_request": {
+        "chat": {"id": CHANNEL_ID, "type": "channel", "title": "Bench Channel"},
+        "from": {"id": 42, "is_bot": False, "first_name": "Bench", "username": "bench"},
+        "user_chat_id": 42,
+        "date": 1700000000,
+    },
+}
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def measure_import() -> dict:
+    code = (
+        "import sys, time; t = time.perf_counter(); import app.main; "
+        "print(time.perf_counter() - t); "
+        f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    )
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout.split("\n")
+    return {"import_seconds": round(float(out[0]), 3), "heavy_modules_imported": [m for m in out[1].split(",") if m]}
+
+
+async def _seed_db(path: str) -> None:
+    db = Database(path)
+    await db.init_db()
+    # A known channel resolves its worksheet from the local DB, without Sheets
+    await db.upsert_channel(CHANNEL_ID, "Bench Channel")
+    await db.close()
+
+
+def _handled(path: str) -> bool:
+    try:
+        with sqlite3.connect(path, timeout=0.1) as conn:
+            row = conn.execute("SELECT 1 FROM join_events WHERE update_id = ?", (UPDATE_ID,)).fetchone()
+        return row is not None
+    except sqlite3.Error:
+        return False
+
+
+async def measure_startup(timeout: float) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        await _seed_db(db_path)
+        port = _free_port()
+        env = dict(
+            os.environ,
+            BOT_TOKEN="123456:BENCH-token",
+            BOT_MODE="webhook",
+            WEBHOOK_SET_ON_STARTUP="false",
+            WEBHOOK_SECRET=SECRET,
+            WEBHOOK_HOST="127.0.0.1",
+            WEBHOOK_PORT=str(port),
+            DB_PATH=db_path,
+            GOOGLE_SERVICE_ACCOUNT_JSON='{"type": "service_account"}',
+            GOOGLE_SPREADSHEET_ID="bench",
+            METRICS_ENABLED="false",
+            LOG_LEVEL="WARNING",
+        )
+        url = f"http://127.0.0.1:{port}/telegram/webhook"
+        started = time.perf_counter()
+        proc = subprocess.Popen(
+            [sys.executable, "-m", "app.main"], env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        result: dict = {}
+        try:
+            async with ClientSession() as session:
+                while "accepted_seconds" not in result:
+                    if time.perf_counter() - started > timeout or proc.poll() is not None:
+                        raise RuntimeError("bot did not accept an update (exited or timed out)")
+                    try:
+                        async with session.post(
+                            url, json=JOIN_REQUEST_UPDATE, headers={"X-Telegram-Bot-Api-Secret-Token": SECRET}
+                        ) as resp:
+                            if resp.status == 200:
+                                result["accepted_seconds"] = round(time.perf_counter() - started, 3)
+                    except ClientError:
+                        await asyncio.sleep(0.01)
+            while not _handled(db_path):
+                if time.perf_counter() - started > timeout:
+                    raise RuntimeError("update was accepted but not handled in time")
+                await asyncio.sleep(0.01)
+            result["handled_seconds"] = round(time.perf_counter() - started, 3)
+        finally:
+            proc.terminate()
+            proc.wait(timeout=10)
+        return result
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--output", help="save the result as JSON")
+    args = parser.parse_args()
+
+    imports = measure_import()
+    runs = [await measure_startup(args.timeout) for _ in range(args.runs)]
+    summary = {
+        **imports,
+        "runs": runs,
+        "accepted_seconds_median": statistics.median(r["accepted_seconds"] for r in runs),
+        "handled_seconds_median": statistics.median(r["handled_seconds"] for r in runs),
+    }
+    print(json.dumps(summary, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
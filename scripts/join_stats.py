@@ -0,0 +1,89 @@
+"""Print join request / join counters from the local aggregates.
+
+Reads the incrementally maintained ``join_stats`` tables, so answers come
+back immediately regardless of how many events the ledger holds. Dates are
+interpreted in ``TIMEZONE`` (the same zone the day buckets use).
+
+Usage:
+    python -m scripts.join_stats --channel -1001234567890 --since 2025-07-01 --until 2025-07-08
+    python -m scripts.join_stats --channel -1001234567890 --links            # per-link totals
+    python -m scripts.join_stats --channel -1001234567890 --link https://t.me/+abc --granularity hour
+    python -m scripts.join_stats --rebuild                                   # recompute from join_events
+"""
+import argparse
+import asyncio
+import json
+from dataclasses import asdict
+from datetime import datetime
+from typing import Optional
+from zoneinfo import ZoneInfo
+
+from app.config import get_settings
+from app.services.db import ALL_LINKS, GRANULARITY_DAY, GRANULARITY_HOUR, Database
+
+
+def _epoch(day: Optional[str], tz: ZoneInfo) -> Optional[int]:
+    if not day:
+        return None
+    return int(datetime.strptime(day, "%Y-%m-%d").replace(tzinfo=tz).timestamp())
+
+
+def _format_bucket(ts: int, granularity: str, tz: ZoneInfo) -> str:
+    fmt = "%Y-%m-%d %H:00" if granularity == GRANULARITY_HOUR else "%Y-%m-%d"
+    return datetime.fromtimestamp(ts, tz).strftime(fmt)
+
+
+async def run(args: argparse.Namespace) -> None:
+    settings = get_settings()
+    tz = ZoneInfo(settings.TIMEZONE)
+    db = Database(
+        args.db or settings.DB_PATH,
+        stats_timezone=settings.TIMEZONE,
+        stats_users_retention_days=settings.JOIN_STATS_USERS_RETENTION_DAYS,
+    )
+    await db.init_db()
+    try:
+        if args.rebuild:
+            print(f"Rebuilt aggregates from {await db.rebuild_join_stats()} ledger events")
+            if args.channel is None:
+                return
+        if args.channel is None:
+            raise SystemExit("--channel is required")
+
+        since, until = _epoch(args.since, tz), _epoch(args.until, tz)
+        if args.links:
+            stats = await db.get_link_stats(args.channel, since=since, until=until, granularity=args.granularity)
+            label = lambda s: "(all links)" if s.invite_link == ALL_LINKS else (s.invite_link or "(no link)")  # noqa: E731
+        else:
+            stats = await db.get_join_stats(
+                args.channel, invite_link=args.link or ALL_LINKS, granularity=args.granularity,
+                since=since, until=until,
+            )
+            label = lambda s: _format_bucket(s.bucket_start, s.granularity, tz)  # noqa: E731
+
+        if args.json:
+            print(json.dumps([asdict(s) for s in stats], indent=2, ensure_ascii=False))
+            return
+        print(f"{'':<40} {'requests':>9} {'joins':>9} {'users':>9}")
+        for s in stats:
+            print(f"{label(s):<40} {s.requests:>9} {s.joins:>9} {s.distinct_users:>9}")
+    finally:
+        await db.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db", help="SQLite path (default: DB_PATH)")
+    parser.add_argument("--channel", type=int, help="channel id")
+    parser.add_argument("--link", help="one invite link instead of the channel total")
+    parser.add_argument("--links", action="store_true", help="totals per invite link over the range")
+    parser.add_argument("--granularity", choices=(GRANULARITY_DAY, GRANULARITY_HOUR), default=GRANULARITY_DAY)
+    parser.add_argument("--since", help="first day, YYYY-MM-DD (inclusive)")
+    parser.add_argument("--until", help="last day, YYYY-MM-DD (exclusive)")
+    parser.add_argument("--rebuild", action="store_true", help="recompute aggregates from the ledger first")
+    parser.add_argument("--json", action="store_true", help="print JSON instead of a table")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+"""POST a recorded Telegram update (JSON file) to a locally running webhook.
+
+Usage:
+    python -m scripts.post_update update.json [--url http://127.0.0.1:8080/telegram/webhook] [--secret ...]
+
+The secret defaults to WEBHOOK_SECRET from settings (.env).
+"""
+import argparse
+import asyncio
+import json
+
+from aiohttp import ClientSession
+
+from app.config import get_settings
+
+
+async def main() -> None:
+    settings = get_settings()
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("path", help="JSON file with one update object or a list of updates")
+    parser.add_argument("--url", default=f"http://127.0.0.1:{settings.WEBHOOK_PORT}{settings.WEBHOOK_PATH}")
+    parser.add_argument("--secret", default=settings.WEBHOOK_SECRET or "")
+    args = parser.parse_args()
+
+    with open(args.path, encoding="utf-8") as f:
+        payload = json.load(f)
+    updates = payload if isinstance(payload, list) else [payload]
+
+    async with ClientSession() as session:
+        for update in updates:
+            async with session.post(
+                args.url,
+                json=update,
+                headers={"X-Telegram-Bot-Api-Secret-Token": args.secret},
+            ) as resp:
+                print(update.get("update_id"), resp.status, await resp.text())
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -7,6 +7,7 @@ async def main():
     await db.upsert_channel(987654321, 'Smoke Sheet')
     name = await db.get_sheet_name(987654321)
     print('DB_SMOKE_RESULT:', name)
+    await db.close()
 
 if __name__ == '__main__':
     asyncio.run(main())
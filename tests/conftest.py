@@ -9,7 +9,7 @@ from app.services.db import Database
 
 @pytest_asyncio.fixture()
 async def temp_db_path() -> AsyncGenerator[str, None]:
-    # Use a real temp file on disk so aiosqlite can reopen connections
+    # Use a real temp file on disk (WAL mode needs a file-backed database)
     with tempfile.TemporaryDirectory() as tmp:
         path = os.path.join(tmp, "test.db")
         yield path
@@ -20,3 +20,4 @@ async def db(temp_db_path: str) -> AsyncGenerator[Database, None]:
     database = Database(temp_db_path)
     await database.init_db()
     yield database
+    await database.close()
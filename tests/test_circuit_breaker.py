@@ -0,0 +1,138 @@
+import asyncio
+
+import pytest
+from aiohttp import ClientError
+
+from app.metrics import CIRCUIT_STATE
+from app.services.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError
+from app.services.google_sheets import GoogleSheetsService, HEADERS, is_outage_error
+from app.services.outbox import OutboxDrainer
+from app.services.sheets_rest import SheetsApiError
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_breaker_opens_probes_once_and_recovers():
+    clock = Clock()
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_timeout=30, clock=clock)
+
+    for _ in range(2):
+        probe = breaker.acquire()
+        breaker.release(probe, ClientError("down"))
+    assert breaker.state == OPEN and CIRCUIT_STATE.value(circuit="test") == 2
+    with pytest.raises(CircuitOpenError):
+        breaker.acquire()
+    assert not breaker.allows_request()
+
+    clock.now += 30
+    assert breaker.allows_request()
+    assert breaker.acquire() is True  # the probe
+    assert breaker.state == HALF_OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.acquire()  # only one probe at a time
+
+    # A failed probe re-opens for another full timeout
+    breaker.release(True, ClientError("still down"))
+    assert breaker.state == OPEN and breaker.retry_in() == 30
+
+    clock.now += 30
+    breaker.release(breaker.acquire())
+    assert breaker.state == CLOSED and CIRCUIT_STATE.value(circuit="test") == 0
+
+
+def test_breaker_ignores_client_errors_and_cancelled_probes():
+    clock = Clock()
+    breaker = CircuitBreaker("test-classify", failure_threshold=1, clock=clock, is_failure=is_outage_error)
+    breaker.release(breaker.acquire(), SheetsApiError(400, "already exists"))
+    assert breaker.state == CLOSED
+
+    breaker.release(breaker.acquire(), SheetsApiError(503, "unavailable"))
+    assert breaker.state == OPEN
+    clock.now += 60
+    breaker.release(breaker.acquire(), asyncio.CancelledError())
+    assert breaker.state == HALF_OPEN and breaker.allows_request()
+
+
+class DownWorksheet:
+    title = "S"
+
+    def __init__(self):
+        self.calls = 0
+        self.rows = []
+        self.down = True
+
+    async def row_values(self, row):
+        return []
+
+    async def append_rows(self, rows, value_input_option=None):
+        self.calls += 1
+        if self.down:
+            raise ClientError("connection reset")
+        self.rows.extend(rows)
+
+
+class OneSheet:
+    def __init__(self, ws):
+        self.ws = ws
+
+    async def worksheets(self):
+        return [self.ws]
+
+
+class Manager:
+    def __init__(self, spreadsheet):
+        self.spreadsheet = spreadsheet
+
+    async def authorize(self):
+        return self
+
+    async def open_by_key(self, key):
+        return self.spreadsheet
+
+
+@pytest.mark.asyncio
+async def test_service_fails_fast_while_open(monkeypatch):
+    clock = Clock()
+    ws = DownWorksheet()
+    breaker = CircuitBreaker("sheets-test", failure_threshold=1, reset_timeout=30, clock=clock, is_failure=is_outage_error)
+    svc = GoogleSheetsService(credentials="/dev/null", spreadsheet_id="dummy", breaker=breaker)
+    monkeypatch.setattr(svc, "_manager", Manager(OneSheet(ws)))
+
+    # The first failure opens the circuit; the backoff retry then fails fast
+    with pytest.raises(CircuitOpenError):
+        await svc.append_rows("S", [["a"]])
+    assert ws.calls == 1
+
+    with pytest.raises(CircuitOpenError):
+        await svc.append_rows("S", [["b"]])
+    assert ws.calls == 1
+
+    ws.down = False
+    clock.now += 30
+    await svc.append_rows("S", [["c"]])
+    assert ws.rows == [["c"]] and breaker.state == CLOSED
+
+
+@pytest.mark.asyncio
+async def test_drainer_leaves_rows_queued_while_open(db):
+    class Writer:
+        submitted = []
+
+        def submit(self, *args, **kwargs):
+            self.submitted.append(args)
+            raise AssertionError("must not be called while open")
+
+    clock = Clock()
+    breaker = CircuitBreaker("sheets-drain", failure_threshold=1, clock=clock)
+    breaker.release(breaker.acquire(), ClientError("down"))
+
+    await db.enqueue_outbox("S", HEADERS)
+    drainer = OutboxDrainer(db, Writer(), breakers={0: breaker})
+    assert await drainer.drain_once() == 0
+    assert await db.count_outbox() == 1 and Writer.submitted == []
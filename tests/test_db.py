@@ -1,3 +1,4 @@
+import asyncio
 import tempfile
 import os
 import pytest
@@ -22,3 +23,263 @@ async def test_db_upsert_and_get():
         # Update
         await db.upsert_channel(12345, "Sheet B")
         assert await db.get_sheet_name(12345) == "Sheet B"
+        await db.close()
+
+
+@pytest.mark.asyncio
+async def test_outbox_roundtrip_and_reschedule():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "test.db")
+        db = Database(path)
+        await db.init_db()
+
+        first = await db.enqueue_outbox("Sheet A", ["ts", "1", "Имя"])
+        second = await db.enqueue_outbox("Sheet B", ["ts", "2", ""])
+
+        # Survives reopening the database (process restart)
+        await db.close()
+        db = Database(path)
+        await db.init_db()
+        due = await db.fetch_due_outbox(now_epoch=100)
+        assert [i.id for i in due] == [first, second]
+        assert due[0].row == ["ts", "1", "Имя"]
+
+        await db.reschedule_outbox([second], next_attempt_at=200, error="quota")
+        await db.delete_outbox([first])
+        assert await db.fetch_due_outbox(now_epoch=100) == []
+        retried = await db.fetch_due_outbox(now_epoch=200)
+        assert [(i.id, i.attempts) for i in retried] == [(second, 1)]
+        assert await db.count_outbox() == 1
+        await db.close()
+
+
+@pytest.mark.asyncio
+async def test_channel_mapping_served_from_warm_cache(monkeypatch):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "test.db")
+        db = Database(path)
+        await db.init_db()
+        await db.upsert_channel(1, "One")
+        await db.close()
+
+        db = Database(path)
+        await db.init_db()
+        assert db.channel_cache_size == 1
+
+        async def no_sqlite():
+            raise AssertionError("hot path must not touch SQLite")
+
+        real_connection = db._connection
+        monkeypatch.setattr(db, "_connection", no_sqlite)
+        assert await db.get_sheet_name(1) == "One"
+        assert await db.get_sheet_name(2) is None
+
+        monkeypatch.setattr(db, "_connection", real_connection)
+        await db.upsert_channel(2, "Two")
+        monkeypatch.setattr(db, "_connection", no_sqlite)
+        assert await db.get_sheet_name(2) == "Two"
+
+        monkeypatch.setattr(db, "_connection", real_connection)
+        await db.close()
+
+
+@pytest.mark.asyncio
+async def test_join_event_ledger_records_and_queries(db):
+    from app.services.db import EVENT_JOIN, EVENT_JOIN_REQUEST, JoinEvent
+
+    events = [
+        JoinEvent(channel_id=-1, user_id=10, event_type=EVENT_JOIN_REQUEST, occurred_at=100, invite_link="L1", update_id=1),
+        JoinEvent(channel_id=-1, user_id=11, event_type=EVENT_JOIN, occurred_at=200, invite_link="L2", update_id=2),
+        JoinEvent(channel_id=-2, user_id=10, event_type=EVENT_JOIN, occurred_at=300, invite_link="L1", update_id=3),
+    ]
+    for e in events:
+        await db.record_join_event(e, "Sheet", ["row", e.user_id])
+
+    # Each event queued its projection row in the same transaction
+    due = await db.fetch_due_outbox(now_epoch=2**31)
+    assert [i.row for i in due] == [["row", 10], ["row", 11], ["row", 10]]
+
+    assert [e.update_id for e in await db.query_join_events(channel_id=-1)] == [1, 2]
+    assert [e.update_id for e in await db.query_join_events(user_id=10)] == [1, 3]
+    assert [e.update_id for e in await db.query_join_events(invite_link="L1", since=150)] == [3]
+    assert [e.update_id for e in await db.query_join_events(since=100, until=300)] == [1, 2]
+    assert await db.count_join_events(event_type=EVENT_JOIN) == 2
+
+    conn = await db._connection()
+    async with conn.execute(
+        "EXPLAIN QUERY PLAN SELECT id FROM join_events WHERE channel_id = ? AND occurred_at >= ?", (-1, 0)
+    ) as cursor:
+        plan = " ".join(str(r[-1]) for r in await cursor.fetchall())
+    assert "idx_join_events_channel_time" in plan
+
+
+@pytest.mark.asyncio
+async def test_join_stats_are_maintained_incrementally(db):
+    from app.services.db import ALL_LINKS, EVENT_JOIN, EVENT_JOIN_REQUEST, GRANULARITY_HOUR, JoinEvent
+
+    day = 1_700_006_400  # 2023-11-15 00:00 UTC
+    for user_id, event_type, link, offset in (
+        (1, EVENT_JOIN_REQUEST, "A", 10),
+        (1, EVENT_JOIN, "A", 20),
+        (2, EVENT_JOIN_REQUEST, "A", 3700),
+        (3, EVENT_JOIN, "B", 3800),
+        (1, EVENT_JOIN_REQUEST, "A", 86400 + 5),
+    ):
+        await db.record_join_event(JoinEvent(channel_id=-1, user_id=user_id, event_type=event_type,
+                                             occurred_at=day + offset, invite_link=link))
+
+    days = await db.get_join_stats(-1)
+    assert [(s.bucket_start, s.requests, s.joins, s.distinct_users) for s in days] == [
+        (day, 2, 2, 3),
+        (day + 86400, 1, 0, 1),
+    ]
+    hours = await db.get_join_stats(-1, invite_link="A", granularity=GRANULARITY_HOUR, until=day + 86400)
+    assert [(s.requests, s.joins, s.distinct_users) for s in hours] == [(1, 1, 1), (1, 0, 1)]
+
+    links = await db.get_link_stats(-1, since=day, until=day + 2 * 86400)
+    assert [(s.invite_link, s.requests, s.joins, s.distinct_users) for s in links] == [
+        (ALL_LINKS, 3, 2, 3),
+        ("A", 3, 1, 2),
+        ("B", 0, 1, 1),
+    ]
+
+    # Recomputing from the ledger reproduces the incremental counters
+    assert await db.rebuild_join_stats() == 5
+    assert await db.get_join_stats(-1) == days
+
+
+@pytest.mark.asyncio
+async def test_join_stats_user_sets_are_pruned(db):
+    from app.services.db import ALL_LINKS, EVENT_JOIN, JoinEvent
+
+    day = 1_700_006_400  # 2023-11-15 00:00 UTC
+    for user_id, offset in ((1, 10), (2, 20), (1, 86400 + 5)):
+        await db.record_join_event(JoinEvent(channel_id=-1, user_id=user_id, event_type=EVENT_JOIN,
+                                             occurred_at=day + offset, invite_link="A"))
+
+    # Two users in the first hour/day, one in the next, each under link A and '*'
+    assert await db.prune_join_stats_users(now_epoch=day + 86400 + 3600) == 0
+    assert await db.prune_join_stats_users(now_epoch=day + 30 * 86400) == 12
+    conn = await db._connection()
+    async with conn.execute("SELECT COUNT(*) FROM join_stats_users") as cursor:
+        assert (await cursor.fetchone())[0] == 0
+
+    # Bucket counters stay; range totals still count each user once
+    assert [s.distinct_users for s in await db.get_join_stats(-1)] == [2, 1]
+    links = await db.get_link_stats(-1, since=day, until=day + 2 * 86400)
+    assert [(s.invite_link, s.joins, s.distinct_users) for s in links] == [(ALL_LINKS, 3, 2), ("A", 3, 2)]
+    # A range starting mid-day covers whole buckets only
+    [total, _] = await db.get_link_stats(-1, since=day + 3600)
+    assert (total.joins, total.distinct_users) == (1, 1)
+
+
+@pytest.mark.asyncio
+async def test_replayed_update_is_recorded_once(db):
+    from app.services.db import EVENT_JOIN, JoinEvent
+
+    for _ in range(2):
+        event = JoinEvent(channel_id=-1, user_id=5, event_type=EVENT_JOIN, occurred_at=100, update_id=77)
+        await db.record_join_event(event, "S", ["row", event.event_key])
+    assert event.event_key == "77"
+    assert await db.count_join_events() == 1
+    assert [i.event_key for i in await db.fetch_due_outbox(now_epoch=2**31)] == ["77"]
+
+
+@pytest.mark.asyncio
+async def test_sheet_rows_before_only_counts_rows_written_earlier(db):
+    from app.services.db import EVENT_JOIN, JoinEvent
+
+    for user_id in (1, 2, 3):
+        event = JoinEvent(channel_id=-1, user_id=user_id, event_type=EVENT_JOIN, occurred_at=100)
+        await db.record_join_event(event, "S", ["row", event.event_key])
+    [a, b, c] = await db.fetch_due_outbox(now_epoch=2**31)
+    await db.complete_outbox([a, b], delivered_at=1000, row_numbers={a.id: 2, b.id: 3})
+    await db.complete_outbox([c], delivered_at=2000, row_numbers={c.id: 4})
+
+    assert await db.sheet_rows_before(0, "S", 1500) == 3
+    assert await db.sheet_rows_before(0, "S", 2001) == 4
+    # Rows recorded in the same second may have been appended after it
+    assert await db.sheet_rows_before(0, "S", 1000) == 0
+    assert await db.sheet_rows_before(0, "Other", 2001) == 0
+
+
+@pytest.mark.asyncio
+async def test_coalesce_without_held_back_row_skips_the_write_transaction(db, monkeypatch):
+    from app.services.db import EVENT_JOIN_REQUEST, JoinEvent
+
+    request = JoinEvent(channel_id=-1, user_id=5, event_type=EVENT_JOIN_REQUEST, occurred_at=100)
+    await db.record_join_event(request, "S", ["row", "5"], deliver_after=2**31 - 1)
+    transactions = []
+    real_transaction = db._transaction
+
+    def counting_transaction():
+        transactions.append(1)
+        return real_transaction()
+
+    monkeypatch.setattr(db, "_transaction", counting_transaction)
+    # A plain join of another user only reads
+    assert not await db.coalesce_outbox_row(-1, 6, EVENT_JOIN_REQUEST, {2: "approved"}, now_epoch=200)
+    assert transactions == []
+
+    assert await db.coalesce_outbox_row(-1, 5, EVENT_JOIN_REQUEST, {2: "approved"}, now_epoch=200)
+    assert transactions == [1]
+    [item] = await db.fetch_due_outbox(now_epoch=200)
+    assert item.row == ["row", "5", "approved"]
+
+
+@pytest.mark.asyncio
+async def test_shared_connection_uses_wal(db):
+    conn = await db._connection()
+    async with conn.execute("PRAGMA journal_mode") as cursor:
+        assert (await cursor.fetchone())[0] == "wal"
+    # Every call reuses the one connection
+    assert await db._connection() is conn
+
+
+@pytest.mark.asyncio
+async def test_failed_transaction_rolls_back_and_keeps_connection(db):
+    with pytest.raises(RuntimeError, match="boom"):
+        async with db._transaction() as conn:
+            await conn.execute("INSERT INTO sheets_outbox (sheet_name, row_json) VALUES ('S', '[]')")
+            raise RuntimeError("boom")
+    assert await db.count_outbox() == 0
+
+    # The shared connection and the write lock are usable afterwards
+    await db.enqueue_outbox("Sheet A", ["ts", "1"])
+    assert await db.count_outbox() == 1
+
+
+@pytest.mark.asyncio
+async def test_read_during_transaction_does_not_see_rolled_back_rows(db):
+    inserted = asyncio.Event()
+
+    async def failing_write():
+        async with db._transaction() as conn:
+            await conn.execute("INSERT INTO sheets_outbox (sheet_name, row_json) VALUES ('S', '[]')")
+            inserted.set()
+            await asyncio.sleep(0.05)
+            raise RuntimeError("boom")
+
+    write = asyncio.create_task(failing_write())
+    await inserted.wait()
+    # Issued while the row is uncommitted: waits for the transaction to end
+    assert await db.fetch_due_outbox(now_epoch=2**31) == []
+    assert await db.count_outbox() == 0
+    with pytest.raises(RuntimeError, match="boom"):
+        await write
+
+
+@pytest.mark.asyncio
+async def test_close_is_idempotent_and_reopens_on_next_use(temp_db_path):
+    db = Database(temp_db_path)
+    await db.init_db()
+    await db.enqueue_outbox("Sheet A", ["ts", "1"])
+    first = await db._connection()
+
+    await db.close()
+    await db.close()
+
+    # The next call opens a fresh connection to the same file
+    assert await db.count_outbox() == 1
+    assert await db._connection() is not first
+    await db.close()
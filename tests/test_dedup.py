@@ -0,0 +1,46 @@
+import pytest
+
+from app.services.dedup import JoinRequestDedup
+
+
+@pytest.mark.asyncio
+async def test_memory_tier_answers_and_flushes_in_batch(db, monkeypatch):
+    dedup = JoinRequestDedup(db, window_seconds=100)
+    await dedup.warm_up(now_epoch=1000)
+
+    async def no_read(*_args):
+        raise AssertionError("warm dedup must not read join_request_log")
+
+    monkeypatch.setattr(db, "get_last_join_request_logged_at", no_read)
+
+    assert await dedup.recently_logged(1, 10, now_epoch=1000) is None
+    dedup.mark(1, 10, 1000)
+    dedup.mark(1, 11, 1001)
+    dedup.mark(1, 10, 1002)  # coalesced with the first mark
+    assert await dedup.recently_logged(1, 10, now_epoch=1050) == 1002
+    assert await dedup.recently_logged(1, 10, now_epoch=1102) is None
+
+    assert await dedup.flush() == 2
+    assert dedup.pending == 0
+    assert await db.load_join_requests_since(0) == [(1, 11, 1001), (1, 10, 1002)]
+
+
+@pytest.mark.asyncio
+async def test_warm_up_and_retention(db):
+    await db.upsert_join_requests_logged_at([(1, 1, 100), (1, 2, 950), (2, 1, 990)])
+
+    dedup = JoinRequestDedup(db, window_seconds=100)
+    assert await dedup.warm_up(now_epoch=1000) == 2
+    assert await dedup.recently_logged(1, 2, now_epoch=1000) == 950
+
+    # Window moves on: (1, 2) and the stale (1, 1) row are dropped from both tiers
+    assert await dedup.prune(now_epoch=1060) == 2
+    assert dedup.size == 1
+    assert await db.load_join_requests_since(0) == [(2, 1, 990)]
+
+
+@pytest.mark.asyncio
+async def test_cold_miss_falls_back_to_table(db):
+    await db.upsert_join_request_logged_at(5, 6, 500)
+    dedup = JoinRequestDedup(db, window_seconds=100)
+    assert await dedup.recently_logged(5, 6, now_epoch=550) == 500
@@ -0,0 +1,124 @@
+import asyncio
+import random
+
+import pytest
+from aiogram import Bot, Dispatcher, Router
+from aiogram.types import ChatJoinRequest, Update
+
+from app import metrics
+from app.dispatch import ChannelExecutorMiddleware
+
+
+def join_request_update(update_id: int, channel_id: int) -> Update:
+    return Update.model_validate({
+        "update_id": update_id,
+        "chat_join_request": {
+            "chat": {"id": channel_id, "type": "channel", "title": f"Channel {channel_id}"},
+            "from": {"id": update_id, "is_bot": False, "first_name": "User"},
+            "user_chat_id": update_id,
+            "date": 1700000000,
+        },
+    })
+
+
+def make_dispatcher(executor: ChannelExecutorMiddleware, handler) -> Dispatcher:
+    router = Router()
+    router.chat_join_request()(handler)
+    dp = Dispatcher()
+    dp.update.outer_middleware(executor)
+    dp.include_router(router)
+    return dp
+
+
+async def wait_for(predicate, timeout: float = 2.0) -> None:
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not predicate():
+        assert asyncio.get_running_loop().time() < deadline, "condition not reached"
+        await asyncio.sleep(0.005)
+
+
+@pytest.mark.asyncio
+async def test_channel_order_is_kept_under_global_limit():
+    executor = ChannelExecutorMiddleware(max_concurrency=2, overflow="shed")
+    handled: dict[int, list[int]] = {}
+    running = 0
+    peak = 0
+
+    async def handle(request: ChatJoinRequest):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(random.uniform(0, 0.01))
+        handled.setdefault(request.chat.id, []).append(request.from_user.id)
+        running -= 1
+
+    dp = make_dispatcher(executor, handle)
+    bot = Bot(token="123456:TEST-token")
+    updates = [join_request_update(i, -100 - i % 3) for i in range(1, 31)]
+    await asyncio.gather(*(dp.feed_update(bot, u) for u in updates))
+
+    assert peak == 2
+    for channel_id, user_ids in handled.items():
+        assert user_ids == sorted(user_ids)
+    assert sum(len(v) for v in handled.values()) == 30
+    assert executor.waiting == 0 and executor.max_channel_depth() == 0
+
+
+@pytest.mark.asyncio
+async def test_full_channel_queue_sheds_updates():
+    executor = ChannelExecutorMiddleware(channel_queue=1, overflow="shed")
+    release = asyncio.Event()
+    handled = []
+
+    async def handle(request: ChatJoinRequest):
+        await release.wait()
+        handled.append(request.from_user.id)
+
+    dp = make_dispatcher(executor, handle)
+    bot = Bot(token="123456:TEST-token")
+    shed_before = metrics.UPDATES_SHED.value(reason="channel_queue_full")
+    tasks = [asyncio.create_task(dp.feed_update(bot, join_request_update(i, -100))) for i in range(1, 5)]
+    # The first runs, the second waits, the rest are dropped right away
+    await asyncio.gather(*tasks[2:])
+    assert executor.waiting == 1 and executor.in_flight == 1
+    # Another channel is not affected
+    other = asyncio.create_task(dp.feed_update(bot, join_request_update(9, -200)))
+    await wait_for(lambda: executor.in_flight == 2)
+    release.set()
+    await asyncio.gather(*tasks, other)
+
+    assert sorted(handled) == [1, 2, 9]
+    assert metrics.UPDATES_SHED.value(reason="channel_queue_full") - shed_before == 2
+
+
+@pytest.mark.asyncio
+async def test_spilled_updates_are_replayed_in_channel_order(db):
+    executor = ChannelExecutorMiddleware(db, channel_queue=1, overflow="spill", replay_interval=60)
+    release = asyncio.Event()
+    handled = []
+
+    async def handle(request: ChatJoinRequest):
+        await release.wait()
+        handled.append(request.from_user.id)
+
+    dp = make_dispatcher(executor, handle)
+    bot = Bot(token="123456:TEST-token")
+    await executor.start(bot, dp)
+    try:
+        tasks = [asyncio.create_task(dp.feed_update(bot, join_request_update(i, -100))) for i in range(1, 6)]
+        await asyncio.gather(*tasks[2:])
+        assert executor.spilled == 3
+        assert await db.count_spilled_updates_by_channel() == {-100: 3}
+
+        # While the channel has spilled updates, new ones queue behind them on disk
+        await dp.feed_update(bot, join_request_update(6, -100))
+        assert executor.spilled == 4
+
+        # Draining the queue wakes the replay task
+        release.set()
+        await asyncio.gather(*tasks)
+        await wait_for(lambda: executor.spilled == 0)
+        assert handled == [1, 2, 3, 4, 5, 6]
+        assert await db.fetch_spilled_updates() == []
+    finally:
+        await executor.stop()
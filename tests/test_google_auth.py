@@ -0,0 +1,99 @@
+import asyncio
+import subprocess
+import sys
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.metrics import SHEETS_TOKEN_REFRESH_FAILURES, SHEETS_TOKEN_REFRESH_SECONDS
+from app.services import google_sheets
+from app.services.google_auth import TokenRefresher, load_service_account_credentials
+from app.services.google_sheets import GoogleSheetsService
+
+
+def _utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class FakeCredentials:
+    def __init__(self, lifetime=3600, fail=0):
+        self.token = None
+        self.expiry = None
+        self.lifetime = lifetime
+        self.fail = fail
+        self.refreshes = 0
+
+    def refresh(self, request):
+        if self.fail:
+            self.fail -= 1
+            raise RuntimeError("token endpoint unavailable")
+        self.refreshes += 1
+        self.token = f"token-{self.refreshes}"
+        self.expiry = _utcnow() + timedelta(seconds=self.lifetime)
+
+
+def _refresher(creds, **kwargs):
+    return TokenRefresher(lambda: creds, request_factory=lambda: None, **kwargs)
+
+
+@pytest.mark.asyncio
+async def test_refresh_schedule_follows_expiry():
+    creds = FakeCredentials()
+    refresher = _refresher(creds, lead=600)
+    # No token yet: refresh right away
+    assert refresher.seconds_until_refresh() == 0
+
+    before = SHEETS_TOKEN_REFRESH_SECONDS.count(status="ok")
+    await refresher.refresh_once()
+    assert creds.token == "token-1"
+    assert SHEETS_TOKEN_REFRESH_SECONDS.count(status="ok") == before + 1
+    assert 2990 < refresher.seconds_until_refresh() <= 3000
+
+    creds.expiry = _utcnow() + timedelta(seconds=300)  # inside the lead window
+    assert refresher.seconds_until_refresh() == 0
+
+
+@pytest.mark.asyncio
+async def test_background_refresh_retries_failures():
+    creds = FakeCredentials(lifetime=3600, fail=2)
+    refresher = _refresher(creds, lead=600, retry_base=0.01, retry_max=0.02)
+    failures = SHEETS_TOKEN_REFRESH_FAILURES.value()
+
+    refresher.start()
+    for _ in range(100):
+        if creds.token:
+            break
+        await asyncio.sleep(0.01)
+    await refresher.stop()
+
+    assert creds.token == "token-1" and creds.refreshes == 1
+    assert SHEETS_TOKEN_REFRESH_FAILURES.value() == failures + 2
+
+
+def test_credentials_parsed_once(monkeypatch):
+    calls = []
+    creds = FakeCredentials()
+    monkeypatch.setattr(
+        google_sheets, "load_service_account_credentials", lambda source: calls.append(source) or creds
+    )
+    svc = GoogleSheetsService(credentials="{}", spreadsheet_id="dummy")
+    assert calls == []
+    # The client manager re-requests credentials on every reauth
+    manager = svc._get_manager()
+    assert manager.credentials_fn() is creds
+    assert manager.credentials_fn() is creds
+    assert calls == ["{}"]
+
+
+def test_invalid_credentials_source():
+    with pytest.raises(RuntimeError, match="GOOGLE_SERVICE_ACCOUNT_JSON"):
+        load_service_account_credentials("not a path, json or base64!")
+
+
+def test_app_import_defers_sheets_clients():
+    code = (
+        "import sys, app.main; "
+        "print(sorted(m for m in ('gspread', 'gspread_asyncio', 'google.oauth2', 'sentry_sdk') if m in sys.modules))"
+    )
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert out.stdout.strip() == "[]"
@@ -3,7 +3,7 @@ from types import SimpleNamespace
 
 import pytest
 
-from app.services.google_sheets import GoogleSheetsService, HEADERS
+from app.services.google_sheets import GoogleSheetsService, HEADERS, SheetsBatchWriter
 
 
 class FakeWorksheet:
@@ -14,10 +14,32 @@ class FakeWorksheet:
     async def append_row(self, row, value_input_option=None):
         self.rows.append(row)
 
+    async def append_rows(self, rows, value_input_option=None):
+        self.rows.extend(rows)
+
+    async def col_values(self, col):
+        return [r[col - 1] if len(r) >= col else "" for r in self.rows]
+
+    async def get(self, range_name, major_dimension=None):
+        # Only the column tails read by the idempotency check, e.g. "G5:G"
+        self.reads = getattr(self, "reads", []) + [range_name]
+        first_cell = range_name.split(":")[0]
+        col, first = ord(first_cell[0]) - ord("A"), int(first_cell[1:])
+        return [[r[col] if len(r) > col else "" for r in self.rows[first - 1:]]]
+
+    async def row_values(self, row):
+        return list(self.rows[row - 1]) if len(self.rows) >= row else []
+
 
 class FakeSpreadsheet:
     def __init__(self):
         self.sheets = {}
+        self.list_calls = 0
+        self.value_updates = []
+
+    async def worksheets(self):
+        self.list_calls += 1
+        return list(self.sheets.values())
 
     async def worksheet(self, title):
         if title not in self.sheets:
@@ -25,11 +47,15 @@ class FakeSpreadsheet:
             raise WorksheetNotFound(title)
         return self.sheets[title]
 
+    async def values_batch_update(self, body):
+        self.value_updates.append(body)
+
     async def add_worksheet(self, title, rows, cols):
         if title in self.sheets:
             from gspread.exceptions import APIError
             raise APIError({"error": {"message": "already exists"}})
         ws = FakeWorksheet(title)
+        ws.size = (rows, cols)
         self.sheets[title] = ws
         return ws
 
@@ -37,8 +63,10 @@ class FakeSpreadsheet:
 class FakeClient:
     def __init__(self, spreadsheet: FakeSpreadsheet):
         self._spreadsheet = spreadsheet
+        self.open_calls = 0
 
     async def open_by_key(self, key):
+        self.open_calls += 1
         return self._spreadsheet
 
 
@@ -55,7 +83,7 @@ async def test_ensure_sheet_creates_with_headers(monkeypatch):
     spreadsheet = FakeSpreadsheet()
 
     # Build a GoogleSheetsService wired to our fake manager
-    svc = GoogleSheetsService(credentials_path="/dev/null", spreadsheet_id="dummy")
+    svc = GoogleSheetsService(credentials="/dev/null", spreadsheet_id="dummy")
     monkeypatch.setattr(svc, "_manager", FakeManager(FakeClient(spreadsheet)))
 
     final_title = await svc.ensure_sheet("My Channel")
@@ -63,6 +91,8 @@ async def test_ensure_sheet_creates_with_headers(monkeypatch):
     ws = await spreadsheet.worksheet(final_title)
     # Header should be the first append
     assert ws.rows[0] == HEADERS
+    # Grid sized to the header: exactly the needed columns, no spare rows
+    assert ws.size == (1, len(HEADERS))
 
 
 @pytest.mark.asyncio
@@ -71,7 +101,7 @@ async def test_ensure_sheet_collision_adds_suffix(monkeypatch):
     # Precreate a conflicting sheet
     spreadsheet.sheets["Channel"] = FakeWorksheet("Channel")
 
-    svc = GoogleSheetsService(credentials_path="/dev/null", spreadsheet_id="dummy")
+    svc = GoogleSheetsService(credentials="/dev/null", spreadsheet_id="dummy")
     monkeypatch.setattr(svc, "_manager", FakeManager(FakeClient(spreadsheet)))
 
     final_title = await svc.ensure_sheet("Channel")
@@ -83,7 +113,7 @@ async def test_ensure_sheet_collision_adds_suffix(monkeypatch):
 async def test_append_row_creates_sheet_if_missing(monkeypatch):
     spreadsheet = FakeSpreadsheet()
 
-    svc = GoogleSheetsService(credentials_path="/dev/null", spreadsheet_id="dummy")
+    svc = GoogleSheetsService(credentials="/dev/null", spreadsheet_id="dummy")
     monkeypatch.setattr(svc, "_manager", FakeManager(FakeClient(spreadsheet)))
 
     await svc.append_row("New One", ["a", "b"])  # should auto-create and append
@@ -91,3 +121,180 @@ async def test_append_row_creates_sheet_if_missing(monkeypatch):
     # First row is headers, second is our data
     assert ws.rows[0] == HEADERS
     assert ws.rows[1] == ["a", "b"]
+
+
+@pytest.mark.asyncio
+async def test_first_appends_create_the_named_sheet_once(monkeypatch):
+    spreadsheet = FakeSpreadsheet()
+    spreadsheet.sheets["Other"] = FakeWorksheet("Other")
+
+    svc = GoogleSheetsService(credentials="/dev/null", spreadsheet_id="dummy")
+    monkeypatch.setattr(svc, "_manager", FakeManager(FakeClient(spreadsheet)))
+
+    # Concurrent flushes to a partition chosen locally by the handlers
+    await asyncio.gather(*(svc.append_rows("Chan 2025-Q3", [[str(i)]]) for i in range(3)))
+    assert sorted(spreadsheet.sheets) == ["Chan 2025-Q3", "Other"]
+    ws = spreadsheet.sheets["Chan 2025-Q3"]
+    assert ws.rows[0] == HEADERS and sorted(ws.rows[1:]) == [["0"], ["1"], ["2"]]
+
+
+@pytest.mark.asyncio
+async def test_metadata_cached_across_appends(monkeypatch):
+    spreadsheet = FakeSpreadsheet()
+    spreadsheet.sheets["Known"] = FakeWorksheet("Known")
+    client = FakeClient(spreadsheet)
+
+    svc = GoogleSheetsService(credentials="/dev/null", spreadsheet_id="dummy")
+    monkeypatch.setattr(svc, "_manager", FakeManager(client))
+
+    for i in range(5):
+        await svc.append_row("Known", [str(i)])
+    assert client.open_calls == 1
+    assert spreadsheet.list_calls == 1
+
+    # A sheet created outside the service is picked up by refresh-on-miss
+    spreadsheet.sheets["External"] = FakeWorksheet("External")
+    await svc.append_row("External", ["x"])
+    assert spreadsheet.list_calls == 2
+    assert spreadsheet.sheets["External"].rows == [["x"]]
+
+    # ensure_sheet resolves collisions from the same cached listing
+    assert await svc.ensure_sheet("Known") == "Known 2"
+    assert spreadsheet.list_calls == 2
+
+
+@pytest.mark.asyncio
+async def test_metadata_ttl_expiry_relists(monkeypatch):
+    spreadsheet = FakeSpreadsheet()
+    spreadsheet.sheets["S"] = FakeWorksheet("S")
+
+    svc = GoogleSheetsService(credentials="/dev/null", spreadsheet_id="dummy", metadata_ttl=0)
+    monkeypatch.setattr(svc, "_manager", FakeManager(FakeClient(spreadsheet)))
+
+    await svc.append_row("S", ["1"])
+    await svc.append_row("S", ["2"])
+    assert spreadsheet.list_calls == 2
+
+
+@pytest.mark.asyncio
+async def test_old_header_row_gets_new_columns_once(monkeypatch):
+    spreadsheet = FakeSpreadsheet()
+    spreadsheet.sheets["Old"] = ws = FakeWorksheet("Old")
+    ws.rows.append(HEADERS[:6])
+    spreadsheet.sheets["Current"] = current = FakeWorksheet("Current")
+    current.rows.append(list(HEADERS))
+
+    svc = GoogleSheetsService(credentials="/dev/null", spreadsheet_id="dummy")
+    monkeypatch.setattr(svc, "_manager", FakeManager(FakeClient(spreadsheet)))
+
+    await svc.append_rows("Old", [["a"]])
+    await svc.append_rows("Old", [["b"]])
+    await svc.append_row("Current", ["c"])
+
+    # One write labelling G1:K1 of the old sheet; the current one is left alone
+    assert spreadsheet.value_updates == [{
+        "valueInputOption": "USER_ENTERED",
+        "data": [{"range": "'Old'!G1:K1", "values": [HEADERS[6:]]}],
+    }]
+    assert ws.rows[1:] == [["a"], ["b"]]
+
+
+class RecordingSheets:
+    def __init__(self):
+        self.calls = []
+
+    async def append_rows(self, title, rows, verify=False, known_rows=0):
+        self.calls.append((title, list(rows)))
+
+
+@pytest.mark.asyncio
+async def test_append_rows_single_call(monkeypatch):
+    spreadsheet = FakeSpreadsheet()
+
+    svc = GoogleSheetsService(credentials="/dev/null", spreadsheet_id="dummy")
+    monkeypatch.setattr(svc, "_manager", FakeManager(FakeClient(spreadsheet)))
+
+    await svc.append_rows("Batch", [["a"], ["b"], ["c"]])
+    ws = await spreadsheet.worksheet("Batch")
+    assert ws.rows == [HEADERS, ["a"], ["b"], ["c"]]
+
+
+@pytest.mark.asyncio
+async def test_batch_writer_flushes_on_size():
+    sheets = RecordingSheets()
+    flushes = []
+    writer = SheetsBatchWriter(sheets, max_batch_size=3, max_latency=60, on_flush=flushes.append)
+
+    await asyncio.gather(*(writer.append_row("S", [str(i)]) for i in range(3)))
+
+    assert sheets.calls == [("S", [["0"], ["1"], ["2"]])]
+    assert flushes[0].size == 3 and flushes[0].error is None
+    assert writer.pending == 0
+
+
+@pytest.mark.asyncio
+async def test_batch_writer_flushes_on_deadline_per_sheet():
+    sheets = RecordingSheets()
+    writer = SheetsBatchWriter(sheets, max_batch_size=100, max_latency=0.01)
+
+    await asyncio.gather(
+        writer.append_row("A", ["1"]),
+        writer.append_row("B", ["2"]),
+        writer.append_row("A", ["3"]),
+    )
+
+    assert sorted(sheets.calls) == [("A", [["1"], ["3"]]), ("B", [["2"]])]
+
+
+@pytest.mark.asyncio
+async def test_batch_writer_close_flushes_and_propagates_errors():
+    class FailingSheets:
+        async def append_rows(self, title, rows, verify=False, known_rows=0):
+            raise RuntimeError("boom")
+
+    sheets = RecordingSheets()
+    writer = SheetsBatchWriter(sheets, max_batch_size=100, max_latency=60)
+    fut = writer.submit("S", ["x"])
+    await writer.close()
+    assert fut.done() and sheets.calls == [("S", [["x"]])]
+    with pytest.raises(RuntimeError):
+        writer.submit("S", ["y"])
+
+    failing = SheetsBatchWriter(FailingSheets(), max_batch_size=1, max_latency=60)
+    with pytest.raises(RuntimeError, match="boom"):
+        await failing.append_row("S", ["z"])
+    assert failing.last_flush.error is not None
+
+
+@pytest.mark.asyncio
+async def test_retry_after_applied_append_does_not_duplicate(monkeypatch):
+    from aiohttp import ClientError
+
+    class TimeoutAfterWrite(FakeWorksheet):
+        failed = False
+
+        async def append_rows(self, rows, value_input_option=None):
+            await super().append_rows(rows, value_input_option)
+            if not self.failed:
+                self.failed = True
+                raise ClientError("read timeout")  # applied by Google, reply lost
+
+    spreadsheet = FakeSpreadsheet()
+    spreadsheet.sheets["S"] = ws = TimeoutAfterWrite("S")
+    ws.rows.append(HEADERS)
+    svc = GoogleSheetsService(credentials="/dev/null", spreadsheet_id="dummy")
+    monkeypatch.setattr(svc, "_manager", FakeManager(FakeClient(spreadsheet)))
+
+    row = lambda key: ["ts", "1", "A", "", "", "", key]  # noqa: E731
+    await svc.append_rows("S", [row("101"), row("102")])
+    assert ws.rows == [HEADERS, row("101"), row("102")]
+
+    # An explicitly verified append (outbox replay) skips keys already in the sheet
+    await svc.append_rows("S", [row("102"), row("103")], verify=True)
+    assert [r[-1] for r in ws.rows[1:]] == ["101", "102", "103"]
+
+    # Rows known to be older than the verified ones are not downloaded
+    ws.reads = []
+    assert await svc.append_rows("S", [row("103"), row("104")], verify=True, known_rows=3) == {"103": 4}
+    assert ws.reads == ["G4:G"]
+    assert [r[-1] for r in ws.rows[1:]] == ["101", "102", "103", "104"]
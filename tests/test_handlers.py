@@ -1,11 +1,27 @@
+import asyncio
 import os
 import tempfile
+from types import SimpleNamespace
+
 import pytest
 
+from app.config import get_settings
+from app.handlers.chat_join_request import on_chat_join_request
 from app.handlers.chat_member import on_chat_member
 from app.handlers.my_chat_member import on_my_chat_member
+from app.services.circuit_breaker import CircuitOpenError
 from app.services.container import set_container, ServiceContainer
 from app.services.db import Database
+from app.services.google_sheets import (
+    APPROVED_AT_INDEX,
+    LEFT_AT_INDEX,
+    OUTCOME_INDEX,
+    STATUS_INDEX,
+    SheetsBatchWriter,
+    row_event_key,
+)
+from app.services.outbox import OutboxDrainer
+from app.utils import join_cache
 
 
 class DummyUser:
@@ -54,6 +70,10 @@ class FakeSheets:
     async def append_row(self, title: str, row):
         self.appends.append((title, row))
 
+    async def append_rows(self, title: str, rows, verify=False, known_rows=0):
+        for row in rows:
+            self.appends.append((title, row))
+
 
 @pytest.mark.asyncio
 async def test_my_chat_member_initializes_mapping():
@@ -71,7 +91,9 @@ async def test_my_chat_member_initializes_mapping():
         await on_my_chat_member(update)
 
         assert await db.get_sheet_name(777) == "My Channel"
-        assert sheets.ensure_calls == ["My Channel"]
+        # The worksheet itself is created with the channel's first row
+        assert sheets.ensure_calls == []
+        await db.close()
 
 
 @pytest.mark.asyncio
@@ -89,7 +111,17 @@ async def test_chat_member_appends_row():
         await db.upsert_channel(555, "Ch 555")
         set_container(ServiceContainer(db=db, gsheets=sheets))
 
-        await on_chat_member(update)
+        await on_chat_member(update, event_update=SimpleNamespace(update_id=9001))
+
+        # Handler only records the event and queues the row; nothing hits Sheets inline
+        assert sheets.appends == []
+        assert await db.count_outbox() == 1
+        [event] = await db.query_join_events(channel_id=555)
+        assert (event.user_id, event.event_type, event.invite_link, event.update_id) == (42, "join", "https://t.me/+xyz", 9001)
+
+        drainer = OutboxDrainer(db, SheetsBatchWriter(sheets, max_latency=0))
+        assert await drainer.drain_once() == 1
+        assert await db.count_outbox() == 0
 
         assert len(sheets.appends) == 1
         sheet, row = sheets.appends[0]
@@ -99,3 +131,192 @@ async def test_chat_member_appends_row():
         assert row[3] == "@alice"
         assert row[4] == "https://t.me/+xyz"
         assert row[5] == "Promo"
+        await db.close()
+
+
+@pytest.mark.asyncio
+async def test_queued_row_wakes_the_drainer():
+    update = DummyUpdate()
+    update.chat = DummyChat(chat_id=558, type_="channel", title="Ch 558")
+    update.new_chat_member = DummyMember(status="member", user=DummyUser(45, "Dan", "dan"))
+    update.invite_link = DummyInvite()
+
+    sheets = FakeSheets()
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(os.path.join(tmp, "t.db"))
+        await db.init_db()
+        await db.upsert_channel(558, "Ch 558")
+        # Polling alone would not deliver the row within this test
+        drainer = OutboxDrainer(db, SheetsBatchWriter(sheets, max_latency=0), poll_interval=60)
+        set_container(ServiceContainer(db=db, gsheets=sheets, drainer=drainer))
+        drainer.start()
+        try:
+            # Let the first (empty) cycle finish and start waiting
+            await asyncio.sleep(0.05)
+            await on_chat_member(update, event_update=SimpleNamespace(update_id=9004))
+            for _ in range(200):
+                if sheets.appends:
+                    break
+                await asyncio.sleep(0.01)
+            assert [row[1] for _, row in sheets.appends] == ["45"]
+        finally:
+            await drainer.stop()
+            await db.close()
+
+
+@pytest.mark.asyncio
+async def test_new_channels_are_recorded_without_sheets():
+    class DownSheets(FakeSheets):
+        async def ensure_sheet(self, title: str):
+            raise CircuitOpenError("sheets", 30)
+
+    def make_update(chat_id, user_id):
+        update = DummyUpdate()
+        update.chat = DummyChat(chat_id=chat_id, type_="channel", title="Hot Channel")
+        update.new_chat_member = DummyMember(status="member", user=DummyUser(user_id))
+        update.invite_link = DummyInvite()
+        return update
+
+    sheets = DownSheets()
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(os.path.join(tmp, "t.db"))
+        await db.init_db()
+        set_container(ServiceContainer(db=db, gsheets=sheets))
+
+        # Sheets being down does not lose the first events of new channels
+        await asyncio.gather(*(on_chat_member(make_update(chat_id, uid)) for uid in range(10) for chat_id in (998, 999)))
+
+        # Same title, one worksheet per channel, picked once per channel
+        assert {await db.get_sheet_name(998), await db.get_sheet_name(999)} == {"Hot Channel", "Hot Channel 2"}
+        due = await db.fetch_due_outbox(now_epoch=2**31)
+        assert len(due) == 20 and {i.sheet_name for i in due} == {"Hot Channel", "Hot Channel 2"}
+        assert await db.count_join_events() == 20
+        await db.close()
+
+
+@pytest.mark.asyncio
+async def test_approval_is_recorded_in_ledger_without_sheet_row():
+    update = DummyUpdate()
+    update.chat = DummyChat(chat_id=556, type_="channel", title="Ch 556")
+    update.new_chat_member = DummyMember(status="member", user=DummyUser(43))
+    update.via_join_request = True
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(os.path.join(tmp, "t.db"))
+        await db.init_db()
+        set_container(ServiceContainer(db=db, gsheets=FakeSheets()))
+        join_cache.remember(556, 43, "https://t.me/+req", "Request link")
+
+        await on_chat_member(update)
+
+        assert await db.count_outbox() == 0
+        [event] = await db.query_join_events(channel_id=556)
+        assert (event.event_type, event.invite_link) == ("join", "https://t.me/+req")
+        [stats] = await db.get_join_stats(556, invite_link="https://t.me/+req")
+        assert stats.joins == 1
+        await db.close()
+
+
+@pytest.mark.asyncio
+async def test_approval_within_window_completes_held_back_request_row(monkeypatch):
+    monkeypatch.setenv("JOIN_REQUEST_COALESCE_SECONDS", "60")
+    get_settings.cache_clear()
+
+    def request(user_id):
+        return SimpleNamespace(
+            chat=DummyChat(chat_id=557, title="Ch 557"),
+            from_user=DummyUser(user_id),
+            invite_link=DummyInvite("https://t.me/+req", "Request link"),
+        )
+
+    def approval(user_id):
+        update = DummyUpdate()
+        update.chat = DummyChat(chat_id=557, title="Ch 557")
+        update.new_chat_member = DummyMember(status="member", user=DummyUser(user_id))
+        return update
+
+    sheets = FakeSheets()
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            db = Database(os.path.join(tmp, "t.db"))
+            await db.init_db()
+            set_container(ServiceContainer(db=db, gsheets=sheets))
+            drainer = OutboxDrainer(db, SheetsBatchWriter(sheets, max_latency=0))
+
+            await on_chat_join_request(request(44), event_update=SimpleNamespace(update_id=9101))
+            await on_chat_join_request(request(45), event_update=SimpleNamespace(update_id=9102))
+            # Both rows are held back for the window
+            assert await db.count_outbox() == 2
+            assert await drainer.drain_once() == 0
+
+            # Neither the flag nor the cache is needed to recognize the approval
+            join_cache.pop(557, 44)
+            await on_chat_member(approval(44), event_update=SimpleNamespace(update_id=9103))
+            assert await drainer.drain_once() == 1
+            [(_, row)] = sheets.appends
+            assert (row[1], row[6], row[OUTCOME_INDEX]) == ("44", "9101", "approved")
+            assert row[APPROVED_AT_INDEX]
+            assert [e.event_type for e in await db.query_join_events(user_id=44)] == ["join_request", "join"]
+
+            # Without an approval the row is finalized as pending after the window
+            [held] = await db.fetch_due_outbox(now_epoch=2**31)
+            assert held.row[1] == "45" and held.row[OUTCOME_INDEX] == "pending"
+            await db.close()
+    finally:
+        get_settings.cache_clear()
+
+
+@pytest.mark.asyncio
+async def test_leave_edits_the_members_row_in_place():
+    class LocatingSheets(FakeSheets):
+        def __init__(self):
+            super().__init__()
+            self.cell_updates = []
+
+        async def append_rows(self, title: str, rows, verify=False, known_rows=0):
+            start = len(self.appends) + 2  # row 1 is the header
+            await super().append_rows(title, rows, verify)
+            return {row_event_key(r): start + i for i, r in enumerate(rows)}
+
+        async def update_cells(self, cells, row_keys=None):
+            self.cell_updates.append(cells)
+            return set()
+
+    def member_update(user_id, status):
+        update = DummyUpdate()
+        update.chat = DummyChat(chat_id=558, title="Ch 558")
+        update.new_chat_member = DummyMember(status=status, user=DummyUser(user_id))
+        update.invite_link = DummyInvite() if status == "member" else None
+        return update
+
+    sheets = LocatingSheets()
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(os.path.join(tmp, "t.db"))
+        await db.init_db()
+        set_container(ServiceContainer(db=db, gsheets=sheets))
+        drainer = OutboxDrainer(db, SheetsBatchWriter(sheets, max_latency=0))
+
+        await on_chat_member(member_update(46, "member"), event_update=SimpleNamespace(update_id=9201))
+        await on_chat_member(member_update(47, "member"), event_update=SimpleNamespace(update_id=9202))
+        # Leaving before the row is written: the edit waits for the row's location
+        await on_chat_member(member_update(47, "left"))
+        assert await drainer.apply_row_updates() == 0
+
+        assert await drainer.drain_once() == 2
+        assert await db.get_sheet_row("9201") == (0, "Ch 558", 2)
+        assert await db.get_sheet_row("9202") == (0, "Ch 558", 3)
+
+        await on_chat_member(member_update(46, "kicked"))
+        # A member without a logged row has nothing to edit
+        await on_chat_member(member_update(48, "left"))
+        assert await drainer.apply_row_updates() == 1
+        [due] = await db.fetch_due_row_updates(now_epoch=2**31)
+        assert due.row_number == 3
+        await db.reschedule_row_updates([due.id], 0)
+        assert await drainer.apply_row_updates() == 1
+
+        edits = [(row, col, value) for batch in sheets.cell_updates for _title, row, col, value in batch]
+        assert (2, STATUS_INDEX, "kicked") in edits and (3, STATUS_INDEX, "left") in edits
+        assert {col for _row, col, _value in edits} == {LEFT_AT_INDEX, STATUS_INDEX}
+        assert await db.fetch_due_row_updates(now_epoch=2**31) == []
+        await db.close()
@@ -0,0 +1,54 @@
+import pytest
+
+from app.utils import join_cache
+
+
+@pytest.fixture(autouse=True)
+def _clean_cache():
+    join_cache.clear()
+    yield
+    join_cache.clear()
+
+
+def test_remember_and_pop_roundtrip():
+    join_cache.remember(1, 2, "https://t.me/+a", "A")
+    assert join_cache.pop(1, 2) == ("https://t.me/+a", "A")
+    assert join_cache.pop(1, 2) is None
+
+
+def test_expired_entries_pruned_from_front(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(join_cache.time, "time", lambda: now[0])
+
+    join_cache.remember(1, 1, "u1", "n1", ttl_seconds=10)
+    join_cache.remember(1, 2, "u2", "n2", ttl_seconds=10)
+    now[0] += 5
+    join_cache.remember(1, 3, "u3", "n3", ttl_seconds=10)
+
+    now[0] += 6  # first two expired, third still live
+    assert join_cache.pop(1, 1) is None
+    assert join_cache.stats()["expired"] == 2
+    assert join_cache.size() == 1
+    assert join_cache.pop(1, 3) == ("u3", "n3")
+
+
+def test_re_remember_refreshes_position(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(join_cache.time, "time", lambda: now[0])
+
+    join_cache.remember(1, 1, "old", "", ttl_seconds=10)
+    join_cache.remember(1, 2, "x", "", ttl_seconds=10)
+    now[0] += 8
+    join_cache.remember(1, 1, "new", "", ttl_seconds=10)
+    now[0] += 5  # (1, 2) expired, refreshed (1, 1) is not
+    assert join_cache.pop(1, 1) == ("new", "")
+
+
+def test_size_cap_evicts_oldest(monkeypatch):
+    monkeypatch.setattr(join_cache, "MAX_ENTRIES", 3)
+    for uid in range(5):
+        join_cache.remember(1, uid, f"u{uid}", "")
+    assert join_cache.size() == 3
+    assert join_cache.stats()["evicted"] == 2
+    assert join_cache.pop(1, 0) is None
+    assert join_cache.pop(1, 4) == ("u4", "")
@@ -0,0 +1,67 @@
+import json
+import logging
+
+import pytest
+
+from app import logging_config
+from app.logging_config import JsonFormatter, OperationRateLimitFilter, setup_logging
+
+
+def _record(msg, operation=None, level=logging.INFO, **extra):
+    record = logging.LogRecord("test", level, __file__, 1, msg, None, None)
+    if operation is not None:
+        record.operation = operation
+    for k, v in extra.items():
+        setattr(record, k, v)
+    return record
+
+
+def test_rate_limit_applies_per_operation_and_reports_suppressed(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(logging_config.time, "monotonic", lambda: now[0])
+    f = OperationRateLimitFilter(per_minute=2)
+
+    passed = [f.filter(_record("skip", "chat_member_skip")) for _ in range(5)]
+    assert passed == [True, True, False, False, False]
+    # Other operations and warnings are not limited
+    assert f.filter(_record("skip", "chat_member_skip_join_request"))
+    assert f.filter(_record("skip", "chat_member_skip", level=logging.WARNING))
+    assert all(f.filter(_record("join", "chat_member_join")) for _ in range(5))
+
+    now[0] += 61
+    record = _record("skip", "chat_member_skip")
+    assert f.filter(record)
+    assert "suppressed 3 similar" in record.msg
+
+
+def test_json_formatter_includes_context_fields():
+    line = JsonFormatter().format(_record("hello", "chat_member_join", channel_id=-100, user_id=42))
+    payload = json.loads(line)
+    assert payload["message"] == "hello"
+    assert payload["operation"] == "chat_member_join"
+    assert payload["channel_id"] == -100
+    assert payload["user_id"] == 42
+
+
+@pytest.fixture()
+def restore_root_logger():
+    root = logging.getLogger()
+    handlers, level = list(root.handlers), root.level
+    yield
+    logging_config._stop_listener()
+    root.handlers[:] = handlers
+    root.setLevel(level)
+
+
+def test_setup_logging_writes_through_background_listener(capsys, restore_root_logger):
+    setup_logging("INFO", fmt="json", skip_rate_per_minute=1)
+    row = ["a"]
+    log = logging.getLogger("app.test")
+    log.info("row %s", row, extra={"operation": "append"})
+    row.append("mutated later")
+    log.info("Skipping chat_member", extra={"operation": "chat_member_skip"})
+    log.info("Skipping chat_member", extra={"operation": "chat_member_skip"})
+    logging_config._stop_listener()  # flushes the queue
+
+    lines = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert [line["message"] for line in lines] == ["row ['a']", "Skipping chat_member"]
@@ -0,0 +1,125 @@
+import backoff
+import pytest
+from aiogram import Dispatcher, Router, Bot
+from aiogram.types import ChatJoinRequest, Update
+from aiohttp.test_utils import TestClient, TestServer
+
+from app import metrics
+from app.metrics import Counter, Gauge, Histogram, Registry, build_metrics_app
+
+
+def test_text_exposition_format():
+    registry = Registry()
+    requests = registry.register(Counter("requests_total", "Requests", ("path",)))
+    depth = registry.register(Gauge("depth", "Depth", callback=lambda: 3))
+    latency = registry.register(Histogram("latency_seconds", "Latency", ("op",), buckets=(0.1, 1.0)))
+
+    requests.inc(path='/a"b')
+    requests.inc(2, path='/a"b')
+    latency.observe(0.05, op="x")
+    latency.observe(0.5, op="x")
+    latency.observe(5, op="x")
+
+    text = registry.render()
+    assert "# TYPE requests_total counter" in text
+    assert 'requests_total{path="/a\\"b"} 3' in text
+    assert "depth 3" in text
+    assert 'latency_seconds_bucket{op="x",le="0.1"} 1' in text
+    assert 'latency_seconds_bucket{op="x",le="1"} 2' in text
+    assert 'latency_seconds_bucket{op="x",le="+Inf"} 3' in text
+    assert 'latency_seconds_count{op="x"} 3' in text
+    assert depth.samples() == ["depth 3"]
+
+
+@pytest.mark.asyncio
+async def test_metrics_endpoint_runs_collectors(db):
+    registry = Registry()
+    queue = registry.register(Gauge("queue", "Queue", ("name",)))
+
+    async def collect():
+        queue.set(await db.count_outbox(), name="outbox")
+
+    registry.add_collector(collect)
+    await db.enqueue_outbox("Sheet", ["a"])
+
+    async with TestClient(TestServer(build_metrics_app(registry))) as client:
+        resp = await client.get("/metrics")
+        assert resp.status == 200
+        assert 'queue{name="outbox"} 1' in await resp.text()
+
+
+@pytest.mark.asyncio
+async def test_database_and_handler_instrumentation(db):
+    before = metrics.DB_QUERY_SECONDS.count(method="enqueue_outbox")
+    await db.enqueue_outbox("Sheet", ["a"])
+    assert metrics.DB_QUERY_SECONDS.count(method="enqueue_outbox") == before + 1
+    # The decorator keeps the method's identity for introspection
+    assert type(db).enqueue_outbox.__wrapped__.__qualname__ == "Database.enqueue_outbox"
+    assert type(db).enqueue_outbox.__doc__ == type(db).enqueue_outbox.__wrapped__.__doc__
+
+    router = Router()
+
+    @router.chat_join_request()
+    async def handle(update: ChatJoinRequest):
+        raise ValueError("boom")
+
+    dp = Dispatcher()
+    dp.update.outer_middleware(metrics.HandlerMetricsMiddleware())
+    dp.include_router(router)
+    bot = Bot(token="123456:TEST-token")
+    update = Update.model_validate({
+        "update_id": 1,
+        "chat_join_request": {
+            "chat": {"id": -1001, "type": "channel", "title": "C"},
+            "from": {"id": 42, "is_bot": False, "first_name": "A"},
+            "user_chat_id": 42,
+            "date": 1700000000,
+        },
+    })
+    errors_before = metrics.HANDLER_SECONDS.count(handler="chat_join_request", status="error")
+    with pytest.raises(ValueError):
+        await dp.feed_update(bot, update)
+    await bot.session.close()
+    assert metrics.HANDLER_SECONDS.count(handler="chat_join_request", status="error") == errors_before + 1
+
+
+@pytest.mark.asyncio
+async def test_backoff_retries_and_giveups_are_counted():
+    calls = 0
+
+    @backoff.on_exception(
+        backoff.constant, ConnectionError, interval=0, max_tries=3,
+        on_backoff=metrics.on_backoff, on_giveup=metrics.on_giveup,
+    )
+    async def flaky_sheets_call():
+        nonlocal calls
+        calls += 1
+        raise ConnectionError
+
+    with pytest.raises(ConnectionError):
+        await flaky_sheets_call()
+    assert calls == 3
+    assert metrics.SHEETS_RETRIES.value(operation="flaky_sheets_call") == 2
+    assert metrics.SHEETS_GIVEUPS.value(operation="flaky_sheets_call") == 1
+
+
+@pytest.mark.asyncio
+async def test_cache_evictions_exported_as_counter(db, monkeypatch):
+    from app.utils import join_cache
+
+    registry = Registry()
+    metrics.register_service_metrics(db, registry=registry)
+    expired_before = metrics.CACHE_EVICTIONS.value(cache="join_cache", reason="expired")
+    stats = {"size": 0, "expired": 3, "evicted": 0, "max_entries": 10}
+    monkeypatch.setattr(join_cache, "stats", lambda: dict(stats))
+
+    await registry.collect()
+    await registry.collect()
+    stats["expired"] = 5
+    await registry.collect()
+    # Cleared cache: its totals restart, the counter keeps going up
+    stats["expired"] = 1
+    await registry.collect()
+
+    assert metrics.CACHE_EVICTIONS.value(cache="join_cache", reason="expired") - expired_before == 6
+    assert "# TYPE bot_cache_evictions_total counter" in metrics.REGISTRY.render()
@@ -0,0 +1,144 @@
+import pytest
+
+from app.services.google_sheets import SheetsBatchWriter
+from app.services.outbox import OutboxDrainer
+
+
+class FlakySheets:
+    def __init__(self, failures: int):
+        self.failures = failures
+        self.rows = []
+
+    async def append_rows(self, title, rows, verify=False, known_rows=0):
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("503 backend error")
+        self.rows.extend((title, r) for r in rows)
+
+
+@pytest.mark.asyncio
+async def test_drainer_keeps_rows_until_delivered(db):
+    await db.enqueue_outbox("S", ["a"])
+    await db.enqueue_outbox("S", ["b"])
+    sheets = FlakySheets(failures=1)
+    drainer = OutboxDrainer(db, SheetsBatchWriter(sheets, max_latency=0), retry_base=0)
+
+    # First attempt fails: rows stay queued with attempts recorded
+    assert await drainer.drain_once() == 0
+    assert await db.count_outbox() == 2
+
+    assert await drainer.drain_once() == 2
+    assert sheets.rows == [("S", ["a"]), ("S", ["b"])]
+    assert await db.count_outbox() == 0
+
+
+@pytest.mark.asyncio
+async def test_drainer_is_idempotent_per_event_key(db):
+    class VerifyingSheets(FlakySheets):
+        def __init__(self):
+            super().__init__(failures=0)
+            self.verify_flags = []
+
+        async def append_rows(self, title, rows, verify=False, known_rows=0):
+            self.verify_flags.append(verify)
+            await super().append_rows(title, rows)
+
+    # The same event queued twice (e.g. a replayed update) is written once
+    await db.enqueue_outbox("S", ["a"], event_key="1")
+    await db.enqueue_outbox("S", ["a"], event_key="1")
+    sheets = VerifyingSheets()
+    drainer = OutboxDrainer(db, SheetsBatchWriter(sheets, max_latency=0))
+    assert await drainer.drain_once() == 2
+    assert sheets.rows == [("S", ["a"])]
+    # First cycle after start re-checks the sheet for rows in flight before a restart
+    assert sheets.verify_flags == [True]
+    assert await db.delivered_keys(["1", "2"]) == {"1"}
+
+    # Already delivered keys are dropped without another write
+    await db.enqueue_outbox("S", ["a"], event_key="1")
+    await db.enqueue_outbox("S", ["b"], event_key="2")
+    assert await drainer.drain_once() == 2
+    assert sheets.rows == [("S", ["a"]), ("S", ["b"])]
+    assert sheets.verify_flags == [True, False]
+    assert await db.count_outbox() == 0
+
+    assert await db.prune_delivered(older_than_epoch=2**31) == 2
+
+
+@pytest.mark.asyncio
+async def test_rows_left_by_failed_bookkeeping_are_verified(db, monkeypatch):
+    class VerifyingSheets(FlakySheets):
+        def __init__(self):
+            super().__init__(failures=0)
+            self.verify_flags = []
+
+        async def append_rows(self, title, rows, verify=False, known_rows=0):
+            self.verify_flags.append(verify)
+            await super().append_rows(title, rows)
+
+    sheets = VerifyingSheets()
+    drainer = OutboxDrainer(db, SheetsBatchWriter(sheets, max_latency=0))
+    assert await drainer.drain_once() == 0  # leaves the start-up recovery cycle
+
+    await db.enqueue_outbox("S", ["a"], event_key="1")
+    real_complete = db.complete_outbox
+
+    async def busy(*args, **kwargs):
+        raise RuntimeError("database is locked")
+
+    monkeypatch.setattr(db, "complete_outbox", busy)
+    with pytest.raises(RuntimeError, match="locked"):
+        await drainer.drain_once()
+    assert await db.count_outbox() == 1
+
+    # The row was appended already: the retry must check the sheet first
+    monkeypatch.setattr(db, "complete_outbox", real_complete)
+    assert await drainer.drain_once() == 1
+    assert sheets.verify_flags == [False, True]
+    assert await db.count_outbox() == 0
+
+
+@pytest.mark.asyncio
+async def test_row_edits_follow_rows_moved_in_the_sheet(db):
+    from app.services.db import EVENT_JOIN, JoinEvent
+
+    class SortedSheets(FlakySheets):
+        """The sheet was sorted: key "2" now sits in row 5, key "3" was deleted."""
+
+        def __init__(self):
+            super().__init__(failures=0)
+            self.keys = {2: "x", 5: "2"}
+            self.edits = []
+
+        async def update_cells(self, cells, row_keys=None):
+            moved = {loc for loc, key in (row_keys or {}).items() if self.keys.get(loc[1]) != key}
+            self.edits += [(row, value) for _title, row, _col, value in cells if ("S", row) not in moved]
+            return moved
+
+        async def locate_rows(self, title, keys):
+            return {key: row for row, key in self.keys.items() if key in keys}
+
+    for user_id in (2, 3):
+        event = JoinEvent(channel_id=-1, user_id=user_id, event_type=EVENT_JOIN, occurred_at=100)
+        await db.record_join_event(event, "S", ["row", event.event_key])
+        await db.queue_row_update(-1, user_id, {1: "left"})
+    items = await db.fetch_due_outbox(now_epoch=2**31)
+    await db.complete_outbox(items, delivered_at=1000, row_numbers={items[0].id: 2, items[1].id: 3})
+    [key2, key3] = [i.event_key for i in items]
+    sheets = SortedSheets()
+    sheets.keys = {2: "x", 5: key2}
+    drainer = OutboxDrainer(db, SheetsBatchWriter(sheets, max_latency=0))
+
+    # Neither row holds its key any more: nothing is overwritten
+    assert await drainer.apply_row_updates() == 0
+    assert sheets.edits == []
+    assert (await db.get_sheet_row(key2))[2] == 5
+    assert await db.get_sheet_row(key3) is None
+    # The edit of the relocated row is applied at its new place
+    assert await drainer.apply_row_updates() == 1
+    assert sheets.edits == [(5, "left")]
+    assert await db.fetch_due_row_updates(now_epoch=2**31) == []
+
+    # Row locations are pruned along with the delivery records
+    assert await db.prune_delivered(older_than_epoch=2000) == 3
+    assert await db.get_sheet_row(key2) is None
@@ -0,0 +1,78 @@
+import calendar
+
+import pytest
+
+from app.services.channels import resolve_sheet_name
+from app.services.container import ServiceContainer
+from app.services.db import Database
+from app.services.partitions import ChannelPartition, RolloverPolicy
+
+
+class FakeSheets:
+    def __init__(self):
+        self.ensure_calls = []
+
+    async def ensure_sheet(self, title: str):
+        self.ensure_calls.append(title)
+        return title
+
+
+def _epoch(year, month, day=1):
+    return calendar.timegm((year, month, day, 12, 0, 0))
+
+
+def test_policy_titles_and_periods():
+    policy = RolloverPolicy(period="quarter")
+    assert policy.period_key(_epoch(2025, 8)) == "2025-Q3"
+    assert RolloverPolicy(period="month").period_key(_epoch(2025, 8)) == "2025-08"
+    assert policy.title("Title", "2025-Q3", 1) == "Title 2025-Q3"
+    assert policy.title("Title", "2025-Q3", 2) == "Title 2025-Q3 (2)"
+    assert len(policy.title("x" * 100, "2025-Q3", 12)) == 100
+    assert RolloverPolicy().title("Title", "", 1) == "Title"
+
+    current = ChannelPartition("Title 2025-Q3", "Title", "2025-Q3", 1, rows=10)
+    assert not policy.needs_rollover(current, _epoch(2025, 9))
+    assert policy.needs_rollover(current, _epoch(2025, 10))
+    assert policy.next_partition("Title", current, _epoch(2025, 10)).sheet_name == "Title 2025-Q4"
+    with pytest.raises(RuntimeError):
+        RolloverPolicy(period="weekly")
+
+
+@pytest.mark.asyncio
+async def test_rollover_by_rows_and_period_is_tracked_in_channels(db, temp_db_path):
+    sheets = FakeSheets()
+    container = ServiceContainer(db=db, gsheets=sheets, rollover=RolloverPolicy(max_rows=2, period="quarter"))
+    july, october = _epoch(2025, 7), _epoch(2025, 10)
+
+    async def log_row(now):
+        from app.services.db import JoinEvent
+        name = await resolve_sheet_name(container, -7, "Big: Channel", now_epoch=now)
+        await db.record_join_event(JoinEvent(channel_id=-7, user_id=1, event_type="join", occurred_at=now), name, ["r"])
+        return name
+
+    assert [await log_row(july) for _ in range(5)] == [
+        "Big Channel 2025-Q3",
+        "Big Channel 2025-Q3",
+        "Big Channel 2025-Q3 (2)",
+        "Big Channel 2025-Q3 (2)",
+        "Big Channel 2025-Q3 (3)",
+    ]
+    assert await log_row(october) == "Big Channel 2025-Q4"
+    # Partitions are opened locally; the writer creates each worksheet on its first append
+    assert sheets.ensure_calls == []
+
+    # The active partition and its fill level survive a restart
+    reopened = Database(temp_db_path)
+    await reopened.init_db()
+    partition = await reopened.get_channel_partition(-7)
+    assert (partition.sheet_name, partition.base_title, partition.period_key, partition.index, partition.rows) == (
+        "Big Channel 2025-Q4", "Big Channel", "2025-Q4", 1, 1,
+    )
+    await reopened.close()
+
+
+@pytest.mark.asyncio
+async def test_existing_mapping_is_kept_without_rollover(db):
+    await db.upsert_channel(-8, "Legacy Sheet")
+    container = ServiceContainer(db=db, gsheets=FakeSheets())
+    assert await resolve_sheet_name(container, -8, "Renamed") == "Legacy Sheet"
@@ -0,0 +1,136 @@
+import asyncio
+import time
+
+import pytest
+
+from app.config import Settings
+from app.services.channels import resolve_sheet_name
+from app.services.container import ServiceContainer
+from app.services.db import Database, JoinEvent
+from app.services.google_sheets import SheetsBatchWriter
+from app.services.outbox import OutboxDrainer
+from app.services.shards import SheetsShards, create_sheets_shards_from_settings
+
+
+class FakeSheets:
+    def __init__(self):
+        self.rows = {}
+
+    async def ensure_sheet(self, title):
+        self.rows.setdefault(title, [])
+        return title
+
+    async def append_rows(self, title, rows, verify=False, known_rows=0):
+        self.rows.setdefault(title, []).extend(rows)
+
+
+def test_shards_from_settings_share_project_quota():
+    settings = Settings(
+        GOOGLE_SERVICE_ACCOUNT_JSON="/keys/a.json",
+        GOOGLE_SPREADSHEET_ID="sheet-0",
+        GOOGLE_EXTRA_SPREADSHEET_IDS=["sheet-1", "sheet-2"],
+        GOOGLE_EXTRA_SERVICE_ACCOUNTS=["/keys/b.json"],
+    )
+    shards = create_sheets_shards_from_settings(settings)
+
+    assert [s.spreadsheet_id for s in shards] == ["sheet-0", "sheet-1", "sheet-2"]
+    # Accounts are used round-robin; shards on one account share its user buckets
+    assert [s.credentials_input for s in shards] == ["/keys/a.json", "/keys/b.json", "/keys/a.json"]
+    assert shards[0].quota is shards[2].quota and shards[0].quota is not shards[1].quota
+    # ...while every account draws from the same project buckets (one project by default)
+    project = {id(s.quota._queues["write"].buckets[0]) for s in shards}
+    assert len(project) == 1
+    assert [s.breaker.name for s in shards] == ["sheets", "sheets_1", "sheets_2"]
+    with pytest.raises(RuntimeError, match="shard 3"):
+        shards[3]
+
+
+@pytest.mark.asyncio
+async def test_shards_on_separate_projects_add_up_their_quota():
+    async def admitted(settings):
+        # Write calls let through at once (project bucket burst: 5 tokens)
+        shards = create_sheets_shards_from_settings(settings)
+        tasks = [asyncio.ensure_future(s.quota.acquire("write")) for s in shards for _ in range(10)]
+        await asyncio.sleep(0.05)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        return sum(not t.cancelled() for t in tasks)
+
+    common = dict(
+        GOOGLE_SERVICE_ACCOUNT_JSON="/keys/a.json",
+        GOOGLE_SPREADSHEET_ID="sheet-0",
+        GOOGLE_EXTRA_SPREADSHEET_IDS=["sheet-1"],
+        GOOGLE_EXTRA_SERVICE_ACCOUNTS=["/keys/b.json"],
+        GSHEETS_WRITES_PER_MINUTE_PROJECT=10,
+        GSHEETS_WRITES_PER_MINUTE_USER=6000,
+    )
+    assert await admitted(Settings(**common)) == 5
+    assert await admitted(Settings(**common, GOOGLE_SERVICE_ACCOUNT_PROJECTS=["proj-a", "proj-b"])) == 10
+
+    with pytest.raises(RuntimeError, match="3 projects for 2 service accounts"):
+        create_sheets_shards_from_settings(Settings(**common, GOOGLE_SERVICE_ACCOUNT_PROJECTS=["a", "b", "c"]))
+
+
+@pytest.mark.asyncio
+async def test_assignment_by_hash_and_by_load(db):
+    by_hash = SheetsShards([FakeSheets(), FakeSheets(), FakeSheets()])
+    assert await by_hash.assign(db, -1001) == await by_hash.assign(db, -1001) == -1001 % 3
+
+    by_load = SheetsShards([FakeSheets(), FakeSheets()], assignment="load")
+    container = ServiceContainer(db=db, gsheets=by_load[0], shards=by_load)
+    for channel_id in (-1, -2, -3):
+        await resolve_sheet_name(container, channel_id, f"Channel {channel_id}")
+    counts = await db.count_channels_by_shard()
+    assert counts == {0: 2, 1: 1}
+
+
+@pytest.mark.asyncio
+async def test_rows_are_delivered_to_their_channel_shard(temp_db_path):
+    shard_sheets = [FakeSheets(), FakeSheets()]
+    shards = SheetsShards(shard_sheets)
+    db = Database(temp_db_path)
+    await db.init_db()
+    try:
+        container = ServiceContainer(db=db, gsheets=shards[0], shards=shards)
+        for channel_id in (-10, -11):
+            name = await resolve_sheet_name(container, channel_id, f"Channel {channel_id}")
+            event = JoinEvent(channel_id=channel_id, user_id=1, event_type="join", occurred_at=1)
+            await db.record_join_event(event, name, [str(channel_id)])
+
+        drainer = OutboxDrainer(db, SheetsBatchWriter(shards, max_latency=0))
+        assert await drainer.drain_once() == 2
+        assert shard_sheets[-10 % 2].rows == {"Channel -10": [["-10"]]}
+        assert shard_sheets[-11 % 2].rows == {"Channel -11": [["-11"]]}
+
+        # The assignment survives a restart
+        await db.close()
+        db = Database(temp_db_path)
+        await db.init_db()
+        assert (await db.get_channel_partition(-11)).shard == -11 % 2
+    finally:
+        await db.close()
+
+
+@pytest.mark.asyncio
+async def test_rows_of_an_open_shard_are_deferred(db):
+    from aiohttp import ClientError
+
+    from app.services.circuit_breaker import CircuitBreaker
+
+    down = CircuitBreaker("shard-test", failure_threshold=1, reset_timeout=30)
+    down.release(down.acquire(), ClientError("down"))
+    shard_sheets = [FakeSheets(), FakeSheets()]
+    await db.enqueue_outbox("A", ["a"], shard=0)
+    await db.enqueue_outbox("B", ["b"], shard=1)
+
+    up = CircuitBreaker("shard-test-up", failure_threshold=1)
+    writer = SheetsBatchWriter(SheetsShards(shard_sheets), max_latency=0)
+    drainer = OutboxDrainer(db, writer, breakers={0: up, 1: down})
+    assert await drainer.drain_once() == 1
+    assert shard_sheets[0].rows == {"A": [["a"]]} and shard_sheets[1].rows == {}
+
+    # Deferred without counting an attempt
+    assert await db.fetch_due_outbox(int(time.time())) == []
+    [item] = await db.fetch_due_outbox(2**31)
+    assert item.shard == 1 and item.attempts == 0
@@ -0,0 +1,58 @@
+import asyncio
+
+import pytest
+
+from app.services.sheets_quota import (
+    PRIORITY_HIGH,
+    READ,
+    WRITE,
+    SheetsQuotaScheduler,
+    TokenBucket,
+)
+
+
+def test_bucket_never_exceeds_per_minute_budget():
+    now = [0.0]
+    bucket = TokenBucket("w", per_minute=60, burst=5, clock=lambda: now[0])
+    granted = 0
+    for _ in range(60 * 10):  # one minute in 0.1s steps
+        while bucket.available():
+            bucket.take()
+            granted += 1
+        now[0] += 0.1
+    assert granted <= 60
+    assert granted >= 55
+
+
+@pytest.mark.asyncio
+async def test_priority_then_round_robin_across_keys():
+    bucket = TokenBucket("w", per_minute=6000, burst=1)
+    scheduler = SheetsQuotaScheduler(read_buckets=[], write_buckets=[bucket])
+    bucket.take()  # empty bucket: everything below has to queue
+
+    order = []
+
+    async def call(label, key, priority=None):
+        await scheduler.acquire(WRITE, key, priority)
+        order.append(label)
+
+    tasks = [asyncio.create_task(call(f"A{i}", "A")) for i in range(3)]
+    tasks.append(asyncio.create_task(call("B0", "B")))
+    await asyncio.sleep(0)
+    tasks.append(asyncio.create_task(call("H", "", PRIORITY_HIGH)))
+    await asyncio.sleep(0)
+    assert scheduler.queued(WRITE) == 5
+
+    await asyncio.gather(*tasks)
+    assert order == ["H", "A0", "B0", "A1", "A2"]
+
+
+@pytest.mark.asyncio
+async def test_all_buckets_of_a_kind_are_charged():
+    project = TokenBucket("p", per_minute=600, burst=2)
+    user = TokenBucket("u", per_minute=600, burst=2)
+    scheduler = SheetsQuotaScheduler(read_buckets=[project, user], write_buckets=[])
+
+    await scheduler.acquire(READ)
+    assert project.tokens == pytest.approx(1, abs=0.1)
+    assert user.tokens == pytest.approx(1, abs=0.1)
@@ -0,0 +1,199 @@
+from types import SimpleNamespace
+
+import pytest
+import pytest_asyncio
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from app.services.google_sheets import HEADERS, GoogleSheetsService
+from app.services.sheets_rest import SheetsApiError, a1_cell, a1_range, a1_row_span, a1_start_row
+
+
+class FakeSheetsApi:
+    """In-memory stand-in for the subset of Sheets v4 the backend calls."""
+
+    def __init__(self):
+        self.sheets = {}  # title -> rows
+        self.peers = set()
+        self.calls = []
+        self.app = web.Application()
+        self.app.router.add_get("/v4/spreadsheets/{sid:[^/:]+}", self.get_spreadsheet)
+        self.app.router.add_post("/v4/spreadsheets/{sid:[^/:]+}:batchUpdate", self.batch_update)
+        self.app.router.add_get("/v4/spreadsheets/{sid:[^/:]+}/values/{range:[^/]+}", self.get_values)
+        self.app.router.add_post("/v4/spreadsheets/{sid:[^/:]+}/values/{range:[^/]+}", self.append)
+        self.app.router.add_post("/v4/spreadsheets/{sid:[^/:]+}/values:batchUpdate", self.values_batch_update)
+        self.app.router.add_get("/v4/spreadsheets/{sid:[^/:]+}/values:batchGet", self.values_batch_get)
+
+    def _seen(self, request, name):
+        assert request.headers["Authorization"] == "Bearer test-token"
+        self.peers.add(request.transport.get_extra_info("peername"))
+        self.calls.append(name)
+
+    @staticmethod
+    def _title(a1):
+        return a1.split("!")[0][1:-1].replace("''", "'")
+
+    async def get_spreadsheet(self, request):
+        self._seen(request, "get")
+        sheets = [
+            {"properties": {"sheetId": i, "title": t, "gridProperties": {"rowCount": len(r), "columnCount": 7}}}
+            for i, (t, r) in enumerate(self.sheets.items())
+        ]
+        return web.json_response({"properties": {"title": "Joins"}, "sheets": sheets})
+
+    async def batch_update(self, request):
+        self._seen(request, "batchUpdate")
+        props = (await request.json())["requests"][0]["addSheet"]["properties"]
+        if props["title"] in self.sheets:
+            return web.json_response(
+                {"error": {"code": 400, "message": f"A sheet with the name \"{props['title']}\" already exists."}},
+                status=400,
+            )
+        self.sheets[props["title"]] = []
+        return web.json_response({"replies": [{"addSheet": {"properties": dict(props, sheetId=len(self.sheets))}}]})
+
+    async def get_values(self, request):
+        self._seen(request, "values.get")
+        a1 = request.match_info["range"]
+        rows = self.sheets[self._title(a1)]
+        cells = a1.split("!")[1]
+        if cells[0].isdigit():
+            row = int(cells.split(":")[0])
+            return web.json_response({"values": [rows[row - 1]] if len(rows) >= row else []})
+        col = ord(cells[0]) - ord("A")
+        first = int(cells.split(":")[0][1:] or 1)
+        return web.json_response({"values": [[r[col] if len(r) > col else "" for r in rows[first - 1:]]]})
+
+    async def append(self, request):
+        self._seen(request, "values.append")
+        a1, _, action = request.match_info["range"].rpartition(":")
+        assert action == "append" and request.query["insertDataOption"] == "INSERT_ROWS"
+        title = self._title(a1)
+        if title not in self.sheets:
+            return web.json_response({"error": {"message": f"Unable to parse range: {a1}"}}, status=400)
+        values = (await request.json())["values"]
+        start = len(self.sheets[title]) + 1
+        self.sheets[title].extend(values)
+        updated = f"{a1.split('!')[0]}!A{start}:K{start + len(values) - 1}"
+        return web.json_response({"updates": {"updatedRange": updated, "updatedRows": len(values)}})
+
+    async def values_batch_get(self, request):
+        self._seen(request, "values.batchGet")
+        value_ranges = []
+        for a1 in request.query.getall("ranges"):
+            cell = a1.split("!")[1]
+            rows = self.sheets[self._title(a1)]
+            row, col = int(cell[1:]), ord(cell[0]) - ord("A")
+            found = rows[row - 1][col] if len(rows) >= row and len(rows[row - 1]) > col else ""
+            value_ranges.append({"range": a1, "values": [[found]]} if found else {"range": a1})
+        return web.json_response({"valueRanges": value_ranges})
+
+    async def values_batch_update(self, request):
+        self._seen(request, "values.batchUpdate")
+        for item in (await request.json())["data"]:
+            a1 = item["range"]
+            cell = a1.split("!")[1].split(":")[0]
+            row = self.sheets[self._title(a1)][int(cell[1:]) - 1]
+            col = ord(cell[0]) - ord("A")
+            values = item["values"][0]
+            row.extend([""] * (col + len(values) - len(row)))
+            row[col:col + len(values)] = values
+        return web.json_response({})
+
+
+@pytest_asyncio.fixture()
+async def api():
+    fake = FakeSheetsApi()
+    server = TestServer(fake.app)
+    await server.start_server()
+    fake.base = str(server.make_url("/v4/spreadsheets"))
+    yield fake
+    await server.close()
+
+
+def _service(api):
+    svc = GoogleSheetsService(credentials="unused", spreadsheet_id="sid", backend="rest", api_base=api.base)
+    svc._credentials = SimpleNamespace(valid=True, token="test-token")
+    return svc
+
+
+def _row(key):
+    return ["ts", "1", "A", "", "", "", key]
+
+
+@pytest.mark.asyncio
+async def test_rest_backend_creates_sheets_and_appends(api):
+    svc = _service(api)
+    try:
+        title = await svc.ensure_sheet("It's [new]")
+        assert title == "It's new"
+        # Row numbers come from the reply's updatedRange
+        assert await svc.append_rows(title, [_row("1"), _row("2")]) == {"1": 2, "2": 3}
+        await svc.append_row(title, _row("3"))
+        assert api.sheets[title] == [HEADERS, _row("1"), _row("2"), _row("3")]
+
+        # Collision with an existing sheet picks a suffix
+        assert await svc.ensure_sheet("It's new") == "It's new 2"
+
+        # A verified append reads the Event Key column and skips rows already written
+        assert await svc.append_rows(title, [_row("3"), _row("4")], verify=True) == {"3": 4, "4": 5}
+        assert [r[-1] for r in api.sheets[title][1:]] == ["1", "2", "3", "4"]
+
+        # Status edits of several rows go out as one values.batchUpdate
+        await svc.update_cells([(title, 2, 9, "2025-01-01 10:00:00"), (title, 2, 10, "left"), (title, 4, 10, "kicked")])
+        assert api.calls.count("values.batchUpdate") == 1
+        assert api.sheets[title][1][9:] == ["2025-01-01 10:00:00", "left"]
+        assert api.sheets[title][3][10] == "kicked"
+
+        # Rows that no longer hold the expected Event Key are not overwritten
+        moved = await svc.update_cells(
+            [(title, 2, 10, "kicked"), (title, 3, 10, "left")], row_keys={(title, 2): "1", (title, 3): "9"}
+        )
+        assert moved == {(title, 3)}
+        assert api.calls.count("values.batchGet") == 1
+        assert api.sheets[title][1][10] == "kicked" and api.sheets[title][2][10:] == []
+        assert await svc.locate_rows(title, {"2", "9"}) == {"2": 3}
+        assert "values.get" in api.calls
+
+        # All calls reused one pooled keep-alive connection
+        assert len(api.peers) == 1
+    finally:
+        await svc.close()
+
+
+@pytest.mark.asyncio
+async def test_rest_backend_labels_new_columns_of_old_sheets(api):
+    api.sheets["Old"] = [HEADERS[:6], ["ts", "1", "A", "", "", ""]]
+    svc = _service(api)
+    try:
+        assert await svc.append_rows("Old", [_row("5")]) == {"5": 3}
+        await svc.append_row("Old", _row("6"))
+        assert api.sheets["Old"][0] == HEADERS
+        assert api.calls.count("values.batchUpdate") == 1
+    finally:
+        await svc.close()
+
+
+@pytest.mark.asyncio
+async def test_rest_backend_surfaces_api_errors(api):
+    svc = _service(api)
+    try:
+        client = await svc._manager.authorize()
+        spreadsheet = await client.open_by_key("sid")
+        assert spreadsheet.title == "Joins"
+        await spreadsheet.add_worksheet("S", rows=1, cols=7)
+        with pytest.raises(SheetsApiError) as exc:
+            await spreadsheet.add_worksheet("S", rows=1, cols=7)
+        assert exc.value.code == 400 and "already exists" in str(exc.value)
+    finally:
+        await svc.close()
+
+
+def test_a1_range_quotes_titles():
+    assert a1_range("It's") == "'It''s'"
+    assert a1_range("S", "G:G") == "'S'!G:G"
+    assert a1_cell("S", 5, 11) == "'S'!K5"
+    assert a1_row_span("S", 1, 7, 11) == "'S'!G1:K1"
+    assert a1_start_row("'It''s!'!A5:K7") == 5
+    assert a1_start_row("'S'!$A$12") == 12
+    assert a1_start_row("'S'!A:K") is None
@@ -0,0 +1,54 @@
+import asyncio
+
+import pytest
+from aiogram import Bot, Dispatcher, Router
+from aiogram.types import ChatJoinRequest
+from aiohttp.test_utils import TestClient, TestServer
+
+from app.webhook import build_webhook_app
+
+
+JOIN_REQUEST_UPDATE = {
+    "update_id": 100500,
+    "chat_join_request": {
+        "chat": {"id": -1001, "type": "channel", "title": "Recorded Channel"},
+        "from": {"id": 42, "is_bot": False, "first_name": "Alice", "username": "alice"},
+        "user_chat_id": 42,
+        "date": 1700000000,
+        "invite_link": {
+            "invite_link": "https://t.me/+abc",
+            "creator": {"id": 1, "is_bot": True, "first_name": "Bot"},
+            "creates_join_request": True,
+            "is_primary": False,
+            "is_revoked": False,
+            "name": "Promo",
+        },
+    },
+}
+
+
+@pytest.mark.asyncio
+async def test_webhook_validates_secret_and_feeds_dispatcher():
+    received = asyncio.Queue()
+    router = Router()
+
+    @router.chat_join_request()
+    async def capture(update: ChatJoinRequest):
+        await received.put(update)
+
+    dp = Dispatcher()
+    dp.include_router(router)
+    bot = Bot(token="123456:TEST-token")
+
+    app = build_webhook_app(dp, bot, path="/hook", secret_token="s3cret")
+    async with TestClient(TestServer(app)) as client:
+        resp = await client.post("/hook", json=JOIN_REQUEST_UPDATE, headers={"X-Telegram-Bot-Api-Secret-Token": "wrong"})
+        assert resp.status == 401
+        assert received.empty()
+
+        resp = await client.post("/hook", json=JOIN_REQUEST_UPDATE, headers={"X-Telegram-Bot-Api-Secret-Token": "s3cret"})
+        assert resp.status == 200
+
+        update = await asyncio.wait_for(received.get(), timeout=2)
+        assert update.chat.id == -1001
+        assert update.invite_link.name == "Promo"